@@ -9,11 +9,18 @@ import urllib.parse
 import json
 import html
 import copy
+import shutil
 import psutil
-import signal
 import requests
+import threading
+import uuid
+import hashlib
+import hmac
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from datetime import timedelta
-from typing import Dict, Union, Optional
+from typing import Callable, Dict, Union, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 # LIBRARY PYROFORK (Instal: pip install pyrofork tgcrypto)
 from pyrogram import Client, filters, idle
@@ -31,8 +38,9 @@ from pyrogram.errors import FloodWait
 # =========================
 from config import (
     API_ID, API_HASH, BOT_TOKEN, OWNER_ID,
-    RCLONE_REMOTE, RCLONE_FOLDER,
+    RCLONE_REMOTE, RCLONE_FOLDER, RCLONE_RC_ENABLED,
     SEEDBOX_ENABLED, SEEDBOX_USER, SEEDBOX_PASS, SEEDBOX_FB_URL, SEEDBOX_FB_SHARE_HASH,
+    SEEDBOX_TUS_ENABLED,
     MIRRORED_ENABLED, MIRRORED_API_KEY, MIRRORED_MIRRORS,
     BUZZHEAVIER_ENABLED, BUZZHEAVIER_ACCOUNT_ID,
     GOFILE_ENABLED, GOFILE_TOKEN,
@@ -40,11 +48,66 @@ from config import (
     TURBOVID_ENABLED, TURBOVID_API_KEY,
     ABYSS_ENABLED, ABYSS_API_KEY,
     VIDHIDE_ENABLED, VIDHIDE_API_KEY, VIDHIDE_DOMAIN,
-    DEFAULT_FONT_SIZE, DEFAULT_MARGIN_V, SUB_FONT_NAME, SUB_IS_BOLD, CRF_VALUE,
-    WATERMARK_ENABLED, WATERMARK_TEXT, WATERMARK_FONTSIZE, WATERMARK_DURATION, WATERMARK_FONT,
-    HEAUDIO_MAP, AACLCAUDIO_MAP, VIDEO_2PASS_MAP,
+    DEFAULT_FONT_SIZE, DEFAULT_MARGIN_V, CRF_VALUE,
+    WATERMARK_FONTSIZE, WATERMARK_FONT,
     DATA_FOLDER, CACHE_FOLDER, MANUAL_FOLDER, TOOLS_FOLDER, OUTPUT_FOLDER,
-    DOWNLOAD_TIMEOUT
+    DOWNLOAD_TIMEOUT,
+    ESTIMATED_DURATION, UNKNOWN_SOURCE_GB,
+    ADMISSION_RETRY_INTERVAL,
+    DISTRIBUTED_ENABLED, COORDINATOR_BIND, WORKER_TOKEN, LEASE_TTL,
+    WORKER_HEARTBEAT_INTERVAL, WORKER_POLL_INTERVAL, TASK_MAX_ATTEMPTS,
+    ENCODER_DAEMON_SOCKET, SEGMENTED_DOWNLOAD_ENABLED, STREAM_ENCODE_ENABLED,
+    FILENAME_CACHE_TTL, GDRIVE_RCLONE_ENABLED, SOURCE_VERIFY_ENABLED, SOURCE_VERIFY_SAMPLES,
+    DL_HOST_LIMIT, DL_HOST_LIMITS, DL_TOTAL_LIMIT, DL_BANDWIDTH_LIMIT_MB,
+    UPLOAD_PIPELINE_HOSTS,
+    UPLOAD_TOTAL_LIMIT, UPLOAD_HOST_LIMIT, UPLOAD_HOST_LIMITS, UPLOAD_BANDWIDTH_LIMIT_MB,
+    UPLOAD_RETRIES
+)
+
+# Segmented HTTP downloader (Range, multi-connection)
+from downloader import (
+    probe_ranged, segmented_download, DownloadError,
+    retry_policy, backoff_delay, prepare_ytdlp_resume, clear_state, state_path,
+    probe_validators, source_type, extract_gdrive_file_id, source_cache_path, source_cache_hit,
+    rclone_available, rclone_gdrive_download,
+    ytdlp_library_available, ytdlp_download, ytdlp_filenames,
+    DownloadScheduler, PRIORITY_PIPELINE
+)
+
+# Shared HTTP client (session pool per host + latency metrics)
+from httpclient import http_get, http_post, http_put, http_head, host_latency_stats
+
+# rclone rcd (GDrive upload lewat RC API)
+from rclonerc import RCLONE_RC, rc_copyfile, rc_file_id
+
+# Job deduplication (fingerprint rendition, history, job identik)
+from dedup import (
+    normalize_source_url, gdrive_content_key, fingerprint_job, rendition_fingerprint,
+    match_history, find_identical_job
+)
+
+# Fair-share scheduler (DRR per user) + admission control disk/RAM
+from scheduler import (
+    SCHED_STATE, USER_WEIGHT_OVERRIDES, set_job_eta, load_user_weights, save_user_weights,
+    get_user_weight, sched_pick, queue_order, reset_scheduler,
+    ADMISSION_RESERVED, estimate_output_size, estimate_job_footprint, source_on_disk, get_free_disk,
+    admission_check, admission_reserve, admission_consume, admission_release
+)
+
+# Upload primitives (retry/circuit breaker + body upload streaming dari disk)
+from uploader import (
+    UploadError, upload_error_retryable, upload_breaker, upload_backoff, open_circuits,
+    MULTIPART_CHUNK, MultipartStream, FanoutReader, GrowingFile,
+    throttled, open_upload_source, set_bandwidth_share, FileBrowserAuth, filebrowser_tus_upload,
+    UploadScheduler
+)
+
+# Encoder core (FFmpeg helpers + shared process/dashboard state)
+from encoder import (
+    ACTIVE_PROCESSES, STATUS_DASHBOARD, X264_PRESET,
+    get_hidden_params, time_str_to_seconds, force_kill_process,
+    get_video_metadata, get_indo_subtitle_index, is_two_pass,
+    sync_ffmpeg_worker, verify_source
 )
 
 # Encoding Templates (dari file JSON)
@@ -96,7 +159,6 @@ for old_name, new_name in _OLD_FILES_TO_MIGRATE:
     new_path = os.path.join("data", new_name)
     if os.path.exists(old_path) and not os.path.exists(new_path):
         try:
-            import shutil
             shutil.move(old_path, new_path)
             print(f"[Migration] Moved {old_name} → data/{new_name}")
         except Exception as e:
@@ -111,7 +173,6 @@ for tool_file in _TOOLS_TO_MIGRATE:
     new_path = os.path.join("tools", tool_file)
     if os.path.exists(old_path) and not os.path.exists(new_path):
         try:
-            import shutil
             shutil.move(old_path, new_path)
             print(f"[Migration] Moved {tool_file} → tools/{tool_file}")
         except Exception as e:
@@ -130,8 +191,6 @@ logger = logging.getLogger(__name__)
 JOB_QUEUE = []
 IS_WORKING = False
 CURRENT_JOB = None
-ACTIVE_PROCESSES = {}
-STATUS_DASHBOARD = {}
 USER_DATA = {}
 PENDING_SRT_JOBS = {}  # {chat_id: [{"job": job, "file": downloaded_file_path, "msg_id": msg_id}, ...]}
 BOT_START_TIME = time.time()
@@ -142,7 +201,7 @@ MANUAL_FOLDER = "manual"  # Folder untuk file yang ditambahkan manual
 TOOLS_FOLDER = "tools"    # Folder untuk script tools (link_formatter, dll)
 OUTPUT_FOLDER = "output"  # Folder untuk file hasil encode (hidden)
 CACHE_REGISTRY_FILE = os.path.join(DATA_FOLDER, "file_cache.json")
-FILE_CACHE = {}  # {id: {"path": filepath, "name": realname, "size": bytes, "added": timestamp}}
+FILE_CACHE = {}  # {id: {"path": filepath, "name": realname, "size": bytes, "added": timestamp, "content_key": key}}
 
 # ENCODE HISTORY SYSTEM (for /links command)
 ENCODE_HISTORY_FILE = os.path.join(DATA_FOLDER, "encode_history.json")
@@ -184,7 +243,7 @@ def save_encode_history():
     with open(ENCODE_HISTORY_FILE, 'w') as f:
         json.dump(ENCODE_HISTORY, f, indent=2, ensure_ascii=False)
 
-def add_to_encode_history(filename: str, quality: str, links: dict, meta: dict = None):
+def add_to_encode_history(filename: str, quality: str, links: dict, meta: dict = None, fingerprint: str = None):
     """Add encode result to history"""
     from datetime import datetime
     entry = {
@@ -192,7 +251,8 @@ def add_to_encode_history(filename: str, quality: str, links: dict, meta: dict =
         "quality": quality,
         "timestamp": datetime.now().isoformat(),
         "links": links,
-        "meta": meta or {}
+        "meta": meta or {},
+        "fingerprint": fingerprint
     }
     ENCODE_HISTORY.append(entry)
     save_encode_history()
@@ -210,17 +270,22 @@ def get_next_cache_id():
         return "1"
     return str(max(int(k) for k in FILE_CACHE.keys()) + 1)
 
-def add_to_cache(filepath, realname):
-    """Add file to cache and return ID"""
+def add_to_cache(filepath, realname, source_key=None, content_key=None):
+    """Add file to cache and return ID (path yang sudah terdaftar dipakai ulang)"""
     ensure_cache_folder()
-    cache_id = get_next_cache_id()
+    cache_id = next((k for k, v in FILE_CACHE.items() if v.get('path') == filepath), None) or get_next_cache_id()
     size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
     FILE_CACHE[cache_id] = {
+        **FILE_CACHE.get(cache_id, {}),
         "path": filepath,
         "name": realname,
         "size": size,
         "added": time.time()
     }
+    if source_key:
+        FILE_CACHE[cache_id]["source_key"] = source_key
+    if content_key:
+        FILE_CACHE[cache_id]["content_key"] = content_key
     save_file_cache()
     return cache_id
 
@@ -254,6 +319,285 @@ def check_auth(user_id):
 # Load saat start
 load_auth()
 
+# =====================================================
+# ETA MODEL (dipelajari dari ENCODE_HISTORY)
+# =====================================================
+# Rasio detik-encode per detik-media per profil rendition (res|mode|crf|preset),
+# dengan fallback ke profil yang lebih kasar (res|mode, lalu res) saat data kurang.
+# Diperbarui setiap rendition selesai; di-fit ulang dari history jika file hilang.
+ETA_MODEL_FILE = os.path.join(DATA_FOLDER, "eta_model.json")
+ETA_MODEL = {}  # {profile_key: {"n": jumlah sampel, "ratio": detik encode / detik media}}
+ETA_DEFAULT_RATIO = {"360p": 0.15, "480p": 0.2, "720p": 0.35, "1080p": 0.7}  # Sebelum ada data
+ETA_SMOOTHING = 10  # Setelah N sampel jadi moving average (ikut perubahan hardware)
+
+def save_eta_model():
+    with open(ETA_MODEL_FILE, 'w') as f:
+        json.dump(ETA_MODEL, f, indent=2)
+
+def eta_profile(job, res: str) -> list:
+    """Key profil rendition, dari paling spesifik ke paling kasar"""
+    two_pass = job.get('mode') == "2pass" or (job.get('mode') == "mixed" and res == "360p")
+    if two_pass:
+        return [f"{res}|2pass|-|{X264_PRESET}", f"{res}|2pass", res]
+    crf = job.get('res_crf', {}).get(res, job.get('crf', '26'))
+    return [f"{res}|crf|{crf}|{X264_PRESET}", f"{res}|crf", res]
+
+def eta_observe(keys: list, media_sec: float, encode_sec: float, save: bool = True):
+    """Masukkan satu sampel encode ke semua level profil"""
+    if media_sec <= 0 or encode_sec <= 0:
+        return
+    ratio = encode_sec / media_sec
+    for key in keys:
+        stat = ETA_MODEL.setdefault(key, {"n": 0, "ratio": ratio})
+        stat["n"] += 1
+        stat["ratio"] += (ratio - stat["ratio"]) / min(stat["n"], ETA_SMOOTHING)
+    if save:
+        save_eta_model()
+
+def fit_eta_model_from_history():
+    """Bangun ulang model dari ENCODE_HISTORY (entry lama hanya punya string durasi)"""
+    ETA_MODEL.clear()
+    for entry in ENCODE_HISTORY:
+        meta = entry.get('meta', {})
+        keys = meta.get('eta_keys') or [entry.get('quality')]
+        media_sec = meta.get('duration_sec') or time_str_to_seconds(meta.get('duration', ''))
+        encode_sec = meta.get('encode_sec') or time_str_to_seconds(meta.get('encode_time', ''))
+        if keys[0] in ETA_DEFAULT_RATIO:
+            eta_observe(keys, media_sec, encode_sec, save=False)
+    save_eta_model()
+
+def load_eta_model():
+    global ETA_MODEL
+    if os.path.exists(ETA_MODEL_FILE):
+        try:
+            with open(ETA_MODEL_FILE, 'r') as f:
+                ETA_MODEL = json.load(f)
+            return
+        except:
+            ETA_MODEL = {}
+    fit_eta_model_from_history()
+
+def rendition_eta(job, res: str) -> float:
+    """Estimasi detik encode satu rendition"""
+    media_sec = job.get('duration') or ESTIMATED_DURATION
+    keys = eta_profile(job, res)
+    for key in keys:
+        if key in ETA_MODEL:
+            return ETA_MODEL[key]["ratio"] * media_sec
+    ratio = ETA_DEFAULT_RATIO.get(res, 0.7)
+    return ratio * media_sec * (2 if "|2pass|" in keys[0] else 1)
+
+def job_eta(job) -> float:
+    """Estimasi detik encode total job (0 untuk job non-encode)"""
+    if job.get('type', 'encode') != 'encode':
+        return 0.0
+    return sum(rendition_eta(job, res) for res in job.get('queue', []))
+
+def current_job_remaining() -> float:
+    """Sisa detik encode job aktif, dari progress di STATUS_DASHBOARD"""
+    if not CURRENT_JOB or CURRENT_JOB.get('type', 'encode') != 'encode':
+        return 0.0
+    progress = STATUS_DASHBOARD.get(CURRENT_JOB['chat_id'], {}).get("resolutions", {})
+    remaining = 0.0
+    for res in CURRENT_JOB.get('queue', []):
+        info = progress.get(res, {"status": "Waiting", "pct": 0})
+        if info["status"] in ("Uploading", "Done"):
+            continue
+        remaining += rendition_eta(CURRENT_JOB, res) * (1 - min(info.get("pct", 0), 100) / 100)
+    return remaining
+
+def format_eta(seconds: float) -> str:
+    return str(timedelta(seconds=int(seconds)))
+
+# =====================================================
+# FAIR-SHARE SCHEDULER (Deficit Round-Robin per chat_id, lihat scheduler.py)
+# =====================================================
+
+def pick_next_job():
+    """Ambil job berikutnya dari JOB_QUEUE sesuai kebijakan fair-share.
+    
+    Job yang tidak lolos admission control (disk/RAM) tidak ikut putaran
+    sampai ruang tersedia. Returns None jika tidak ada job yang bisa jalan.
+    """
+    admissible = [job for job in JOB_QUEUE if admission_check(estimate_job_footprint(job)) is None]
+    if not admissible:
+        return None
+    job = admissible[sched_pick(admissible, SCHED_STATE)]
+    JOB_QUEUE.remove(job)
+    return job
+
+def get_queue_order() -> list:
+    """Urutan eksekusi JOB_QUEUE tanpa mengubah state scheduler"""
+    return queue_order(JOB_QUEUE, SCHED_STATE)
+
+def get_queue_position(job) -> int:
+    """Posisi job (1-based) dalam urutan eksekusi sebenarnya"""
+    for i, queued in enumerate(get_queue_order(), 1):
+        if queued is job:
+            return i
+    return 0
+
+set_job_eta(job_eta)
+load_user_weights()
+load_eta_model()
+
+# =====================================================
+# ADMISSION CONTROL (Disk & RAM backpressure, lihat scheduler.py)
+# =====================================================
+ADMISSION_RETRY_TASK = None
+
+def probe_source_size(url: str) -> int:
+    """Ukuran source dari HEAD (atau Range 0-0). Returns 0 jika tidak diketahui."""
+    if not url:
+        return 0
+    try:
+        resp = http_head(url, allow_redirects=True, timeout=15)
+        size = int(resp.headers.get("Content-Length", 0) or 0)
+        if resp.status_code < 400 and size > 0 and "text/html" not in resp.headers.get("Content-Type", ""):
+            return size
+        # Beberapa server tidak kirim Content-Length di HEAD
+        resp = http_get(url, headers={"Range": "bytes=0-0"}, stream=True, allow_redirects=True, timeout=15)
+        content_range = resp.headers.get("Content-Range", "")
+        resp.close()
+        if "/" in content_range and not content_range.endswith("*"):
+            return int(content_range.rsplit("/", 1)[1])
+    except Exception as e:
+        logger.warning(f"Size probe failed for {url[:80]}: {e}")
+    return 0
+
+async def wait_for_admission(key: str, footprint: int, on_wait=None):
+    """Tunggu sampai footprint muat, lalu reserve. on_wait(reason) dipanggil sekali saat ditahan."""
+    notified = False
+    while True:
+        reason = admission_check(footprint)
+        if reason is None:
+            admission_reserve(key, footprint)
+            return
+        if not notified and on_wait:
+            notified = True
+            try:
+                await on_wait(reason)
+            except: pass
+        await asyncio.sleep(ADMISSION_RETRY_INTERVAL)
+
+def schedule_admission_retry():
+    """Coba lagi check_queue setelah ADMISSION_RETRY_INTERVAL (job ditahan)"""
+    global ADMISSION_RETRY_TASK
+    if ADMISSION_RETRY_TASK and not ADMISSION_RETRY_TASK.done():
+        return
+    
+    async def _retry():
+        await asyncio.sleep(ADMISSION_RETRY_INTERVAL)
+        await check_queue()
+    
+    ADMISSION_RETRY_TASK = asyncio.create_task(_retry())
+
+# =====================================================
+# JOB DEDUPLICATION (fingerprint & pencocokan di dedup.py)
+# =====================================================
+
+def find_history_entry(fingerprint: str, res: str) -> Optional[dict]:
+    """Hasil encode terbaru dengan fingerprint sama yang punya link valid untuk semua host yang
+    sekarang diupload untuk resolusi ini; link kurang -> None (rendition di-encode ulang)"""
+    expected = [name for name, state in upload_graph_status(res).items() if state != "⭕"]
+    return match_history(ENCODE_HISTORY, fingerprint, expected)
+
+def format_history_result(entry: dict) -> str:
+    meta = entry.get('meta', {})
+    text = (
+        f"♻️ <b>Sudah pernah di-encode ({entry['quality']})</b>\n\n"
+        f"🎬 <code>{entry['filename']}</code>\n"
+        f"🎞️ Durasi: {meta.get('duration', '-')}\n"
+        f"📦 {meta.get('input_size', '-')} → {meta.get('output_size', '-')}\n\n"
+    )
+    for key, label in [("seedbox", "📦 <b>Seedbox:</b>"), ("gdrive", "🔗 <b>GDrive:</b>"), ("buzzheavier", "🐝 <b>Buzzheavier:</b>"),
+                       ("gofile", "📁 <b>Gofile:</b>"), ("filepress", "🎬 <b>FilePress:</b>"), ("mirrored", "🪞 <b>Mirrored:</b>"),
+                       ("turbovid", "📺 <b>TurboVid:</b>"), ("abyss", "🌀 <b>Abyss:</b>"), ("vidhide", "🎬 <b>VidHide:</b>")]:
+        link = entry.get('links', {}).get(key)
+        if link and link != "Error Link":
+            text += f"{label}\n{link}\n\n"
+    return text.strip()
+
+async def coalesce_job(client, job) -> Optional[str]:
+    """Cek duplikat sebelum job masuk antrian.
+    
+    Rendition yang sudah ada di history langsung dikirim dan dibuang dari job['queue'].
+    Returns alasan (str) jika job tidak perlu di-queue sama sekali, None jika tetap di-queue.
+    """
+    chat_id = job['chat_id']
+    fingerprint_job(job, FILE_CACHE)
+    
+    cached = {res: find_history_entry(rendition_fingerprint(job, res, FILE_CACHE), res) for res in job['queue']}
+    cached = {res: entry for res, entry in cached.items() if entry}
+    for entry in cached.values():
+        await client.send_message(chat_id, format_history_result(entry), disable_notification=True)
+    job['queue'] = [res for res in job['queue'] if res not in cached]
+    if not job['queue']:
+        return f"♻️ <b>{html.escape(job['real_name'][:50])}</b> sudah pernah di-encode, link dikirim dari history."
+    
+    other = find_identical_job(job, ([CURRENT_JOB] if CURRENT_JOB else []) + JOB_QUEUE, FILE_CACHE)
+    if other:
+        if chat_id != other['chat_id'] and chat_id not in other.setdefault('subscribers', []):
+            other['subscribers'].append(chat_id)
+        where = "sedang diproses" if other is CURRENT_JOB else f"di antrian #{get_queue_position(other)}"
+        return f"♻️ <b>{html.escape(job['real_name'][:50])}</b> identik dengan job yang {where}, link akan dikirim saat selesai."
+    return None
+
+def discard_job_files(job):
+    """Job dibuang sebelum diproses (digabung / dijawab dari history): hapus SRT upload-nya,
+    kecuali masih dipakai job lain (batch berbagi satu SRT). Source cache tetap disimpan."""
+    srt = job.get('srt')
+    if not srt or not os.path.exists(srt):
+        return
+    others = ([CURRENT_JOB] if CURRENT_JOB else []) + JOB_QUEUE + [p['job'] for jobs in PENDING_SRT_JOBS.values() for p in jobs]
+    if any(other is not job and other.get('srt') == srt for other in others):
+        return
+    try:
+        os.remove(srt)
+    except OSError:
+        pass
+
+# =====================================================
+# SOURCE CACHE (content-addressed)
+# =====================================================
+# Source URL disimpan sebagai CACHE_FOLDER/src_<key>.mkv, key = URL ternormalisasi +
+# validator server (ETag / Last-Modified / ukuran), jadi URL yang sama dengan isi yang
+# sama tidak didownload ulang dan nama file tidak pernah dipakai untuk URL lain.
+# File manual diberi key dari hash isinya. Satu lock per key: job dengan source
+# yang sama menunggu download pertama selesai lalu memakai hasilnya.
+
+SOURCE_LOCKS = {}  # {content_key: asyncio.Lock}
+
+def resolve_source_key(url: str, ranged: Optional[dict] = None) -> Tuple[str, bool]:
+    """Returns (content_key, reusable). Tanpa validator, file hanya dipakai job ini sendiri.
+
+    Blocking (HEAD request), jalankan lewat asyncio.to_thread.
+    """
+    norm = normalize_source_url(url)
+    if norm.startswith("gdrive:"):
+        return gdrive_content_key(norm), True
+    validators = ranged or probe_validators(url) or {}
+    version = validators.get("etag") or validators.get("last_modified") or ""
+    if not (version or validators.get("size")):
+        return hashlib.sha1(f"{norm}|{uuid.uuid4()}".encode()).hexdigest()[:20], False
+    return hashlib.sha1(f"{norm}|{version}|{validators.get('size') or ''}".encode()).hexdigest()[:20], True
+
+def source_lock(content_key: str) -> asyncio.Lock:
+    if content_key not in SOURCE_LOCKS:
+        SOURCE_LOCKS[content_key] = asyncio.Lock()
+    return SOURCE_LOCKS[content_key]
+
+def hash_file(path: str) -> str:
+    """Content key file manual (sha1 isi file), blocking"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return f"sha1:{h.hexdigest()}"
+
+# Slot download per host + bandwidth global (DownloadScheduler di downloader.py)
+DL_SCHEDULER = DownloadScheduler(DL_TOTAL_LIMIT, DL_HOST_LIMIT, DL_HOST_LIMITS, DL_BANDWIDTH_LIMIT_MB)
+
 # Enums untuk State
 S_RES = 1
 S_AUDIO = 2
@@ -268,10 +612,6 @@ S_WAIT_SRT = 7
 # UTILS & HELPERS
 # =====================================================
 
-def get_hidden_params():
-    """Linux version - no params needed (no console hiding)."""
-    return {}
-
 def create_progress_bar(percent: float, length: int = 20) -> str:
     if percent < 0: percent = 0
     if percent > 100: percent = 100
@@ -313,104 +653,163 @@ def build_template_keyboard() -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton("❌ Tutup", "close_menu")])
     return InlineKeyboardMarkup(rows)
 
-def time_str_to_seconds(time_str: str) -> float:
-    try:
-        h, m, s = time_str.split(":")
-        return int(h) * 3600 + int(m) * 60 + float(s)
-    except:
-        return 0.0
-
 def human_readable_size(size: float) -> str:
     for unit in ["B", "KB", "MB", "GB", "TB"]:
         if size < 1024.0: return f"{size:.2f} {unit}"
         size /= 1024.0
     return f"{size:.2f} PB"
 
-def force_kill_process(proc):
+async def run_upload(host: str, func, *args, retries: int = None,
+                     status: dict = None, key: str = None, refresh=None) -> Optional[str]:
+    """Jalankan uploader (thread) lewat retry + circuit breaker host. Returns link atau None (gagal / dilewati).
+    retries=0 untuk remote upload (POST ulang bisa membuat job duplikat di host).
+    status[key] (default host) diisi ✅ / ❌, ⛔ jika host dilewati, 🔁 n saat menunggu retry."""
+    breaker = upload_breaker(host)
+    if not breaker.allow():
+        logger.info(f"Upload {host} dilewati (circuit open)")
+        if status is not None:
+            status[key or host] = "⛔"
+        return None
+    retries = UPLOAD_RETRIES if retries is None else retries
+    error = None
     try:
-        if os.name == 'nt':
-            # Gunakan params tersembunyi juga untuk taskkill
-            subprocess.call(['taskkill', '/F', '/T', '/PID', str(proc.pid)], 
-                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
-                            **get_hidden_params())
-        else:
-            os.kill(proc.pid, signal.SIGKILL)
-    except:
-        pass
+        for attempt in range(retries + 1):
+            if status is not None and not UPLOAD_GRAPH.get(host, {}).get("after") and not UL_SCHEDULER.available(host):
+                status[key or host] = "🕒 antri"
+                if refresh:
+                    await refresh()
+            try:
+                async with UL_SCHEDULER.upload_slot(host):
+                    if status is not None and status.get(key or host) == "🕒 antri":
+                        status[key or host] = "⏳"
+                    link = await asyncio.to_thread(func, *args)
+                if link:
+                    breaker.success()
+                    if status is not None:
+                        status[key or host] = "✅"
+                    return link
+                error = UploadError("tidak ada link")
+            except Exception as e:
+                error = e
+            if not upload_error_retryable(error) or attempt == retries:
+                break
+            delay = upload_backoff(attempt)
+            logger.warning(f"Upload {host} gagal ({type(error).__name__}: {error}), retry {attempt + 1}/{retries} dalam {delay:.0f}s")
+            if status is not None:
+                status[key or host] = f"🔁 {attempt + 1}"
+                if refresh:
+                    await refresh()
+            await asyncio.sleep(delay)
+    except BaseException:
+        # Dibatalkan (/cancel, shutdown) di tengah percobaan: lepas probe half-open tanpa menilai host,
+        # kalau tidak probing tetap True dan host dilewati selamanya
+        breaker.release()
+        raise
+    if getattr(error, "host_fault", True):
+        breaker.failure()
+    else:
+        breaker.release()
+    if status is not None:
+        status[key or host] = "❌"
+    return None
 
-def filebrowser_upload_file(local_path: str, chat_id: int = None, res: str = None) -> str:
-    """Upload file ke seedbox via FileBrowser API (HTTP). Returns: download URL atau None jika gagal."""
+def status_progress(status: dict, key: str, refresh=None, loop=None, interval: float = 5) -> Callable[[int, int], None]:
+    """Callback progress (dipanggil dari thread upload): tulis persen ke status[key],
+    lalu jadwalkan refresh() (coroutine edit pesan) di loop maksimal sekali per interval"""
+    last = [0.0]
+    def callback(sent: int, total: int):
+        status[key] = f"⏳ {sent * 100 / max(total, 1):.0f}%"
+        if refresh and loop and time.time() - last[0] >= interval:
+            last[0] = time.time()
+            asyncio.run_coroutine_threadsafe(refresh(), loop)
+    return callback
+
+SEEDBOX_AUTH = FileBrowserAuth(SEEDBOX_FB_URL, SEEDBOX_USER, SEEDBOX_PASS)
+
+def _filebrowser_post_upload(local_path: str, upload_url: str, source,
+                             report: Callable[[int], None]) -> bool:
+    """Upload satu POST streaming (FileBrowser lama tanpa TUS, atau GrowingFile saat pipeline). Gagal -> UploadError"""
+    def file_reader_with_progress():
+        uploaded = 0
+        with open_upload_source(local_path, source) as f:
+            while True:
+                chunk = f.read(MULTIPART_CHUNK)
+                if not chunk:
+                    break
+                uploaded += len(chunk)
+                report(uploaded)
+                yield chunk
+
+    # Token bersama (login hanya jika belum ada / expired), 401 -> login ulang sekali
+    for attempt in range(2):
+        token = SEEDBOX_AUTH.token()
+        if not token:
+            raise UploadError("FileBrowser login gagal")
+        # POST dengan streaming body
+        upload_resp = http_post(
+            upload_url,
+            headers={"X-Auth": token},
+            data=file_reader_with_progress(),
+            timeout=3600  # 1 hour timeout for large files
+        )
+        if upload_resp.status_code != 401:
+            break
+        logger.warning("FileBrowser upload 401, token diperbarui")
+        SEEDBOX_AUTH.invalidate(token)
+
+    if upload_resp.status_code not in [200, 201]:
+        raise UploadError(f"upload failed: {upload_resp.status_code} - {upload_resp.text[:300]}", status=upload_resp.status_code)
+    return True
+
+def filebrowser_upload_file(local_path: str, chat_id: int = None, res: str = None, source: FanoutReader = None,
+                            growing: GrowingFile = None) -> str:
+    """Upload file ke seedbox via FileBrowser API (TUS resumable, fallback POST). Returns: download URL, None jika nonaktif. Gagal -> raise.
+    growing = output yang masih di-encode: POST chunked mengikuti file (TUS butuh Upload-Length di awal)."""
     if not SEEDBOX_ENABLED:
         return None
     
     try:
         filename = os.path.basename(local_path)
-        file_size = os.path.getsize(local_path)
-        
-        # 1. Login ke FileBrowser untuk dapat token
-        login_url = f"{SEEDBOX_FB_URL}/api/login"
-        login_resp = requests.post(login_url, json={
-            "username": SEEDBOX_USER,
-            "password": SEEDBOX_PASS
-        }, timeout=30)
-        
-        if login_resp.status_code != 200:
-            logger.error(f"FileBrowser login failed: {login_resp.status_code}")
-            return None
-        
-        token = login_resp.text
-        headers = {"X-Auth": token}
-        
-        # 2. Upload file via API
-        # FileBrowser API: POST /api/resources/{path}
+        file_size = 0 if growing else os.path.getsize(local_path)
         encoded_filename = urllib.parse.quote(filename)
-        upload_url = f"{SEEDBOX_FB_URL}/api/resources/downloads/upload/{encoded_filename}"
-        
-        # Upload dengan progress tracking
-        uploaded = [0]
-        last_update = [time.time()]
-        
-        def file_reader_with_progress():
-            chunk_size = 1024 * 1024  # 1MB chunks
-            with open(local_path, 'rb') as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    uploaded[0] += len(chunk)
-                    
-                    # Update progress setiap 1 detik
-                    if chat_id and res and time.time() - last_update[0] > 1:
-                        pct = (uploaded[0] / file_size) * 100
-                        if chat_id in STATUS_DASHBOARD and res in STATUS_DASHBOARD[chat_id].get("resolutions", {}):
-                            STATUS_DASHBOARD[chat_id]["resolutions"][res]["pct"] = pct
-                        last_update[0] = time.time()
-                    
-                    yield chunk
-        
-        # POST dengan streaming body
-        upload_resp = requests.post(
-            upload_url,
-            headers=headers,
-            data=file_reader_with_progress(),
-            timeout=3600  # 1 hour timeout for large files
-        )
-        
-        if upload_resp.status_code not in [200, 201]:
-            logger.error(f"FileBrowser upload failed: {upload_resp.status_code} - {upload_resp.text}")
-            return None
         
-        # 3. Generate download URL
+        # Progress ke dashboard setiap 1 detik
+        last_update = [0.0]
+        def report(uploaded: int):
+            # Saat pipeline, baris dashboard resolusi ini masih menampilkan progress encode
+            if chat_id and res and not growing and time.time() - last_update[0] > 1:
+                pct = (uploaded / max(file_size, 1)) * 100
+                if chat_id in STATUS_DASHBOARD and res in STATUS_DASHBOARD[chat_id].get("resolutions", {}):
+                    STATUS_DASHBOARD[chat_id]["resolutions"][res]["pct"] = pct
+                last_update[0] = time.time()
+        
+        # FileBrowser API: /api/tus/{path} (resumable) atau POST /api/resources/{path}
+        ok = None
+        if growing:
+            upload_url = f"{SEEDBOX_FB_URL}/api/resources/downloads/upload/{encoded_filename}?override=true"
+            ok = _filebrowser_post_upload(local_path, upload_url, growing, report)
+        elif SEEDBOX_TUS_ENABLED:
+            tus_url = f"{SEEDBOX_FB_URL}/api/tus/downloads/upload/{encoded_filename}"
+            ok = filebrowser_tus_upload(local_path, tus_url, file_size, SEEDBOX_AUTH, source, report)
+        if ok is None:
+            upload_url = f"{SEEDBOX_FB_URL}/api/resources/downloads/upload/{encoded_filename}"
+            ok = _filebrowser_post_upload(local_path, upload_url, source, report)
+        if not ok:
+            # TUS sudah retry + resume sendiri; ulang dari nol tidak ada gunanya
+            raise UploadError("TUS upload gagal setelah retry", retryable=False)
+        
+        # Generate download URL
         fb_link = f"{SEEDBOX_FB_URL}/api/public/dl/{SEEDBOX_FB_SHARE_HASH}/{encoded_filename}"
         logger.info(f"FileBrowser Upload Success: {filename}")
         return fb_link
         
     except Exception as e:
         logger.error(f"FileBrowser Upload Error: {e}")
-        return None
+        raise
 
-def mirrored_upload_file(local_path: str) -> str:
-    """Upload file ke Mirrored.to. Returns: mir.cr short link atau None jika gagal."""
+def mirrored_upload_file(local_path: str, progress: Callable[[int, int], None] = None,
+                         source: FanoutReader = None) -> str:
+    """Upload file ke Mirrored.to. Returns: mir.cr short link, None jika nonaktif. Gagal -> raise (lihat run_upload)."""
     if not MIRRORED_ENABLED:
         return None
     
@@ -419,15 +818,14 @@ def mirrored_upload_file(local_path: str) -> str:
         file_size_mb = os.path.getsize(local_path) / (1024 * 1024)
         
         # Step 1: Get Upload Info (POST required)
-        resp1 = requests.post(
+        resp1 = http_post(
             "https://www.mirrored.to/api/v1/get_upload_info",
             data={"api_key": MIRRORED_API_KEY},
             timeout=30
         ).json()
         
         if "message" not in resp1 or "upload_id" not in resp1.get("message", {}):
-            logger.error(f"Mirrored get_upload_info failed: {resp1}")
-            return None
+            raise UploadError(f"get_upload_info failed: {resp1}")
         
         msg = resp1["message"]
         upload_id = msg["upload_id"]
@@ -436,28 +834,29 @@ def mirrored_upload_file(local_path: str) -> str:
         
         # Check file size
         if file_size_mb > max_filesize:
-            logger.error(f"File too large for Mirrored.to: {file_size_mb:.1f}MB > {max_filesize}MB")
-            return None
+            raise UploadError(f"File too large: {file_size_mb:.1f}MB > {max_filesize}MB", retryable=False, host_fault=False)
         
         logger.info(f"Mirrored upload_id: {upload_id}")
         
-        # Step 2: Upload File
-        with open(local_path, 'rb') as f:
-            resp2 = requests.post(
-                file_upload_url,
-                data={"api_key": MIRRORED_API_KEY, "upload_id": upload_id},
-                files={"Filedata": (filename, f)},
-                timeout=3600  # 1 hour for large files
-            ).json()
+        # Step 2: Upload File (multipart streaming dari disk)
+        body = MultipartStream(
+            {"api_key": MIRRORED_API_KEY, "upload_id": upload_id},
+            "Filedata", local_path, filename, progress, source
+        )
+        resp2 = http_post(
+            file_upload_url,
+            headers=body.headers,
+            data=body,
+            timeout=3600  # 1 hour for large files
+        ).json()
         
         if "message" not in resp2 or "success" not in resp2.get("message", "").lower():
-            logger.error(f"Mirrored file upload failed: {resp2}")
-            return None
+            raise UploadError(f"file upload failed: {resp2}")
         
         logger.info(f"Mirrored file uploaded, generating links...")
         
         # Step 3: Generate Download Links (POST required)
-        resp3 = requests.post(
+        resp3 = http_post(
             "https://www.mirrored.to/api/v1/finish_upload",
             data={
                 "api_key": MIRRORED_API_KEY,
@@ -474,15 +873,14 @@ def mirrored_upload_file(local_path: str) -> str:
         elif isinstance(msg3, dict) and "full_url" in msg3:
             return msg3["full_url"]
         else:
-            logger.error(f"Mirrored finish_upload failed: {resp3}")
-            return None
+            raise UploadError(f"finish_upload failed: {resp3}")
         
     except Exception as e:
         logger.error(f"Mirrored Upload Error: {e}")
-        return None
+        raise
 
-def buzzheavier_upload_file(local_path: str) -> str:
-    """Upload file ke Buzzheavier (to user directory). Returns: download URL atau None jika gagal."""
+def buzzheavier_upload_file(local_path: str, source: FanoutReader = None) -> str:
+    """Upload file ke Buzzheavier (to user directory). Returns: download URL, None jika nonaktif. Gagal -> raise."""
     if not BUZZHEAVIER_ENABLED:
         return None
     
@@ -491,15 +889,14 @@ def buzzheavier_upload_file(local_path: str) -> str:
         headers = {"Authorization": f"Bearer {BUZZHEAVIER_ACCOUNT_ID}"}
         
         # Step 1: Get root directory ID
-        root_resp = requests.get(
+        root_resp = http_get(
             "https://buzzheavier.com/api/fs",
             headers=headers,
             timeout=30
         )
         
         if root_resp.status_code != 200:
-            logger.error(f"Buzzheavier get root dir failed: {root_resp.status_code}")
-            return None
+            raise UploadError(f"get root dir failed: {root_resp.status_code}", status=root_resp.status_code)
         
         root_data = root_resp.json()
         # Get the root directory ID from response
@@ -510,16 +907,15 @@ def buzzheavier_upload_file(local_path: str) -> str:
             parent_id = root_data["id"]
         
         if not parent_id:
-            logger.error(f"Buzzheavier: cannot find root dir ID: {root_data}")
-            return None
+            raise UploadError(f"cannot find root dir ID: {root_data}")
         
         logger.info(f"Buzzheavier root dir ID: {parent_id}")
         
         # Step 2: Upload to user directory with parentId
         upload_url = f"https://w.buzzheavier.com/{parent_id}/{urllib.parse.quote(filename)}"
         
-        with open(local_path, 'rb') as f:
-            resp = requests.put(
+        with open_upload_source(local_path, source) as f:
+            resp = http_put(
                 upload_url,
                 headers={
                     "Authorization": f"Bearer {BUZZHEAVIER_ACCOUNT_ID}",
@@ -552,15 +948,15 @@ def buzzheavier_upload_file(local_path: str) -> str:
             except Exception as parse_err:
                 logger.error(f"Buzzheavier parse error: {parse_err}")
         
-        logger.error(f"Buzzheavier upload failed: {resp.status_code} - {resp.text[:300]}")
-        return None
+        raise UploadError(f"upload failed: {resp.status_code} - {resp.text[:300]}", status=resp.status_code)
         
     except Exception as e:
         logger.error(f"Buzzheavier Upload Error: {e}")
-        return None
+        raise
 
-def gofile_upload_file(local_path: str) -> str:
-    """Upload file ke Gofile.io. Returns: download URL atau None jika gagal."""
+def gofile_upload_file(local_path: str, progress: Callable[[int, int], None] = None,
+                       source: FanoutReader = None) -> str:
+    """Upload file ke Gofile.io. Returns: download URL, None jika nonaktif. Gagal -> raise."""
     if not GOFILE_ENABLED:
         return None
     
@@ -568,21 +964,20 @@ def gofile_upload_file(local_path: str) -> str:
         filename = os.path.basename(local_path)
         
         # Step 1: Get best server
-        server_resp = requests.get("https://api.gofile.io/servers", timeout=30).json()
+        server_resp = http_get("https://api.gofile.io/servers", timeout=30).json()
         if server_resp.get("status") != "ok":
-            logger.error(f"Gofile get server failed: {server_resp}")
-            return None
+            raise UploadError(f"get server failed: {server_resp}")
         
         server = server_resp["data"]["servers"][0]["name"]
         
-        # Step 2: Upload file
-        with open(local_path, 'rb') as f:
-            resp = requests.post(
-                f"https://{server}.gofile.io/contents/uploadfile",
-                headers={"Authorization": f"Bearer {GOFILE_TOKEN}"},
-                files={"file": (filename, f)},
-                timeout=3600
-            )
+        # Step 2: Upload file (multipart streaming dari disk)
+        body = MultipartStream({}, "file", local_path, filename, progress, source)
+        resp = http_post(
+            f"https://{server}.gofile.io/contents/uploadfile",
+            headers={"Authorization": f"Bearer {GOFILE_TOKEN}", **body.headers},
+            data=body,
+            timeout=3600
+        )
         
         data = resp.json()
         if data.get("status") == "ok":
@@ -590,35 +985,11 @@ def gofile_upload_file(local_path: str) -> str:
             logger.info(f"Gofile Upload Success: {download_page}")
             return download_page
         
-        logger.error(f"Gofile upload failed: {data}")
-        return None
+        raise UploadError(f"upload failed: {data}", status=resp.status_code)
         
     except Exception as e:
         logger.error(f"Gofile Upload Error: {e}")
-        return None
-
-def extract_gdrive_file_id(url_or_id: str) -> str:
-    """Extract Google Drive file ID from URL or return as-is if already an ID"""
-    if not url_or_id:
-        return None
-    
-    # Already an ID (no slashes or dots)
-    if "/" not in url_or_id and "." not in url_or_id:
-        return url_or_id
-    
-    # Extract from various GDrive URL formats
-    patterns = [
-        r"/file/d/([a-zA-Z0-9_-]+)",  # /file/d/ID
-        r"id=([a-zA-Z0-9_-]+)",        # ?id=ID
-        r"/open\?id=([a-zA-Z0-9_-]+)", # /open?id=ID
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url_or_id)
-        if match:
-            return match.group(1)
-    
-    return None
+        raise
 
 def filepress_mirror(gdrive_url_or_id: str, quality: int = None) -> str:
     """Mirror Google Drive file to FilePress. Returns FilePress link or None."""
@@ -640,7 +1011,7 @@ def filepress_mirror(gdrive_url_or_id: str, quality: int = None) -> str:
         if quality:
             payload["quality"] = quality
         
-        resp = requests.post(
+        resp = http_post(
             f"{FILEPRESS_DOMAIN}/api/v1/file/add",
             headers={"Content-Type": "application/json"},
             json=payload,
@@ -689,7 +1060,7 @@ def turbovid_remote_upload(seedbox_url: str, filename: str) -> str:
     
     try:
         # API: https://api.turboviplay.com/uploadUrl?keyApi={key}&url={url}&newTitle={title}
-        resp = requests.get(
+        resp = http_get(
             "https://api.turboviplay.com/uploadUrl",
             params={
                 "keyApi": TURBOVID_API_KEY,
@@ -735,7 +1106,7 @@ def abyss_remote_upload(gdrive_url: str) -> str:
         logger.info(f"Abyss: Uploading file_id={file_id}")
         
         # API: POST https://api.abyss.to/v1/remote/{fileId}
-        resp = requests.post(
+        resp = http_post(
             f"https://api.abyss.to/v1/remote/{file_id}",
             headers={
                 "Authorization": f"Bearer {ABYSS_API_KEY}",
@@ -797,7 +1168,7 @@ def vidhide_remote_upload(seedbox_url: str, filename: str) -> str:
         logger.info(f"VidHide: Uploading from {seedbox_url[:50]}...")
         
         # API: GET https://earnvidsapi.com/api1/upload/url?key={key}&url={url}
-        resp = requests.get(
+        resp = http_get(
             "https://earnvidsapi.com/api1/upload/url",
             params={
                 "key": VIDHIDE_API_KEY,
@@ -851,6 +1222,241 @@ def vidhide_remote_upload(seedbox_url: str, filename: str) -> str:
         logger.error(f"VidHide Remote Upload Error: {e}")
         return None
 
+class RcloneUploadHandle:
+    """Penanda upload rcd di ACTIVE_PROCESSES: /cancel mengosongkan list itu -> job rc dihentikan.
+    (force_kill_process tidak berbuat apa-apa karena tidak ada pid)"""
+    pid = None
+
+def gdrive_upload_file(local_path: str, chat_id: int = None, progress: Callable[[int, int], None] = None) -> str:
+    """Upload file ke GDrive (RCLONE_FOLDER) lalu ambil file ID. Returns: link GDrive. Gagal -> raise.
+    Lewat rclone rcd (copyfile async + core/stats untuk progress, operations/stat untuk ID) jika tersedia,
+    selain itu spawn rclone copy + lsjson."""
+    out_basename = os.path.basename(local_path)
+    if RCLONE_RC_ENABLED and RCLONE_RC.start():
+        handle = RcloneUploadHandle()
+        ACTIVE_PROCESSES.setdefault(chat_id, []).append(handle)
+        # core/bwlimit berlaku untuk seluruh rcd: dipasang selama ada upload GDrive, dilepas setelah yang terakhir
+        bwlimit = RCLONE_RC.bwlimit(UL_SCHEDULER.bandwidth_share) if UPLOAD_BANDWIDTH_LIMIT_MB > 0 else contextlib.nullcontext()
+        try:
+            with bwlimit:
+                rc_copyfile(
+                    local_path, f"{RCLONE_REMOTE}:", f"{RCLONE_FOLDER}/{out_basename}", progress,
+                    lambda: handle not in ACTIVE_PROCESSES.get(chat_id, [])
+                )
+        finally:
+            if chat_id in ACTIVE_PROCESSES and handle in ACTIVE_PROCESSES[chat_id]:
+                ACTIVE_PROCESSES[chat_id].remove(handle)
+        return gdrive_file_link(out_basename)
+    
+    cmd = ["rclone", "copy", local_path, f"{RCLONE_REMOTE}:{RCLONE_FOLDER}", "-v"]
+    # rclone membaca file sendiri: jatah upload untuk proses ini saja, diberikan saat mulai
+    bwlimit = UL_SCHEDULER.bandwidth_share()
+    if bwlimit:
+        cmd += ["--bwlimit", f"{max(bwlimit // 1024, 1)}K"]
+    p = subprocess.Popen(cmd, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
+    if chat_id not in ACTIVE_PROCESSES: ACTIVE_PROCESSES[chat_id] = []
+    ACTIVE_PROCESSES[chat_id].append(p)
+    try:
+        _, err = p.communicate()
+    finally:
+        if chat_id in ACTIVE_PROCESSES and p in ACTIVE_PROCESSES[chat_id]:
+            ACTIVE_PROCESSES[chat_id].remove(p)
+    if p.returncode != 0:
+        raise UploadError(f"rclone copy exit {p.returncode}: {err.strip()[-300:]}")
+    return gdrive_file_link(out_basename)
+
+def gdrive_stream_upload(local_path: str, chat_id: int = None, growing: GrowingFile = None) -> str:
+    """Upload output yang masih di-encode ke GDrive lewat `rclone rcat` (stdin, ukuran tidak perlu diketahui).
+    Encode gagal / koneksi putus -> rcat di-kill (bukan stdin ditutup, EOF = rcat menganggap file lengkap)."""
+    out_basename = os.path.basename(local_path)
+    cmd = ["rclone", "rcat", f"{RCLONE_REMOTE}:{RCLONE_FOLDER}/{out_basename}", "--log-level", "ERROR"]
+    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **get_hidden_params())
+    ACTIVE_PROCESSES.setdefault(chat_id, []).append(p)
+    try:
+        try:
+            with throttled(growing.open()) as src:
+                while True:
+                    chunk = src.read(MULTIPART_CHUNK)
+                    if not chunk:
+                        break
+                    p.stdin.write(chunk)
+        except BaseException:
+            force_kill_process(p)
+            p.wait()
+            raise
+        _, err = p.communicate()
+    finally:
+        if chat_id in ACTIVE_PROCESSES and p in ACTIVE_PROCESSES[chat_id]:
+            ACTIVE_PROCESSES[chat_id].remove(p)
+    if p.returncode != 0:
+        raise UploadError(f"rclone rcat exit {p.returncode}: {err.decode(errors='ignore').strip()[-300:]}")
+    return gdrive_file_link(out_basename)
+
+def gdrive_file_link(out_basename: str) -> str:
+    """Link GDrive file di RCLONE_FOLDER: ID lewat rclone rcd (operations/stat) jika tersedia, selain itu lsjson"""
+    if RCLONE_RC_ENABLED and RCLONE_RC.start():
+        fid = rc_file_id(f"{RCLONE_REMOTE}:", f"{RCLONE_FOLDER}/{out_basename}")
+    else:
+        # Use basename for lsjson since rclone uploads to remote folder directly
+        ls = subprocess.check_output(["rclone", "lsjson", f"{RCLONE_REMOTE}:{RCLONE_FOLDER}/{out_basename}"], text=True, **get_hidden_params())
+        fid = (json.loads(ls) or [{}])[0].get("ID")
+    if not fid:
+        raise UploadError(f"{out_basename} tidak ditemukan di {RCLONE_REMOTE}:{RCLONE_FOLDER} setelah upload")
+    return f"https://drive.google.com/file/d/{fid}/view?usp=drivesdk"
+
+# =====================================================
+# UPLOAD GRAPH (host tujuan + dependensi link sumber)
+# =====================================================
+# Urutan dict = urutan tampil di pesan. Field:
+#   icon/name  : label pesan progress & hasil (final_icon opsional untuk pesan hasil)
+#   enabled    : callable, host dipakai atau tidak
+#   after      : host sumber; host ini mulai begitu link sumber ada (dapat link via argumen src)
+#   only       : resolusi yang diupload (None = semua)
+#   retries    : override UPLOAD_RETRIES (0 untuk remote upload)
+#   primary    : link utama, didahulukan UL_SCHEDULER dari mirror saat slot penuh
+#   call       : (ctx, src) -> (fungsi uploader, *args), dijalankan lewat run_upload
+#   stream     : (ctx, growing) -> (fungsi uploader, *args) untuk upload selagi FFmpeg masih menulis
+#                output (GrowingFile); hanya dipakai jika host ada di UPLOAD_PIPELINE_HOSTS
+# Host baru cukup ditambah di sini.
+UPLOAD_GRAPH = {
+    "seedbox": {
+        "icon": "📦", "name": "Seedbox", "enabled": lambda: SEEDBOX_ENABLED, "primary": True,
+        "call": lambda ctx, src: (filebrowser_upload_file, ctx["out_file"], ctx["chat_id"], ctx["res"], ctx["fanout"]),
+        "stream": lambda ctx, growing: (filebrowser_upload_file, ctx["out_file"], ctx["chat_id"], ctx["res"], None, growing),
+    },
+    "gdrive": {
+        "icon": "☁️", "final_icon": "🔗", "name": "GDrive", "enabled": lambda: True, "retries": 0, "primary": True,
+        "call": lambda ctx, src: (gdrive_upload_file, ctx["out_file"], ctx["chat_id"], ctx["progress"]("gdrive")),
+        "stream": lambda ctx, growing: (gdrive_stream_upload, ctx["out_file"], ctx["chat_id"], growing),
+    },
+    "buzzheavier": {
+        "icon": "🐝", "name": "Buzzheavier", "enabled": lambda: BUZZHEAVIER_ENABLED,
+        "call": lambda ctx, src: (buzzheavier_upload_file, ctx["out_file"], ctx["fanout"]),
+    },
+    "gofile": {
+        "icon": "📁", "name": "Gofile", "enabled": lambda: GOFILE_ENABLED,
+        "call": lambda ctx, src: (gofile_upload_file, ctx["out_file"], ctx["progress"]("gofile"), ctx["fanout"]),
+    },
+    "filepress": {
+        "icon": "🎬", "name": "FilePress", "enabled": lambda: FILEPRESS_ENABLED, "after": "gdrive", "retries": 0,
+        "call": lambda ctx, src: (filepress_mirror, src, int(ctx["res"].replace("p", "")) if ctx["res"] else None),
+    },
+    "mirrored": {
+        "icon": "🪞", "name": "Mirrored", "enabled": lambda: MIRRORED_ENABLED,
+        "call": lambda ctx, src: (mirrored_upload_file, ctx["out_file"], ctx["progress"]("mirrored"), ctx["fanout"]),
+    },
+    "turbovid": {
+        "icon": "📺", "name": "TurboVid", "enabled": lambda: TURBOVID_ENABLED, "after": "seedbox",
+        "only": ("1080p",), "retries": 0,
+        "call": lambda ctx, src: (turbovid_remote_upload, src, os.path.basename(ctx["out_file"])),
+    },
+    "abyss": {
+        "icon": "🌀", "name": "Abyss", "enabled": lambda: ABYSS_ENABLED, "after": "gdrive",
+        "only": ("1080p",), "retries": 0,
+        "call": lambda ctx, src: (abyss_remote_upload, src),
+    },
+    "vidhide": {
+        "icon": "🎬", "name": "VidHide", "enabled": lambda: VIDHIDE_ENABLED, "after": "seedbox",
+        "only": ("1080p",), "retries": 0,
+        "call": lambda ctx, src: (vidhide_remote_upload, src, os.path.basename(ctx["out_file"])),
+    },
+}
+
+def _check_upload_graph():
+    """Sumber ('after') harus host yang didefinisikan lebih dulu -> graph pasti tanpa siklus"""
+    seen = set()
+    for name, spec in UPLOAD_GRAPH.items():
+        if spec.get("after") and spec["after"] not in seen:
+            raise ValueError(f"UPLOAD_GRAPH: {name} bergantung pada {spec['after']} yang belum didefinisikan di atasnya")
+        seen.add(name)
+    for name in UPLOAD_PIPELINE_HOSTS:
+        if "stream" not in UPLOAD_GRAPH.get(name, {}):
+            logger.warning(f"UPLOAD_PIPELINE_HOSTS: {name} tidak mendukung upload selagi encode, diabaikan")
+
+_check_upload_graph()
+
+# Slot per host upload + bandwidth upload global (UploadScheduler di uploader.py)
+UL_SCHEDULER = UploadScheduler(UPLOAD_TOTAL_LIMIT, UPLOAD_HOST_LIMIT, UPLOAD_HOST_LIMITS, UPLOAD_BANDWIDTH_LIMIT_MB, UPLOAD_GRAPH)
+set_bandwidth_share(UL_SCHEDULER.bandwidth_share)
+
+def upload_graph_status(res: str) -> dict:
+    """Status awal per host: ⏳ akan diupload, ⭕ nonaktif / bukan resolusinya"""
+    return {
+        name: "⏳" if spec["enabled"]() and (not spec.get("only") or res in spec["only"]) else "⭕"
+        for name, spec in UPLOAD_GRAPH.items()
+    }
+
+def pipeline_hosts(res: str) -> list:
+    """Host yang benar-benar akan upload selagi encode untuk resolusi ini: ada di UPLOAD_PIPELINE_HOSTS,
+    punya entri 'stream', aktif, resolusinya cocok, dan circuit-nya tidak open.
+    Kosong -> output tetap MP4 biasa (fMP4 hanya jika ada host yang mengikuti file saat ditulis)."""
+    return [
+        name for name, spec in UPLOAD_GRAPH.items()
+        if name in UPLOAD_PIPELINE_HOSTS and "stream" in spec and spec["enabled"]()
+        and (not spec.get("only") or res in spec["only"]) and not upload_breaker(name).is_open
+    ]
+
+def start_pipelined_uploads(out_file: str, chat_id: int, res: str) -> Optional[tuple]:
+    """Mulai upload pipeline_hosts(res) selagi FFmpeg masih menulis out_file (encode harus fMP4).
+    Returns (GrowingFile, {host: Task link}) atau None jika tidak ada host pipeline untuk resolusi ini.
+    Pemanggil wajib finish() GrowingFile: True setelah encode sukses, False jika gagal/dibatalkan."""
+    names = pipeline_hosts(res)
+    if not names:
+        return None
+    if os.path.exists(out_file):
+        os.remove(out_file)  # Sisa run sebelumnya jangan ikut terbaca sebelum FFmpeg menimpanya
+    growing = GrowingFile(out_file)
+    ctx = {"out_file": out_file, "chat_id": chat_id, "res": res}
+    tasks = {}
+    for name in names:
+        func, *args = UPLOAD_GRAPH[name]["stream"](ctx, growing)
+        # Stream tidak bisa diulang di tengah; gagal -> upload biasa dari file lengkap di run_upload_graph
+        tasks[name] = asyncio.create_task(run_upload(name, func, *args, retries=0))
+    return growing, tasks
+
+async def run_upload_graph(ctx: dict, status: dict, links: dict, refresh) -> dict:
+    """Jalankan semua host paralel. Tiap host punya Future berisi link-nya; host dengan 'after'
+    menunggu Future sumber (langsung jalan saat link ada, tanpa polling). Returns links.
+    ctx["pipelined"] = {host: Task} dari start_pipelined_uploads: hasilnya dipakai, upload ulang hanya jika gagal."""
+    loop = asyncio.get_running_loop()
+    done = {name: loop.create_future() for name in UPLOAD_GRAPH}
+    ctx = {**ctx, "progress": lambda name: status_progress(status, name, refresh, loop)}
+
+    async def run_host(name: str, spec: dict):
+        link = None
+        try:
+            if status[name] == "⭕":
+                return
+            src = None
+            if spec.get("after"):
+                src = await done[spec["after"]]
+                if not src:
+                    status[name] = "❌"  # Sumber gagal / nonaktif
+                    await refresh()
+                    return
+            pipelined = ctx.get("pipelined", {}).get(name)
+            if pipelined:
+                status[name] = "⏳ stream"
+                link = await pipelined
+                if link:
+                    status[name] = "✅"
+                else:
+                    logger.warning(f"Upload streaming {name} gagal, upload ulang dari file lengkap")
+            if not link:
+                func, *args = spec["call"](ctx, src)
+                link = await run_upload(name, func, *args, retries=spec.get("retries"), status=status, refresh=refresh)
+            links[name] = link
+            await refresh()
+        except Exception as e:
+            logger.error(f"Upload {name} error: {e}")
+            status[name] = "❌"
+            await refresh()
+        finally:
+            done[name].set_result(link)
+
+    await asyncio.gather(*(run_host(name, spec) for name, spec in UPLOAD_GRAPH.items()))
+    return links
+
 def clean_filename(original_name: str, res_tag: str) -> str:
     original_name = os.path.basename(original_name)
     original_name = urllib.parse.unquote(original_name)
@@ -869,25 +1475,141 @@ def clean_filename(original_name: str, res_tag: str) -> str:
     if len(base) < 2: base = "Video_Unknown"
     return f"{base}.{res_tag}.mp4"
 
-def get_real_filename(url: str) -> str:
+# --- FILENAME RESOLVER ---
+# Urutan: URL FileBrowser -> rclone (GDrive) -> Content-Disposition dari HEAD -> yt-dlp.
+# yt-dlp (spawn + extractor, bisa 20 detik) hanya untuk URL yang tidak bisa dijawab
+# metadata ringan, dan satu batch cukup satu proses yt-dlp.
+
+FILENAME_CACHE = {}  # {url: (name, expires_at)}
+VIDEO_EXTS = ('.mkv', '.mp4', '.avi', '.mov', '.webm', '.ts', '.m2ts')
+
+def _clean_resolved_name(name: str, from_ytdlp: bool = False) -> Optional[str]:
+    name = os.path.basename((name or "").strip().split("\n")[0])
+    # FIX: Double Extension (misal .mp4.mp4)
+    if name.lower().endswith(".mp4.mp4"): name = name[:-4]
+    if name.lower().endswith(".mkv.mkv"): name = name[:-4]
+    # "NA" = field kosong di template yt-dlp
+    if name and not (from_ytdlp and "NA" in name) and len(name) > 3:
+        return name
+    return None
+
+def _name_from_filebrowser(url: str) -> Optional[str]:
+    """Link download FileBrowser sudah memuat nama file; share link ditanya ke API-nya"""
+    path = urllib.parse.urlparse(url).path
+    if "/api/public/dl/" in path:
+        return urllib.parse.unquote(path.rsplit("/", 1)[-1])
+    fb_info = parse_filebrowser_url(url)
+    if not fb_info:
+        return None
+    r = http_get(fb_info["api_base"], headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0"}, timeout=15)
+    data = r.json() if r.ok else {}
+    # Share satu file: API mengembalikan metadata file itu sendiri
+    if isinstance(data, dict) and not data.get("isDir", True):
+        return data.get("name")
+    return None
+
+def _name_from_rclone(file_id: str) -> Optional[str]:
+    """Nama file GDrive lewat API Drive (auth rclone): remote dengan root_folder_id = file ID
+    hanya berisi file itu. Lewat rclone rcd (operations/list) jika tersedia, selain itu lsjson."""
+    fs = f"{RCLONE_REMOTE},root_folder_id={file_id}:"
+    if RCLONE_RC_ENABLED and RCLONE_RC.start():
+        items = RCLONE_RC.call("operations/list", timeout=20, fs=fs, remote="", opt={"filesOnly": True}).get("list")
+    elif shutil.which("rclone"):
+        out = subprocess.run(["rclone", "lsjson", "--files-only", fs],
+                             capture_output=True, text=True, timeout=20, **get_hidden_params()).stdout
+        items = json.loads(out or "[]")
+    else:
+        return None
+    # ID dicocokkan: jika file_id ternyata folder, listing berisi isi folder, bukan item itu sendiri
+    return next((item["Name"] for item in items or [] if item.get("ID") == file_id), None)
+
+def _name_from_head(url: str) -> Optional[str]:
+    """filename dari Content-Disposition, atau nama path URL final jika itu file video"""
+    r = http_head(url, headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0"},
+                      allow_redirects=True, timeout=10)
+    if not r.ok or "text/html" in r.headers.get("Content-Type", ""):
+        return None
+    disposition = r.headers.get("Content-Disposition", "")
+    match = re.search(r"filename\*\s*=\s*[^']*'[^']*'([^;]+)", disposition)
+    if match:
+        return urllib.parse.unquote(match.group(1).strip().strip('"'))
+    match = re.search(r'filename\s*=\s*"?([^";]+)"?', disposition)
+    if match:
+        return match.group(1).strip()
+    basename = urllib.parse.unquote(os.path.basename(urllib.parse.urlparse(r.url).path))
+    return basename if basename.lower().endswith(VIDEO_EXTS) else None
+
+def _resolve_light(url: str) -> Optional[str]:
+    """Resolver ringan (tanpa yt-dlp), blocking"""
+    gdrive_id = extract_gdrive_file_id(url) if "drive.google." in url or "docs.google." in url else None
+    steps = [_name_from_filebrowser]
+    if gdrive_id:
+        steps = [lambda _: _name_from_rclone(gdrive_id),
+                 lambda _: _name_from_head(f"https://drive.google.com/uc?export=download&id={gdrive_id}")]
+    else:
+        steps.append(_name_from_head)
+    for step in steps:
+        try:
+            name = _clean_resolved_name(step(url))
+            if name:
+                return name
+        except Exception as e:
+            logger.debug(f"Filename resolver step failed for {url[:80]}: {e}")
+    return None
+
+def _names_from_ytdlp(urls: list) -> dict:
+    """Satu task/proses yt-dlp untuk semua URL sisa. Returns {url: name}"""
+    if ytdlp_library_available():
+        found = ytdlp_filenames(urls, timeout=20 + 5 * len(urls))
+        return {url: name for url, name in ((u, _clean_resolved_name(n, from_ytdlp=True)) for u, n in found.items()) if name}
+    names = {}
     try:
-        # UPDATE: Coba ambil title, bukan filename, agar lebih bersih dari GDrive
-        out = subprocess.check_output(
-            ["yt-dlp", "--get-filename", "-o", "%(title)s.%(ext)s", "--no-warnings", url],
-            text=True, timeout=20, **get_hidden_params()
-        )
-        name = out.strip().split("\n")[0]
-        
-        # FIX: Double Extension (misal .mp4.mp4)
-        if name.lower().endswith(".mp4.mp4"): name = name[:-4]
-        if name.lower().endswith(".mkv.mkv"): name = name[:-4]
-        
-        if name and "NA" not in name and len(name) > 3:
-            return name
-            
-    except:
-        pass
-        
+        out = subprocess.run(
+            ["yt-dlp", "--ignore-errors", "--no-warnings", "--print", "%(original_url)s\t%(title)s.%(ext)s", *urls],
+            capture_output=True, text=True, timeout=20 + 5 * len(urls), **get_hidden_params()
+        ).stdout
+        for line in out.splitlines():
+            url, _, name = line.partition("\t")
+            name = _clean_resolved_name(name, from_ytdlp=True)
+            if url in urls and name:
+                names[url] = name
+    except Exception as e:
+        logger.warning(f"yt-dlp filename lookup failed: {e}")
+    return names
+
+def ytdlp_fetch(url: str, dest: str, on_progress=None, ratelimit: int = 0):
+    """Download URL ke dest (overwrite) lewat yt-dlp: library pool, atau CLI jika tidak tersedia.
+
+    on_progress(dict pct/size/speed) opsional, ratelimit byte/detik (0 = bebas).
+    Blocking, raise Exception jika gagal.
+    """
+    if ytdlp_library_available():
+        try:
+            ytdlp_download(url, dest, on_progress, resume=False, ratelimit=ratelimit)
+        except DownloadError as e:
+            raise Exception(f"Download failed: {e}")
+        return
+    
+    cmd = ["yt-dlp", "-o", dest, "--newline", "--force-overwrites", url]
+    if ratelimit:
+        cmd[1:1] = ["-r", str(ratelimit)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8', errors='ignore', **get_hidden_params())
+    for line in p.stdout:
+        if on_progress and "[download]" in line:
+            # [download]  55.6% of 2.00GiB at  5.2MiB/s ETA 00:08
+            pct_match = re.search(r"(\d+\.?\d*)%", line)
+            size_match = re.search(r"of\s+([\d.]+\s*[KMGT]?i?B)", line)
+            speed_match = re.search(r"at\s+([\d.]+\s*[KMGT]?i?B/s)", line)
+            info = {}
+            if pct_match: info["pct"] = float(pct_match.group(1))
+            if size_match: info["size"] = size_match.group(1)
+            if speed_match: info["speed"] = speed_match.group(1)
+            if info: on_progress(info)
+    p.wait()
+    if p.returncode != 0:
+        raise Exception("Download failed")
+
+def _fallback_filename(url: str) -> str:
     # --- FALLBACK JIKA GAGAL / NA ---
     gdrive_match = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
     if gdrive_match:
@@ -899,128 +1621,37 @@ def get_real_filename(url: str) -> str:
         
     return "Video_Unknown.mp4"
 
-def get_video_metadata(filename: str) -> dict:
-    """Mendapatkan detail video (durasi, lebar, tinggi) untuk Telegram"""
-    meta = {"width": 0, "height": 0, "duration": 0, "str": "Info Unavailable"}
-    try:
-        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=width,height,codec_name", "-of", "json", filename]
-        out = subprocess.check_output(cmd, text=True, **get_hidden_params())
-        data = json.loads(out)
-        
-        # Get Video Stream
-        streams = data.get("streams", [])
-        v = next((s for s in streams if s.get("codec_name") not in ["aac", "mp3", "opus"]), {})
-        a = next((s for s in streams if s.get("codec_name") in ["aac", "mp3", "opus"]), {})
-        
-        meta["width"] = int(v.get("width", 0))
-        meta["height"] = int(v.get("height", 0))
-        meta["duration"] = int(float(data.get("format", {}).get("duration", 0)))
-        meta["str"] = f"{meta['width']}x{meta['height']} | {v.get('codec_name', 'unk')} | {a.get('codec_name', 'unk')}"
-    except:
-        pass
-    return meta
+def resolve_filenames_sync(urls: list) -> dict:
+    """Nama file untuk banyak URL sekaligus (cache TTL per URL). Returns {url: name}, blocking."""
+    now = time.time()
+    names, pending = {}, []
+    for url in dict.fromkeys(urls):
+        cached = FILENAME_CACHE.get(url)
+        if cached and cached[1] > now:
+            names[url] = cached[0]
+        else:
+            pending.append(url)
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as pool:
+            for url, name in zip(pending, pool.map(_resolve_light, pending)):
+                if name:
+                    names[url] = name
+        remaining = [url for url in pending if url not in names]
+        if remaining:
+            names.update(_names_from_ytdlp(remaining))
+        for url in pending:
+            if url in names:
+                FILENAME_CACHE[url] = (names[url], now + FILENAME_CACHE_TTL)
+            else:
+                names[url] = _fallback_filename(url)  # Tidak di-cache, dicoba lagi nanti
+    return names
 
-def get_indo_subtitle_index(filename: str) -> Optional[int]:
-    """Mencari index subtitle Indonesia (matching bash script logic)"""
-    try:
-        # ffprobe -v error -select_streams s -show_entries stream_tags=language -of csv=p=0
-        cmd = [
-            "ffprobe", "-v", "error", "-select_streams", "s",
-            "-show_entries", "stream_tags=language",
-            "-of", "csv=p=0", filename,
-        ]
-        out = subprocess.check_output(cmd, text=True, **get_hidden_params())
-        
-        # Output: satu bahasa per line, e.g.:
-        # eng
-        # ind
-        # chi
-        lines = out.strip().split("\n") if out.strip() else []
-        
-        logger.info(f"Subtitle detection - found {len(lines)} streams: {lines[:10]}")
-        
-        # Cari line yang mengandung 'ind' atau 'indonesian'
-        for i, lang in enumerate(lines):
-            lang_lower = lang.lower().strip()
-            if "ind" in lang_lower or "indonesian" in lang_lower:
-                logger.info(f"Found Indonesian subtitle at stream index {i}: {lang}")
-                return i  # Subtitle stream index (0-based)
-        
-        logger.warning("No Indonesian subtitle found")
-        return None
-    except Exception as e:
-        logger.error(f"Error detecting subtitle: {e}")
-        return None
+async def resolve_filenames(urls: list) -> dict:
+    return await asyncio.to_thread(resolve_filenames_sync, urls)
 
-def extract_subtitle_with_watermark(input_file: str, sub_track: int, output_srt: str) -> bool:
-    """Extract subtitle from video and prepend watermark line.
-    
-    This is a workaround for missing drawtext filter - we inject watermark 
-    into the subtitle file as the first entry.
-    """
-    try:
-        # Extract subtitle to temp file
-        temp_srt = output_srt + ".tmp"
-        cmd = [
-            "ffmpeg", "-y", "-i", input_file,
-            "-map", f"0:s:{sub_track}",
-            "-c:s", "srt",
-            temp_srt
-        ]
-        logger.info(f"Extracting subtitle: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"FFmpeg extract failed: {result.stderr[-500:]}")
-            return False
-        
-        if not os.path.exists(temp_srt):
-            logger.error(f"Temp SRT not created: {temp_srt}")
-            return False
-        
-        # Read extracted subtitle
-        with open(temp_srt, 'r', encoding='utf-8', errors='ignore') as f:
-            original_content = f.read()
-        
-        # Create watermark entry (shown at top center for first 30 seconds)
-        # {\an8} = top center alignment in ASS/SRT
-        watermark_entry = f"""1
-00:00:00,000 --> 00:00:{WATERMARK_DURATION:02d},000
-{{\\an8}}<font color="#FFFF00">{WATERMARK_TEXT}</font>
-
-"""
-        
-        # Renumber existing entries (shift all numbers by 1)
-        lines = original_content.strip().split('\n')
-        new_lines = []
-        entry_num = 1  # Start from 1, watermark is entry 1
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            # Check if this is an entry number
-            if line.isdigit():
-                entry_num += 1
-                new_lines.append(str(entry_num))
-            else:
-                new_lines.append(lines[i])
-            i += 1
-        
-        # Write final SRT with watermark at beginning
-        with open(output_srt, 'w', encoding='utf-8') as f:
-            f.write(watermark_entry)
-            f.write('\n'.join(new_lines))
-        
-        # Cleanup temp
-        if os.path.exists(temp_srt):
-            os.remove(temp_srt)
-        
-        logger.info(f"Created subtitle with watermark: {output_srt}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error extracting subtitle with watermark: {e}")
-        return False
+def get_real_filename(url: str) -> str:
+    return resolve_filenames_sync([url])[url]
 
 
 # =====================================================
@@ -1057,11 +1688,10 @@ def parse_filebrowser_url(url: str) -> Optional[dict]:
 def fetch_filebrowser_files(fb_info: dict) -> list:
     """Fetch list of files from FileBrowser API"""
     try:
-        import requests
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0"
         }
-        r = requests.get(fb_info["api_base"], headers=headers, timeout=30)
+        r = http_get(fb_info["api_base"], headers=headers, timeout=30)
         r.raise_for_status()
         data = r.json()
         
@@ -1088,6 +1718,385 @@ def build_filebrowser_download_url(fb_info: dict, filename: str) -> str:
     encoded_name = urllib.parse.quote(filename)
     return f"{fb_info['domain']}{fb_info['prefix']}/api/public/dl/{fb_info['hash']}/{encoded_name}"
 
+# =====================================================
+# ENCODER DAEMON CLIENT
+# =====================================================
+# FFmpeg/FFprobe dijalankan encoderd.py via Unix socket agar event loop bot tetap
+# responsif. Jika daemon tidak jalan, fallback ke thread di proses bot.
+
+def encoder_daemon_available() -> bool:
+    return bool(ENCODER_DAEMON_SOCKET) and os.path.exists(ENCODER_DAEMON_SOCKET)
+
+async def encoder_daemon_call(payload: dict, on_progress=None, is_cancelled=None):
+    """Kirim satu request ke encoderd dan tunggu event done/error"""
+    reader, writer = await asyncio.open_unix_connection(ENCODER_DAEMON_SOCKET)
+    try:
+        writer.write(json.dumps(payload).encode() + b"\n")
+        await writer.drain()
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=2)
+            except asyncio.TimeoutError:
+                line = None
+            if is_cancelled and is_cancelled():
+                raise Exception("Cancelled")  # Menutup koneksi = daemon kill FFmpeg
+            if line is None:
+                continue
+            if not line:
+                raise Exception("Encoder daemon disconnected")
+            msg = json.loads(line)
+            if msg["event"] == "progress":
+                if on_progress: on_progress(msg)
+            elif msg["event"] == "done":
+                return msg.get("result")
+            else:
+                raise Exception(msg.get("error", "Encoder daemon error"))
+    finally:
+        writer.close()
+
+async def run_encode(chat_id, res, input_file, output_file, mode, font, margin, srt_file, audio_prof, sub_track, crf_value="26",
+                     fragmented=False):
+    """Encode satu rendition lewat encoderd (jika ada) atau thread lokal"""
+    if not encoder_daemon_available():
+        return await asyncio.to_thread(
+            sync_ffmpeg_worker,
+            chat_id, res, input_file, output_file,
+            mode, font, margin, srt_file, audio_prof, sub_track, crf_value, fragmented
+        )
+    
+    def on_progress(msg):
+        info = STATUS_DASHBOARD.get(chat_id, {}).get("resolutions", {}).get(res)
+        if info is not None:
+            info["pct"] = msg["pct"]
+            info["status"] = msg["status"]
+    
+    await encoder_daemon_call({
+        "op": "encode", "res": res,
+        "input_file": input_file if input_file.startswith("http") else os.path.abspath(input_file), "output_file": os.path.abspath(output_file),
+        "mode": mode, "font": font, "margin": margin,
+        "srt_file": os.path.abspath(srt_file) if srt_file else None,
+        "audio": audio_prof, "sub_track": sub_track, "crf": crf_value, "fragmented": fragmented
+    }, on_progress, lambda: STATUS_DASHBOARD.get(chat_id, {}).get('is_cancelled', False))
+
+async def probe_metadata(path: str) -> dict:
+    """get_video_metadata tanpa memblokir event loop"""
+    if encoder_daemon_available():
+        try:
+            return await encoder_daemon_call({"op": "probe", "file": path if path.startswith("http") else os.path.abspath(path)})
+        except Exception as e:
+            logger.warning(f"Encoder daemon probe failed, fallback local: {e}")
+    return await asyncio.to_thread(get_video_metadata, path)
+
+async def verify_source_file(path: str, expected_size: int = 0) -> Optional[str]:
+    """verify_source (ukuran + index + decode sampel) tanpa memblokir event loop"""
+    if encoder_daemon_available():
+        try:
+            return await encoder_daemon_call({
+                "op": "verify", "file": os.path.abspath(path), "size": expected_size, "samples": SOURCE_VERIFY_SAMPLES
+            })
+        except Exception as e:
+            logger.warning(f"Encoder daemon verify failed, fallback local: {e}")
+    return await asyncio.to_thread(verify_source, path, expected_size, SOURCE_VERIFY_SAMPLES)
+
+def discard_source(path: str):
+    """Buang source rusak beserta sisa download & entri cache-nya"""
+    for p in (path, path + ".part", state_path(path)):
+        try:
+            if os.path.exists(p): os.remove(p)
+        except OSError: pass
+    for fid in [k for k, v in FILE_CACHE.items() if v.get('path') == path]:
+        del FILE_CACHE[fid]
+    save_file_cache()
+
+# =====================================================
+# DISTRIBUTED ENCODE (Coordinator)
+# =====================================================
+# Rendition di-lease ke worker.py lewat HTTP API kecil. Worker menarik source,
+# encode pakai sync_ffmpeg_worker, lapor progress via heartbeat, lalu PUT output.
+# Lease yang tidak di-heartbeat dalam LEASE_TTL dikembalikan ke antrian.
+
+def _resolve_future(fut, result=None, error=None):
+    """Dipanggil di event loop (via call_soon_threadsafe) untuk menyelesaikan future task"""
+    if fut.done():
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+class LeaseManager:
+    """State task/lease/worker untuk coordinator (thread-safe, dipakai handler HTTP)"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []   # [task_id] urut FIFO
+        self.tasks = {}     # {task_id: task}
+        self.leases = {}    # {lease_id: task_id}
+        self.workers = {}   # {worker_name: {"last_seen": ts, "lease": lease_id}}
+    
+    def submit(self, job_key: str, chat_id, res: str, input_file: str, output_file: str, params: dict):
+        """Daftarkan satu rendition. Returns (task_id, asyncio.Future)"""
+        loop = asyncio.get_running_loop()
+        st = os.stat(input_file)
+        task_id = uuid.uuid4().hex[:12]
+        task = {
+            "id": task_id, "job_key": job_key, "chat_id": chat_id, "res": res,
+            "input_file": input_file, "output_file": output_file, "params": params,
+            "source_id": hashlib.sha1(f"{os.path.abspath(input_file)}:{st.st_size}:{st.st_mtime}".encode()).hexdigest()[:16],
+            "source_size": st.st_size,
+            "future": loop.create_future(), "loop": loop,
+            "attempts": 0, "lease_id": None, "worker": None, "expires": 0, "cancelled": False,
+        }
+        with self.lock:
+            self.tasks[task_id] = task
+            self.pending.append(task_id)
+        return task_id, task["future"]
+    
+    def _finish(self, task, result=None, error=None):
+        self.tasks.pop(task["id"], None)
+        task["loop"].call_soon_threadsafe(_resolve_future, task["future"], result, error)
+    
+    def _reap_locked(self, now: float):
+        for lease_id, task_id in list(self.leases.items()):
+            task = self.tasks.get(task_id)
+            if task and task["expires"] >= now:
+                continue
+            del self.leases[lease_id]
+            if not task:
+                continue
+            logger.warning(f"Lease expired: {task['res']} @ {task['worker']} (attempt {task['attempts']})")
+            task.update(lease_id=None, worker=None)
+            if task["cancelled"]:
+                self.tasks.pop(task_id, None)
+            elif task["attempts"] >= TASK_MAX_ATTEMPTS:
+                self._finish(task, error=Exception(f"Worker lease expired {task['attempts']}x untuk {task['res']}"))
+            else:
+                self.pending.insert(0, task_id)
+    
+    def reap(self):
+        with self.lock:
+            self._reap_locked(time.time())
+    
+    def active_workers(self) -> list:
+        cutoff = time.time() - max(LEASE_TTL, WORKER_POLL_INTERVAL * 3)
+        with self.lock:
+            return [name for name, w in self.workers.items() if w["last_seen"] >= cutoff]
+    
+    def lease(self, worker: str, cached_sources: list) -> Optional[dict]:
+        now = time.time()
+        with self.lock:
+            self.workers.setdefault(worker, {"last_seen": now, "lease": None})["last_seen"] = now
+            self._reap_locked(now)
+            if not self.pending:
+                self.workers[worker]["lease"] = None
+                return None
+            # Afinitas: utamakan rendition yang source-nya sudah ada di worker
+            task_id = next((t for t in self.pending if self.tasks[t]["source_id"] in cached_sources), self.pending[0])
+            self.pending.remove(task_id)
+            task = self.tasks[task_id]
+            lease_id = uuid.uuid4().hex
+            task.update(lease_id=lease_id, worker=worker, expires=now + LEASE_TTL, attempts=task["attempts"] + 1)
+            self.leases[lease_id] = task_id
+            self.workers[worker]["lease"] = lease_id
+        
+        self._dashboard(task, f"Leased @{worker}", 0)
+        logger.info(f"Leased {task['res']} of {os.path.basename(task['input_file'])} to {worker}")
+        return {
+            "lease_id": lease_id, "res": task["res"], "source_id": task["source_id"],
+            "source_size": task["source_size"], "lease_ttl": LEASE_TTL,
+            "heartbeat_interval": WORKER_HEARTBEAT_INTERVAL, **task["params"]
+        }
+    
+    def get_task(self, lease_id: str) -> Optional[dict]:
+        with self.lock:
+            task_id = self.leases.get(lease_id)
+            return self.tasks.get(task_id) if task_id else None
+    
+    def heartbeat(self, lease_id: str, pct: float, status: str) -> Optional[bool]:
+        """Perpanjang lease. Returns flag cancel, atau None jika lease sudah hilang"""
+        now = time.time()
+        with self.lock:
+            task = self.tasks.get(self.leases.get(lease_id, ""))
+            if not task:
+                return None
+            task["expires"] = now + LEASE_TTL
+            if task["worker"] in self.workers:
+                self.workers[task["worker"]]["last_seen"] = now
+        if not task["cancelled"]:
+            self._dashboard(task, f"{status} @{task['worker']}", pct)
+        return task["cancelled"]
+    
+    def complete(self, lease_id: str, ok: bool, error: str = "", encode_time: float = 0) -> bool:
+        with self.lock:
+            task_id = self.leases.pop(lease_id, None)
+            task = self.tasks.get(task_id) if task_id else None
+            if not task:
+                return False
+            if task["worker"] in self.workers:
+                self.workers[task["worker"]]["lease"] = None
+            if task["cancelled"]:
+                self.tasks.pop(task_id, None)
+            elif ok and os.path.exists(task["output_file"]):
+                self._finish(task, result={"output_file": task["output_file"], "encode_time": encode_time, "worker": task["worker"]})
+            elif task["attempts"] < TASK_MAX_ATTEMPTS:
+                logger.warning(f"Worker {task['worker']} gagal encode {task['res']}: {error[:200]}, retry")
+                task.update(lease_id=None, worker=None)
+                self.pending.append(task_id)
+            else:
+                self._finish(task, error=Exception(f"Worker Error ({task['res']}):\n{error[-500:]}"))
+        return True
+    
+    def take_back(self, task_id: str) -> bool:
+        """Tarik task yang belum di-lease (untuk fallback encode lokal)"""
+        with self.lock:
+            if task_id not in self.pending:
+                return False
+            self.pending.remove(task_id)
+            self.tasks.pop(task_id, None)
+            return True
+    
+    def cancel_job(self, job_key: str):
+        """Batalkan semua task milik job: pending dibuang, yang sedang di-lease diberi flag cancel"""
+        with self.lock:
+            for task_id, task in list(self.tasks.items()):
+                if task["job_key"] != job_key:
+                    continue
+                task["cancelled"] = True
+                if task_id in self.pending:
+                    self.pending.remove(task_id)
+                    self.tasks.pop(task_id, None)
+    
+    def _dashboard(self, task, status: str, pct: float):
+        info = STATUS_DASHBOARD.get(task["chat_id"], {}).get("resolutions", {}).get(task["res"])
+        if info is not None:
+            info["status"] = status
+            info["pct"] = pct
+
+LEASES = LeaseManager()
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """HTTP API untuk worker.py (auth via header X-Worker-Token)"""
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, fmt, *args):
+        logger.debug(f"Coordinator {self.address_string()}: {fmt % args}")
+    
+    def _send_json(self, code: int, data: dict = None):
+        body = json.dumps(data or {}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _authorized(self) -> bool:
+        if hmac.compare_digest(self.headers.get("X-Worker-Token", ""), WORKER_TOKEN):
+            return True
+        self.close_connection = True
+        self._send_json(401, {"error": "unauthorized"})
+        return False
+    
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+    
+    def do_POST(self):
+        if not self._authorized(): return
+        try:
+            data = self._read_json()
+        except ValueError:
+            return self._send_json(400, {"error": "bad json"})
+        
+        if self.path == "/api/lease":
+            lease = LEASES.lease(str(data.get("worker", self.address_string()))[:64], data.get("cached_sources", []))
+            return self._send_json(200, {"lease": lease})
+        if self.path == "/api/heartbeat":
+            cancel = LEASES.heartbeat(data.get("lease_id", ""), float(data.get("pct", 0)), str(data.get("status", "Encoding"))[:40])
+            if cancel is None:
+                return self._send_json(410, {"error": "lease expired"})
+            return self._send_json(200, {"cancel": cancel})
+        if self.path == "/api/complete":
+            ok = LEASES.complete(data.get("lease_id", ""), bool(data.get("ok")), str(data.get("error", "")), float(data.get("encode_time", 0)))
+            return self._send_json(200 if ok else 410, {})
+        self._send_json(404, {"error": "not found"})
+    
+    def do_GET(self):
+        """GET /api/source/{lease_id} - stream source file (support Range: bytes=N-)"""
+        if not self._authorized(): return
+        if not self.path.startswith("/api/source/"):
+            return self._send_json(404, {"error": "not found"})
+        task = LEASES.get_task(self.path.rsplit("/", 1)[-1])
+        if not task or not os.path.exists(task["input_file"]):
+            return self._send_json(410, {"error": "lease expired"})
+        
+        size = os.path.getsize(task["input_file"])
+        start = 0
+        range_match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            if start >= size:
+                # Offset di luar file: 416 (Content-Range bytes N-(size-1) tidak valid)
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size - start))
+        self.end_headers()
+        with open(task["input_file"], "rb") as f:
+            f.seek(start)
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+    
+    def do_PUT(self):
+        """PUT /api/output/{lease_id} - terima file hasil encode"""
+        if not self._authorized(): return
+        if not self.path.startswith("/api/output/"):
+            return self._send_json(404, {"error": "not found"})
+        task = LEASES.get_task(self.path.rsplit("/", 1)[-1])
+        if not task:
+            self.close_connection = True
+            return self._send_json(410, {"error": "lease expired"})
+        
+        remaining = int(self.headers.get("Content-Length", 0) or 0)
+        part_file = task["output_file"] + ".part"
+        with open(part_file, "wb") as f:
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining > 0:
+            os.remove(part_file)
+            self.close_connection = True
+            return self._send_json(400, {"error": "incomplete upload"})
+        os.replace(part_file, task["output_file"])
+        self._send_json(200, {})
+
+def start_coordinator():
+    """Jalankan HTTP API coordinator + reaper lease di background thread"""
+    if not WORKER_TOKEN:
+        logger.error("DISTRIBUTED_ENABLED tapi WORKER_TOKEN kosong - coordinator tidak dijalankan")
+        return
+    host, port = COORDINATOR_BIND.rsplit(":", 1)
+    server = ThreadingHTTPServer((host, int(port)), CoordinatorHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+    
+    def reaper():
+        while True:
+            time.sleep(5)
+            LEASES.reap()
+    
+    threading.Thread(target=reaper, name="lease-reaper", daemon=True).start()
+    logger.info(f"Coordinator listening on {COORDINATOR_BIND}")
+    print(f"🖥️ Coordinator API on {COORDINATOR_BIND}")
+
 # =====================================================
 # PYROGRAM APP INIT
 # =====================================================
@@ -1127,12 +2136,12 @@ async def update_status_message(client, chat_id, msg_id, status_data):
                      f"🔧 <b>Mode:</b> {mode_disp} | <b>Font:</b> {status_data.get('font',15)} | <b>Mar:</b> {status_data.get('margin',25)}\n\n")
 
         # Download Progress
-        if status_data.get("phase") == "dl":
-            dl = status_data.get("dl", {})
+        dl = status_data.get("dl", {})
+        if status_data.get("phase") == "dl" or (dl.get("streaming") and dl.get("pct", 0) < 100):
             dl_type = dl.get('type', 'Direct')
             text += (f"📥 <b>Downloading ({dl_type})...</b>\n"
                      f"{create_progress_bar(dl.get('pct', 0))}\n"
-                     f"📦 {dl.get('total','?')} | 🚀 {dl.get('speed','?')} | ⏳ {dl.get('eta','?')}\n")
+                     f"📦 {dl.get('total') or dl.get('size','?')} | 🚀 {dl.get('speed','?')} | ⏳ {dl.get('eta','?')}\n")
         
         # Process Progress (Encode/Upload)
         if job_type == "leech" and status_data.get("phase") == "upload":
@@ -1192,119 +2201,6 @@ async def reporter_loop(client, chat_id, msg_id):
         await update_status_message(client, chat_id, msg_id, STATUS_DASHBOARD[chat_id])
         await asyncio.sleep(4)
 
-def sync_ffmpeg_worker(chat_id, res, input_file, output_file, mode, font, margin, srt_file, audio_prof, sub_track, crf_value="26"):
-    """Fungsi FFmpeg Synchronous"""
-    # 1. Tentukan Bitrate & Codec (dengan downmix ke stereo untuk compatibility)
-    if audio_prof == "he":
-        a_opts = ["-c:a", "libfdk_aac", "-profile:a", "aac_he_v2", "-ac", "2", "-b:a", HEAUDIO_MAP.get(res, "48k")]
-    else:
-        a_opts = ["-c:a", "aac", "-ac", "2", "-b:a", AACLCAUDIO_MAP.get(res, "128k")]
-    
-    # 2. Filter Subtitle - escape commas in force_style value
-    style_escaped = f"FontName={SUB_FONT_NAME}\\,FontSize={font}\\,Bold={SUB_IS_BOLD}\\,MarginV={margin}\\,BorderStyle=1\\,Outline=1\\,PrimaryColour=&H00FFFFFF"
-    
-    if res == "360p": h=360; b="300k"
-    elif res == "480p": h=480; b="540k"
-    elif res == "720p": h=720; b="850k"
-    else: h=1080; b="2100k"
-    
-    # 3. Handle subtitle with optional watermark injection
-    temp_srt_with_watermark = None
-    
-    if srt_file:
-        # External SRT provided - use directly
-        sub_path = srt_file.replace("\\", "/").replace(":", "\\\\:")
-        vf = f"scale=-2:{h},subtitles={sub_path}:force_style={style_escaped}"
-    elif sub_track is not None:
-        # Embedded subtitle - check if watermark enabled
-        if WATERMARK_ENABLED:
-            # Extract subtitle and inject watermark
-            temp_srt_with_watermark = os.path.join(CACHE_FOLDER, f"sub_wm_{chat_id}_{res}.srt")
-            if extract_subtitle_with_watermark(input_file, sub_track, temp_srt_with_watermark):
-                sub_path = temp_srt_with_watermark.replace("\\", "/").replace(":", "\\\\:")
-                vf = f"scale=-2:{h},subtitles={sub_path}:force_style={style_escaped}"
-                logger.info(f"Using subtitle with injected watermark: {temp_srt_with_watermark}")
-            else:
-                # Fallback to original subtitle without watermark
-                clean_input = input_file.replace("\\", "/").replace(":", "\\\\:")
-                vf = f"scale=-2:{h},subtitles={clean_input}:si={sub_track}:force_style={style_escaped}"
-                logger.warning("Failed to inject watermark, using original subtitle")
-        else:
-            # Watermark disabled - use embedded subtitle directly
-            clean_input = input_file.replace("\\", "/").replace(":", "\\\\:")
-            vf = f"scale=-2:{h},subtitles={clean_input}:si={sub_track}:force_style={style_escaped}"
-    else:
-        # No subtitle - scale only
-        vf = f"scale=-2:{h}"
-    
-
-    # 3. Encoding Logic
-    is_2pass = (mode == "2pass") or (mode == "mixed" and res == "360p")
-    
-    log_prefix = f"ff_{chat_id}_{res}"
-
-    def run_ff(cmd_list):
-        # GANTI: Pakai **get_hidden_params()
-        p = subprocess.Popen(cmd_list, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
-        if chat_id not in ACTIVE_PROCESSES: ACTIVE_PROCESSES[chat_id] = []
-        ACTIVE_PROCESSES[chat_id].append(p)
-        
-        dur = 0
-        try:
-            # Get duration
-            probe = subprocess.check_output(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_file], **get_hidden_params())
-            dur = float(probe)
-        except: pass
-
-        stderr_lines = []  # Capture stderr for error reporting
-        
-        while True:
-            # CEK CANCEL - break jika sudah di-cancel
-            if chat_id in STATUS_DASHBOARD and STATUS_DASHBOARD.get(chat_id, {}).get('is_cancelled'):
-                force_kill_process(p)
-                break
-                
-            line = p.stderr.readline()
-            if not line and p.poll() is not None: break
-            if not line: continue
-            
-            stderr_lines.append(line)  # Capture stderr
-            
-            # Parse progress
-            if dur > 0 and "time=" in line:
-                m = re.search(r"time=(\d{2}:\d{2}:\d{2}\.\d+)", line)
-                if m and chat_id in STATUS_DASHBOARD:
-                    secs = time_str_to_seconds(m.group(1))
-                    pct = (secs / dur) * 100
-                    STATUS_DASHBOARD[chat_id]["resolutions"][res]["pct"] = pct
-        
-        if chat_id in ACTIVE_PROCESSES and p in ACTIVE_PROCESSES[chat_id]: 
-            ACTIVE_PROCESSES[chat_id].remove(p)
-        if p.poll() != 0 and p.poll() is not None:
-            # Get last few lines of stderr for error info
-            error_detail = "".join(stderr_lines[-20:])[-500:] if stderr_lines else "No stderr"
-            logger.error(f"FFmpeg Error: {error_detail}")
-            raise Exception(f"FFmpeg Error:\n{error_detail}")
-
-    common_opts = ["ffmpeg", "-y", "-i", input_file, "-vf", vf, "-c:v", "libx264", "-preset", "veryfast"]
-    
-    if is_2pass:
-        # Pass 1
-        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = "Encoding (Pass 1/2)"
-        run_ff(common_opts + ["-b:v", b, "-pass", "1", "-passlogfile", log_prefix, "-an", "-f", "mp4", "/dev/null"])
-        
-        # Pass 2
-        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = "Encoding (Pass 2/2)"
-        run_ff(common_opts + ["-b:v", b, "-pass", "2", "-passlogfile", log_prefix] + a_opts + [output_file])
-        
-        # Cleanup
-        for f in os.listdir("."):
-            if f.startswith(log_prefix): os.remove(f)
-    else:
-        # CRF
-        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = f"Encoding (CRF {crf_value})"
-        run_ff(common_opts + ["-crf", crf_value] + a_opts + [output_file])
-
 
 async def process_job(client, job):
     global IS_WORKING, CURRENT_JOB
@@ -1335,6 +2231,17 @@ async def process_job(client, job):
 
     downloaded_file = job['filename']
     download_error_msg = None  # Untuk capture error details
+    download_task = None  # Download background saat encode-while-downloading
+    stream_url = None  # URL source yang dibaca ffmpeg langsung (streaming mode)
+    reusable = False  # Source = src_<key> bersama di source cache: job lain bisa memakainya, jangan dipindah
+    redownload = None  # Download ulang source (hanya job dari URL), dipakai verifikasi
+    expected_size = 0  # Ukuran source dari server (0 = tidak diketahui)
+    source_verified = False
+    
+    # Reserve disk untuk job ini (sudah lolos admission di check_queue)
+    admission_key = f"job_{id(job)}"
+    admission_reserve(admission_key, estimate_job_footprint(job))
+    source_reserved = not source_on_disk(job)  # Source cache hit tidak ikut di-reserve
 
     try:
         # CEK: Job ini resume dari pending SRT? (file sudah didownload)
@@ -1348,7 +2255,12 @@ async def process_job(client, job):
         
             def dl_wrapper():
                 nonlocal download_error_msg
-                cmd = ["yt-dlp", "-o", job['filename'], "--newline", "--force-overwrites", "--no-continue", job['url']]
+                # Lanjutkan .part dari percobaan sebelumnya (hanya jika URL sama)
+                if prepare_ytdlp_resume(job['filename'], job['url']):
+                    logger.info(f"Resuming yt-dlp download: {job['filename']}")
+                cmd = ["yt-dlp", "-o", job['filename'], "--newline", "--continue", job['url']]
+                if DL_SCHEDULER.bandwidth_share():
+                    cmd[1:1] = ["-r", str(DL_SCHEDULER.bandwidth_share())]
                 logger.info(f"Download URL: {job['url']}")
                 
                 p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
@@ -1397,31 +2309,193 @@ async def process_job(client, job):
                 
                 if p.poll() != 0 and p.poll() is not None and not job.get('is_cancelled'):
                     download_error_msg = f"Exit code: {p.poll()}\nURL: {job['url'][:100]}...\nError: {stderr_output[:500] if stderr_output else 'No stderr'}"
-                    raise Exception(f"Download Failed")
-
-            # Download dengan timeout
-            try:
-                await asyncio.wait_for(
-                    asyncio.to_thread(dl_wrapper), 
-                    timeout=DOWNLOAD_TIMEOUT
-                )
-            except asyncio.TimeoutError:
-                # Kill proses jika timeout
-                if chat_id in ACTIVE_PROCESSES:
-                    for p in ACTIVE_PROCESSES[chat_id]:
-                        force_kill_process(p)
-                raise Exception(f"Download Timeout ({DOWNLOAD_TIMEOUT//60} menit)")
+                    raise Exception("Download Failed")
+                if p.poll() == 0:
+                    clear_state(job['filename'])
+
+            # URL direct/FileBrowser yang support Range -> download multi-koneksi,
+            # selain itu (extractor, GDrive, dll) tetap yt-dlp
+            ranged = None
+            if SEGMENTED_DOWNLOAD_ENABLED:
+                ranged = await asyncio.to_thread(probe_ranged, job['url'])
+            
+            # Target download ditentukan isi source (URL + validator), bukan chat_id
+            job['content_key'], reusable = await asyncio.to_thread(resolve_source_key, job['url'], ranged)
+            job['filename'] = source_cache_path(job['content_key'])
+            src_lock = source_lock(job['content_key'])
+            expected_size = ranged['size'] if ranged else 0
+            
+            # GDrive -> rclone copyid (API Drive, multi-thread streams), yt-dlp jadi fallback
+            gdrive_id = None
+            if GDRIVE_RCLONE_ENABLED and source_type(job['url']) == "gdrive" and rclone_available():
+                gdrive_id = extract_gdrive_file_id(job['url'])
+            
+            def rclone_wrapper(deadline):
+                nonlocal download_error_msg
+                STATUS_DASHBOARD[chat_id]["dl"]["type"] = "GDrive (rclone)"
+                try:
+                    rclone_gdrive_download(
+                        RCLONE_REMOTE, gdrive_id, job['filename'], STATUS_DASHBOARD[chat_id]["dl"],
+                        lambda: job.get('is_cancelled') or time.time() > deadline,
+                        bwlimit=DL_SCHEDULER.bandwidth_share()
+                    )
+                except DownloadError as e:
+                    if job.get('is_cancelled'):
+                        return
+                    if time.time() > deadline:
+                        raise Exception(f"Download Timeout ({DOWNLOAD_TIMEOUT//60} menit)")
+                    download_error_msg = f"URL: {job['url'][:100]}...\nError: {e}"
+                    raise Exception("Download Failed")
+            
+            def ytdlp_wrapper(deadline):
+                """yt-dlp via library pool: progress hook langsung ke dashboard, cancel/timeout lewat hook"""
+                nonlocal download_error_msg
+                if prepare_ytdlp_resume(job['filename'], job['url']):
+                    logger.info(f"Resuming yt-dlp download: {job['filename']}")
+                logger.info(f"Download URL: {job['url']}")
+                try:
+                    ytdlp_download(
+                        job['url'], job['filename'], STATUS_DASHBOARD[chat_id]["dl"].update,
+                        lambda: job.get('is_cancelled') or time.time() > deadline,
+                        ratelimit=DL_SCHEDULER.bandwidth_share()
+                    )
+                except DownloadError as e:
+                    if job.get('is_cancelled'):
+                        return
+                    if time.time() > deadline:
+                        raise Exception(f"Download Timeout ({DOWNLOAD_TIMEOUT//60} menit)")
+                    download_error_msg = f"URL: {job['url'][:100]}...\nError: {e}"
+                    raise Exception("Download Failed")
+                clear_state(job['filename'])
+            
+            def segmented_wrapper(deadline):
+                nonlocal download_error_msg
+                STATUS_DASHBOARD[chat_id]["dl"]["type"] = "Segmented"
+                try:
+                    segmented_download(
+                        ranged, job['filename'], STATUS_DASHBOARD[chat_id]["dl"],
+                        lambda: job.get('is_cancelled') or time.time() > deadline,
+                        source_url=job['url'], rate_limit=DL_SCHEDULER.bandwidth_share
+                    )
+                except DownloadError as e:
+                    if job.get('is_cancelled'):
+                        return
+                    if time.time() > deadline:
+                        raise Exception(f"Download Timeout ({DOWNLOAD_TIMEOUT//60} menit)")
+                    download_error_msg = f"URL: {job['url'][:100]}...\nError: {e}"
+                    raise Exception("Download Failed")
+
+            async def download_source():
+                # Download dengan timeout per percobaan. Partial disimpan (sidecar .dlstate),
+                # jadi retry melanjutkan dari byte terakhir, bukan dari nol.
+                nonlocal gdrive_id
+                policy = retry_policy(job['url'])
+                for attempt in range(1, policy['retries'] + 2):
+                    try:
+                        if not DL_SCHEDULER.available(job['url']):
+                            STATUS_DASHBOARD[chat_id]["dl"]["type"] = f"Antri slot ({DL_SCHEDULER.host_of(job['url'])})"
+                        async with DL_SCHEDULER.slot(job['url'], PRIORITY_PIPELINE):
+                            if ranged:
+                                await asyncio.to_thread(segmented_wrapper, time.time() + DOWNLOAD_TIMEOUT)
+                            elif gdrive_id:
+                                await asyncio.to_thread(rclone_wrapper, time.time() + DOWNLOAD_TIMEOUT)
+                            elif ytdlp_library_available():
+                                await asyncio.to_thread(ytdlp_wrapper, time.time() + DOWNLOAD_TIMEOUT)
+                            else:
+                                await asyncio.wait_for(
+                                    asyncio.to_thread(dl_wrapper), 
+                                    timeout=DOWNLOAD_TIMEOUT
+                                )
+                        break
+                    except asyncio.TimeoutError:
+                        # Kill proses jika timeout
+                        if chat_id in ACTIVE_PROCESSES:
+                            for p in ACTIVE_PROCESSES[chat_id]:
+                                force_kill_process(p)
+                        error = Exception(f"Download Timeout ({DOWNLOAD_TIMEOUT//60} menit)")
+                    except Exception as e:
+                        error = e
+                        if gdrive_id and str(e) == "Download Failed" and attempt <= policy['retries']:
+                            # Akun rclone tidak bisa akses file / error API: langsung coba yt-dlp
+                            logger.warning(f"rclone GDrive download failed, fallback yt-dlp: {download_error_msg}")
+                            gdrive_id = None
+                            continue
+                
+                    if job.get('is_cancelled'):
+                        break
+                    if attempt > policy['retries']:
+                        raise error
+                    delay = backoff_delay(policy, attempt)
+                    logger.warning(f"Download attempt {attempt} failed ({error}), retry in {delay:.0f}s")
+                    STATUS_DASHBOARD[chat_id]["dl"]["type"] = f"Retry {attempt}/{policy['retries']} dalam {delay:.0f}s"
+                    await asyncio.sleep(delay)
+            
+            async def cached_download():
+                # Job lain dengan source sama mungkin sedang download: tunggu, lalu cek ulang
+                async with src_lock:
+                    if reusable and source_cache_hit(job['filename'], expected_size):
+                        STATUS_DASHBOARD[chat_id]["dl"]["status"] = "Done (Cached)"
+                        STATUS_DASHBOARD[chat_id]["dl"]["pct"] = 100
+                        return
+                    await download_source()
+            
+            if reusable and not src_lock.locked() and source_cache_hit(job['filename'], expected_size):
+                # Source sudah ada di cache, fase download dilewati
+                logger.info(f"Source cache hit: {job['filename']}")
+                STATUS_DASHBOARD[chat_id]["dl"]["status"] = "Done (Cached)"
+                STATUS_DASHBOARD[chat_id]["dl"]["pct"] = 100
+            elif (job_type == "encode" and ranged and job.get('srt') and STREAM_ENCODE_ENABLED
+                  and not is_two_pass(job['mode'], job['queue'][0])):
+                # Encode-while-downloading: rendition pertama membaca source langsung via HTTP
+                # (ffmpeg reconnect) selagi download tetap jalan untuk cache & rendition berikutnya.
+                # Source lewat jaringan 2x untuk rendition ini; 2-pass (baca URL 2x lagi) tidak di-stream
+                stream_url = ranged['url']
+                STATUS_DASHBOARD[chat_id]["dl"]["streaming"] = True
+                download_task = asyncio.create_task(cached_download())
+            else:
+                await cached_download()
             
             downloaded_file = job['filename']
+            redownload = cached_download
+        
+        async def verify_downloaded():
+            """Source terpotong/rusak: download ulang sekali (job URL), selain itu gagal sebelum encode"""
+            nonlocal source_verified, download_error_msg
+            if source_verified or not SOURCE_VERIFY_ENABLED or job.get('is_cancelled'):
+                return
+            STATUS_DASHBOARD[chat_id]["dl"]["status"] = "Verifying"
+            reason = await verify_source_file(downloaded_file, expected_size)
+            if reason and redownload:
+                logger.warning(f"Source verify failed ({reason}), re-downloading: {downloaded_file}")
+                STATUS_DASHBOARD[chat_id]["dl"].update({"type": "Re-download (source rusak)", "pct": 0})
+                discard_source(downloaded_file)
+                await redownload()
+                reason = await verify_source_file(downloaded_file, expected_size)
+            if reason:
+                download_error_msg = reason
+                raise Exception("Source rusak / tidak lengkap")
+            source_verified = True
+            STATUS_DASHBOARD[chat_id]["dl"]["status"] = "Verified"
+        
+        if job_type == "encode" and not download_task:
+            await verify_downloaded()
+        
+        # Source sudah di disk, reservasinya tidak perlu dihitung lagi
+        if source_reserved and os.path.exists(downloaded_file) and not job.get('downloaded_file'):
+            admission_consume(admission_key, job.get('source_size') or int(UNKNOWN_SOURCE_GB * 1024 ** 3))
         
         # Update real filename jika sebelumnya unknown
         if job['real_name'] == "Video_Unknown.mp4" or "NA" in job['real_name']:
             try:
-                new_name = get_real_filename(job['url'])
+                new_name = await asyncio.to_thread(get_real_filename, job['url'])
                 if new_name and new_name != "Video_Unknown.mp4":
                     job['real_name'] = new_name
                     STATUS_DASHBOARD[chat_id]["filename"] = new_name
             except: pass
+        
+        # Durasi asli untuk ETA & estimasi output (sebelumnya pakai ESTIMATED_DURATION)
+        if job_type == "encode" and not job.get('duration') and (stream_url or os.path.exists(downloaded_file)):
+            job['duration'] = (await probe_metadata(stream_url or downloaded_file))['duration']
 
         # ===========================
         # LOGIKA CABANG: LEECH vs ENCODE
@@ -1434,7 +2508,15 @@ async def process_job(client, job):
             
             clean_name = clean_filename(job['real_name'], "Leech")
             if os.path.exists(clean_name): os.remove(clean_name)
-            os.rename(downloaded_file, clean_name)
+            if reusable:
+                # Source cache tetap utuh untuk job lain (yang mungkin sudah lolos cek cache),
+                # baik cache hit maupun baru didownload job ini
+                try:
+                    os.link(downloaded_file, clean_name)
+                except OSError:
+                    await asyncio.to_thread(shutil.copyfile, downloaded_file, clean_name)
+            else:
+                os.rename(downloaded_file, clean_name)
             
             # Variable untuk hitung speed manual
             upload_start_time = time.time()
@@ -1454,7 +2536,7 @@ async def process_job(client, job):
                     STATUS_DASHBOARD[chat_id]["upload"]["status"] = "Finalizing (Telegram Processing)..."
             
             # AMBIL METADATA VIDEO (Width, Height, Duration)
-            meta = get_video_metadata(clean_name)
+            meta = await probe_metadata(clean_name)
             
             caption = (
                 f"🎬 <b>{clean_name}</b>\n\n"
@@ -1501,7 +2583,7 @@ async def process_job(client, job):
                 # Jika tidak ada subtitle Indonesia, simpan job dan tunggu SRT upload
                 if sub_track_index is None:
                     # TAMBAHKAN KE CACHE agar muncul di /files
-                    cache_id = add_to_cache(downloaded_file, job['real_name'])
+                    cache_id = add_to_cache(downloaded_file, job['real_name'], job.get('source_key'), job.get('content_key'))
                     
                     # Simpan pending job dengan file yang sudah didownload (append ke list)
                     if chat_id not in PENDING_SRT_JOBS:
@@ -1531,404 +2613,240 @@ async def process_job(client, job):
                     )
                     raise Exception("WAITING_SRT")
 
-            for res in job['queue']:
-                # Cek cancel
-                if not IS_WORKING: break 
-                if job.get('is_cancelled'): break
-
-                out_file = os.path.join(OUTPUT_FOLDER, clean_filename(job['real_name'], res))
-                
-                # Get input file size and start timer
-                input_size = os.path.getsize(downloaded_file) if os.path.exists(downloaded_file) else 0
-                encode_start = time.time()
-                
-                # --- A. ENCODE ---
-                # Get CRF for this specific resolution (per-res or fallback to global)
-                res_crf_map = job.get('res_crf', {})
-                current_crf = res_crf_map.get(res, job.get('crf', '26'))
-                
-                await asyncio.to_thread(
-                    sync_ffmpeg_worker, 
-                    chat_id, res, downloaded_file, out_file, 
-                    job['mode'], job['font'], job['margin'], job['srt'], job['audio'], sub_track_index,
-                    current_crf
-                )
-                
-                # Calculate encode time and output size
-                encode_time = time.time() - encode_start
-                encode_time_str = str(timedelta(seconds=int(encode_time)))
-                output_size = os.path.getsize(out_file) if os.path.exists(out_file) else 0
-
-                # --- RUN UPLOADS IN BACKGROUND (don't wait) ---
-                async def background_upload_task(
-                    _client, _chat_id, _res, _out_file, _meta, _duration_str, 
-                    _input_size, _output_size, _encode_time_str
-                ):
-                    """Background task for parallel uploads - runs independently"""
+            # --- RUN UPLOADS IN BACKGROUND (don't wait) ---
+            async def background_upload_task(
+                _client, _chat_id, _res, _out_file, _meta, _duration_str, 
+                _input_size, _output_size, _encode_time_str, _pipelined=None
+            ):
+                """Background task for parallel uploads - runs independently"""
+                try:
                     try:
-                        try:
-                            STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["status"] = "Uploading"
-                            STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["pct"] = 0
-                        except KeyError:
-                            pass  # Dashboard may not exist for this chat
-                        
-                        # Shared state for live updates
-                        upload_status = {
-                            "seedbox": "⏳" if SEEDBOX_ENABLED else "⭕",
-                            "gdrive": "⏳",
-                            "filepress": "⏳" if FILEPRESS_ENABLED else "⭕",
-                            "buzzheavier": "⏳" if BUZZHEAVIER_ENABLED else "⭕",
-                            "gofile": "⏳" if GOFILE_ENABLED else "⭕",
-                            "mirrored": "⏳" if MIRRORED_ENABLED else "⭕",
-                            "turbovid": "⏳" if TURBOVID_ENABLED else "⭕",
-                            "abyss": "⏳" if ABYSS_ENABLED else "⭕",
-                            "vidhide": "⏳" if VIDHIDE_ENABLED else "⭕",
-                        }
-                        upload_links = {
-                            "seedbox": None, "gdrive": None, "filepress": None,
-                            "buzzheavier": None, "gofile": None, "mirrored": None,
-                            "turbovid": None, "abyss": None, "vidhide": None
-                        }
-                        result_msg_id = [None]
-                        
-                        def build_progress_msg():
-                            msg = (
-                                f"⬆️ <b>Uploading {_res}</b>\n\n"
-                                f"🎬 <code>{os.path.basename(_out_file)}</code>\n"
-                                f"📦 {human_readable_size(_output_size)}\n\n"
-                            )
-                            if upload_links["seedbox"]:
-                                msg += f"📦 Seedbox: ✅\n{upload_links['seedbox']}\n\n"
-                            else:
-                                msg += f"📦 Seedbox: {upload_status['seedbox']}\n"
-                            if upload_links["gdrive"]:
-                                msg += f"☁️ GDrive: ✅\n{upload_links['gdrive']}\n\n"
-                            else:
-                                msg += f"☁️ GDrive: {upload_status['gdrive']}\n"
-                            if upload_links["buzzheavier"]:
-                                msg += f"🐝 Buzzheavier: ✅\n{upload_links['buzzheavier']}\n\n"
-                            else:
-                                msg += f"🐝 Buzzheavier: {upload_status['buzzheavier']}\n"
-                            if upload_links["gofile"]:
-                                msg += f"📁 Gofile: ✅\n{upload_links['gofile']}\n\n"
-                            else:
-                                msg += f"📁 Gofile: {upload_status['gofile']}\n"
-                            if upload_links["filepress"]:
-                                msg += f"🎬 FilePress: ✅\n{upload_links['filepress']}\n\n"
-                            else:
-                                msg += f"🎬 FilePress: {upload_status['filepress']}\n"
-                            if upload_links["mirrored"]:
-                                msg += f"🪞 Mirrored: ✅\n{upload_links['mirrored']}\n\n"
-                            else:
-                                msg += f"🪞 Mirrored: {upload_status['mirrored']}\n"
-                            if upload_links["turbovid"]:
-                                msg += f"📺 TurboVid: ✅\n{upload_links['turbovid']}\n\n"
-                            else:
-                                msg += f"📺 TurboVid: {upload_status['turbovid']}\n"
-                            if upload_links["abyss"]:
-                                msg += f"🌀 Abyss: ✅\n{upload_links['abyss']}\n\n"
-                            else:
-                                msg += f"🌀 Abyss: {upload_status['abyss']}\n"
-                            if upload_links["vidhide"]:
-                                msg += f"🎬 VidHide: ✅\n{upload_links['vidhide']}\n"
+                        STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["status"] = "Uploading"
+                        STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["pct"] = 0
+                    except KeyError:
+                        pass  # Dashboard may not exist for this chat
+                    
+                    # Shared state for live updates
+                    upload_status = upload_graph_status(_res)
+                    upload_links = {name: None for name in UPLOAD_GRAPH}
+                    result_msg_id = [None]
+                    # Seedbox/Buzzheavier/Gofile/Mirrored berbagi satu pembacaan disk
+                    fanout = FanoutReader(_out_file)
+                    
+                    def build_progress_msg():
+                        msg = (
+                            f"⬆️ <b>Uploading {_res}</b>\n\n"
+                            f"🎬 <code>{os.path.basename(_out_file)}</code>\n"
+                            f"📦 {human_readable_size(_output_size)}\n\n"
+                        )
+                        for name, spec in UPLOAD_GRAPH.items():
+                            if upload_links[name]:
+                                msg += f"{spec['icon']} {spec['name']}: ✅\n{upload_links[name]}\n\n"
                             else:
-                                msg += f"🎬 VidHide: {upload_status['vidhide']}\n"
-                            return msg
-                        
-                        async def update_msg():
-                            try:
-                                if result_msg_id[0]:
-                                    await _client.edit_message_text(_chat_id, result_msg_id[0], build_progress_msg())
-                            except: pass
-                        
+                                msg += f"{spec['icon']} {spec['name']}: {upload_status[name]}\n"
+                        return msg
+                    
+                    async def update_msg():
                         try:
-                            prog_msg = await _client.send_message(_chat_id, build_progress_msg(), disable_notification=True)
-                            result_msg_id[0] = prog_msg.id
+                            if result_msg_id[0]:
+                                await _client.edit_message_text(_chat_id, result_msg_id[0], build_progress_msg())
                         except: pass
-                        
-                        async def do_seedbox():
-                            if not SEEDBOX_ENABLED: return None
-                            try:
-                                link = await asyncio.to_thread(filebrowser_upload_file, _out_file, _chat_id, _res)
-                                upload_status["seedbox"] = "✅" if link else "❌"
-                                upload_links["seedbox"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["seedbox"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_gdrive():
-                            try:
-                                def rclone_up():
-                                    cmd = ["rclone", "copy", _out_file, f"{RCLONE_REMOTE}:{RCLONE_FOLDER}", "-v"]
-                                    p = subprocess.Popen(cmd, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
-                                    if _chat_id not in ACTIVE_PROCESSES: ACTIVE_PROCESSES[_chat_id] = []
-                                    ACTIVE_PROCESSES[_chat_id].append(p)
-                                    p.wait()
-                                    if _chat_id in ACTIVE_PROCESSES and p in ACTIVE_PROCESSES[_chat_id]:
-                                        ACTIVE_PROCESSES[_chat_id].remove(p)
-                                
-                                await asyncio.to_thread(rclone_up)
-                                # Use basename for lsjson since rclone uploads to remote folder directly
-                                out_basename = os.path.basename(_out_file)
-                                ls = subprocess.check_output(["rclone", "lsjson", f"{RCLONE_REMOTE}:{RCLONE_FOLDER}/{out_basename}"], text=True, **get_hidden_params())
-                                fid = json.loads(ls)[0]["ID"]
-                                link = f"https://drive.google.com/file/d/{fid}/view?usp=drivesdk"
-                                upload_status["gdrive"] = "✅"
-                                upload_links["gdrive"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["gdrive"] = "❌"
-                                await update_msg()
-                                return "Error Link"
-                        
-                        async def do_mirrored():
-                            if not MIRRORED_ENABLED: return None
-                            try:
-                                link = await asyncio.to_thread(mirrored_upload_file, _out_file)
-                                upload_status["mirrored"] = "✅" if link else "❌"
-                                upload_links["mirrored"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["mirrored"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_buzzheavier():
-                            if not BUZZHEAVIER_ENABLED: return None
-                            try:
-                                link = await asyncio.to_thread(buzzheavier_upload_file, _out_file)
-                                upload_status["buzzheavier"] = "✅" if link else "❌"
-                                upload_links["buzzheavier"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["buzzheavier"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_gofile():
-                            if not GOFILE_ENABLED: return None
-                            try:
-                                link = await asyncio.to_thread(gofile_upload_file, _out_file)
-                                upload_status["gofile"] = "✅" if link else "❌"
-                                upload_links["gofile"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["gofile"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_filepress():
-                            """FilePress mirrors from GDrive, so wait for GDrive first"""
-                            if not FILEPRESS_ENABLED: return None
-                            # Wait for GDrive to finish
-                            while upload_links["gdrive"] is None and upload_status["gdrive"] == "⏳":
-                                await asyncio.sleep(0.5)
-                            if not upload_links["gdrive"]:
-                                upload_status["filepress"] = "❌"
-                                await update_msg()
-                                return None
-                            try:
-                                # Extract quality from resolution
-                                quality = int(_res.replace("p", "")) if _res else None
-                                link = await asyncio.to_thread(filepress_mirror, upload_links["gdrive"], quality)
-                                upload_status["filepress"] = "✅" if link else "❌"
-                                upload_links["filepress"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["filepress"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_turbovid():
-                            """TurboVid remote upload from Seedbox, wait for Seedbox first (1080p only)"""
-                            if not TURBOVID_ENABLED: return None
-                            if _res != "1080p":  # Only for 1080p
-                                upload_status["turbovid"] = "⭕"
-                                return None
-                            # Wait for Seedbox to finish
-                            while upload_links["seedbox"] is None and upload_status["seedbox"] == "⏳":
-                                await asyncio.sleep(0.5)
-                            if not upload_links["seedbox"]:
-                                upload_status["turbovid"] = "❌"
-                                await update_msg()
-                                return None
-                            try:
-                                filename = os.path.basename(_out_file)
-                                link = await asyncio.to_thread(turbovid_remote_upload, upload_links["seedbox"], filename)
-                                upload_status["turbovid"] = "✅" if link else "❌"
-                                upload_links["turbovid"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["turbovid"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_abyss():
-                            """Abyss remote upload from GDrive, wait for GDrive first (1080p only)"""
-                            if not ABYSS_ENABLED: return None
-                            if _res != "1080p":  # Only for 1080p
-                                upload_status["abyss"] = "⭕"
-                                return None
-                            # Wait for GDrive to finish
-                            while upload_links["gdrive"] is None and upload_status["gdrive"] == "⏳":
-                                await asyncio.sleep(0.5)
-                            if not upload_links["gdrive"]:
-                                upload_status["abyss"] = "❌"
-                                await update_msg()
-                                return None
-                            try:
-                                link = await asyncio.to_thread(abyss_remote_upload, upload_links["gdrive"])
-                                upload_status["abyss"] = "✅" if link else "❌"
-                                upload_links["abyss"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["abyss"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        async def do_vidhide():
-                            """VidHide remote upload from Seedbox, wait for Seedbox first (1080p only)"""
-                            if not VIDHIDE_ENABLED: return None
-                            if _res != "1080p":  # Only for 1080p
-                                upload_status["vidhide"] = "⭕"
-                                return None
-                            # Wait for Seedbox to finish
-                            while upload_links["seedbox"] is None and upload_status["seedbox"] == "⏳":
-                                await asyncio.sleep(0.5)
-                            if not upload_links["seedbox"]:
-                                upload_status["vidhide"] = "❌"
-                                await update_msg()
-                                return None
-                            try:
-                                filename = os.path.basename(_out_file)
-                                link = await asyncio.to_thread(vidhide_remote_upload, upload_links["seedbox"], filename)
-                                upload_status["vidhide"] = "✅" if link else "❌"
-                                upload_links["vidhide"] = link
-                                await update_msg()
-                                return link
-                            except:
-                                upload_status["vidhide"] = "❌"
-                                await update_msg()
-                                return None
-                        
-                        # Run ALL uploads in parallel
-                        await asyncio.gather(
-                            do_seedbox(), do_gdrive(), do_mirrored(), 
-                            do_buzzheavier(), do_gofile(), do_filepress(),
-                            do_turbovid(), do_abyss(), do_vidhide(),
-                            return_exceptions=True
-                        )
-                        
-                        # Final message
-                        try:
-                            STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["status"] = "Done"
-                            STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["pct"] = 100
-                        except KeyError:
-                            pass  # Dashboard may have been cleared
-                        
-                        text_msg = (
-                            f"✅ <b>Selesai {_res}</b>\n\n"
-                            f"🎬 <code>{os.path.basename(_out_file)}</code>\n"
-                            f"ℹ️ {_meta['str']}\n"
-                            f"🎞️ Durasi: {_duration_str}\n"
-                            f"📦 {human_readable_size(_input_size)} → {human_readable_size(_output_size)}\n"
-                            f"⏱️ Encode: {_encode_time_str}\n\n"
-                        )
-                        
-                        if upload_links["seedbox"]:
-                            text_msg += f"📦 <b>Seedbox:</b>\n{upload_links['seedbox']}\n\n"
-                        if upload_links["gdrive"]:
-                            text_msg += f"🔗 <b>GDrive:</b>\n{upload_links['gdrive']}\n\n"
-                        if upload_links["buzzheavier"]:
-                            text_msg += f"🐝 <b>Buzzheavier:</b>\n{upload_links['buzzheavier']}\n\n"
-                        if upload_links["gofile"]:
-                            text_msg += f"📁 <b>Gofile:</b>\n{upload_links['gofile']}\n\n"
-                        if upload_links["filepress"]:
-                            text_msg += f"🎬 <b>FilePress:</b>\n{upload_links['filepress']}\n\n"
-                        if upload_links["mirrored"]:
-                            text_msg += f"🪞 <b>Mirrored:</b>\n{upload_links['mirrored']}\n\n"
-                        if upload_links["turbovid"]:
-                            text_msg += f"📺 <b>TurboVid:</b>\n{upload_links['turbovid']}\n\n"
-                        if upload_links["abyss"]:
-                            text_msg += f"🌀 <b>Abyss:</b>\n{upload_links['abyss']}\n\n"
-                        if upload_links["vidhide"]:
-                            text_msg += f"🎬 <b>VidHide:</b>\n{upload_links['vidhide']}"
-                        
-                        # Save to encode history for /links command
-                        add_to_encode_history(
-                            filename=os.path.basename(_out_file),
-                            quality=_res,
-                            links={
-                                "seedbox": upload_links.get("seedbox"),
-                                "gdrive": upload_links.get("gdrive"),
-                                "buzzheavier": upload_links.get("buzzheavier"),
-                                "mirrored": upload_links.get("mirrored"),
-                                "gofile": upload_links.get("gofile"),
-                                "filepress": upload_links.get("filepress"),
-                                "turbovid": upload_links.get("turbovid"),
-                                "abyss": upload_links.get("abyss"),
-                                "vidhide": upload_links.get("vidhide"),
-                            },
-                            meta={
-                                "duration": _duration_str,
-                                "input_size": human_readable_size(_input_size),
-                                "output_size": human_readable_size(_output_size),
-                                "encode_time": _encode_time_str
-                            }
+                    
+                    try:
+                        prog_msg = await _client.send_message(_chat_id, build_progress_msg(), disable_notification=True)
+                        result_msg_id[0] = prog_msg.id
+                    except: pass
+                    
+                    # Semua host paralel, host turunan (FilePress/Abyss dari GDrive, TurboVid/VidHide dari Seedbox)
+                    # mulai begitu link sumbernya ada
+                    try:
+                        await run_upload_graph(
+                            {"out_file": _out_file, "chat_id": _chat_id, "res": _res, "fanout": fanout,
+                             "pipelined": _pipelined or {}},
+                            upload_status, upload_links, update_msg
                         )
-                        
+                    finally:
+                        fanout.close()
+                    
+                    # Final message
+                    try:
+                        STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["status"] = "Done"
+                        STATUS_DASHBOARD[_chat_id]["resolutions"][_res]["pct"] = 100
+                    except KeyError:
+                        pass  # Dashboard may have been cleared
+                    
+                    text_msg = (
+                        f"✅ <b>Selesai {_res}</b>\n\n"
+                        f"🎬 <code>{os.path.basename(_out_file)}</code>\n"
+                        f"ℹ️ {_meta['str']}\n"
+                        f"🎞️ Durasi: {_duration_str}\n"
+                        f"📦 {human_readable_size(_input_size)} → {human_readable_size(_output_size)}\n"
+                        f"⏱️ Encode: {_encode_time_str}\n\n"
+                    )
+                    
+                    for name, spec in UPLOAD_GRAPH.items():
+                        if upload_links[name]:
+                            text_msg += f"{spec.get('final_icon', spec['icon'])} <b>{spec['name']}:</b>\n{upload_links[name]}\n\n"
+                    
+                    # Save to encode history for /links command
+                    add_to_encode_history(
+                        filename=os.path.basename(_out_file),
+                        quality=_res,
+                        links=dict(upload_links),
+                        meta={
+                            "duration": _duration_str,
+                            "input_size": human_readable_size(_input_size),
+                            "output_size": human_readable_size(_output_size),
+                            "encode_time": _encode_time_str,
+                            "duration_sec": _meta['duration'],
+                            "encode_sec": time_str_to_seconds(_encode_time_str),
+                            "eta_keys": eta_profile(job, _res)
+                        },
+                        fingerprint=rendition_fingerprint(job, _res, FILE_CACHE)
+                    )
+                    
+                    try:
+                        if result_msg_id[0]:
+                            await _client.edit_message_text(_chat_id, result_msg_id[0], text_msg)
+                        else:
+                            await _client.send_message(_chat_id, text_msg, disable_notification=True)
+                    except Exception as msg_err:
+                        logger.warning(f"Failed to edit final message: {msg_err}")
+                        # Fallback: delete old "Uploading" message and send new one
                         try:
                             if result_msg_id[0]:
-                                await _client.edit_message_text(_chat_id, result_msg_id[0], text_msg)
-                            else:
-                                await _client.send_message(_chat_id, text_msg, disable_notification=True)
-                        except Exception as msg_err:
-                            logger.warning(f"Failed to edit final message: {msg_err}")
-                            # Fallback: delete old "Uploading" message and send new one
-                            try:
-                                if result_msg_id[0]:
-                                    await _client.delete_messages(_chat_id, result_msg_id[0])
-                                await _client.send_message(_chat_id, text_msg, disable_notification=True)
-                            except:
-                                logger.error(f"Fallback message also failed for {_out_file}")
-                            
-                    except Exception as e:
-                        import traceback
-                        logger.error(f"Background upload error: {e}\n{traceback.format_exc()}")
-                    finally:
-                        # Always delete encoded file after task completes (success or error)
+                                await _client.delete_messages(_chat_id, result_msg_id[0])
+                            await _client.send_message(_chat_id, text_msg, disable_notification=True)
+                        except:
+                            logger.error(f"Fallback message also failed for {_out_file}")
+                    
+                    # Requester lain yang job-nya digabung ke job ini
+                    for sub_id in job.get('subscribers', []):
                         try:
-                            if os.path.exists(_out_file): 
-                                os.remove(_out_file)
-                                logger.info(f"Deleted encoded file: {_out_file}")
-                        except Exception as del_err:
-                            logger.error(f"Failed to delete {_out_file}: {del_err}")
+                            await _client.send_message(sub_id, text_msg, disable_notification=True)
+                        except Exception as sub_err:
+                            logger.warning(f"Failed to notify subscriber {sub_id}: {sub_err}")
+                        
+                except Exception as e:
+                    import traceback
+                    logger.error(f"Background upload error: {e}\n{traceback.format_exc()}")
+                finally:
+                    # Always delete encoded file after task completes (success or error)
+                    try:
+                        if os.path.exists(_out_file): 
+                            os.remove(_out_file)
+                            logger.info(f"Deleted encoded file: {_out_file}")
+                    except Exception as del_err:
+                        logger.error(f"Failed to delete {_out_file}: {del_err}")
+            
+            input_size = os.path.getsize(downloaded_file) if os.path.exists(downloaded_file) else 0
+            
+            async def wait_download():
+                """Streaming mode: rendition berikutnya butuh file lokal yang lengkap"""
+                nonlocal stream_url
+                if download_task:
+                    await download_task
+                    stream_url = None
+                    await verify_downloaded()
+            
+            async def start_rendition_upload(res, out_file, encode_time, pipelined=None):
+                """Catat hasil encode satu rendition lalu jalankan upload di background
+                (pipelined = upload yang sudah berjalan selama encode, lihat start_pipelined_uploads)"""
+                admission_consume(admission_key, estimate_output_size([res], job.get('duration', 0), job['audio']))
+                
+                # Calculate encode time and output size
+                encode_time_str = str(timedelta(seconds=int(encode_time)))
+                output_size = os.path.getsize(out_file) if os.path.exists(out_file) else 0
                 
                 # Get metadata before starting background task
-                meta = get_video_metadata(out_file)
+                meta = await probe_metadata(out_file)
                 duration_str = str(timedelta(seconds=meta['duration']))
+                eta_observe(eta_profile(job, res), meta['duration'], encode_time)
                 
                 # Start upload as background task (don't await!)
                 asyncio.create_task(background_upload_task(
                     client, chat_id, res, out_file, meta, duration_str,
-                    input_size, output_size, encode_time_str
+                    input_size, output_size, encode_time_str, pipelined
                 ))
+            
+            def get_res_crf(res):
+                # Get CRF for this specific resolution (per-res or fallback to global)
+                return job.get('res_crf', {}).get(res, job.get('crf', '26'))
+            
+            async def encode_local(res, out_file):
+                if not stream_url:
+                    await wait_download()
+                # Host pipeline (UPLOAD_PIPELINE_HOSTS) mulai upload selagi output masih ditulis
+                pipeline = start_pipelined_uploads(out_file, chat_id, res)
+                encode_start = time.time()
+                try:
+                    await run_encode(
+                        chat_id, res, stream_url or downloaded_file, out_file, 
+                        job['mode'], job['font'], job['margin'], job['srt'], job['audio'], sub_track_index,
+                        get_res_crf(res), fragmented=bool(pipeline)
+                    )
+                except BaseException:
+                    if pipeline: pipeline[0].finish(False)
+                    raise
+                if pipeline: pipeline[0].finish()
+                await start_rendition_upload(res, out_file, time.time() - encode_start, pipeline[1] if pipeline else None)
+                await wait_download()
+            
+            if DISTRIBUTED_ENABLED and LEASES.active_workers():
+                # --- A. ENCODE (REMOTE) --- semua rendition di-lease paralel ke worker
+                await wait_download()  # Worker menarik source dari file lokal
+                job_key = f"job_{id(job)}"
+                srt_text = None
+                if job['srt'] and os.path.exists(job['srt']):
+                    with open(job['srt'], 'r', encoding='utf-8', errors='ignore') as f:
+                        srt_text = f.read()
+                
+                remote = {}  # {future: (task_id, res, out_file)}
+                for res in job['queue']:
+                    out_file = os.path.join(OUTPUT_FOLDER, clean_filename(job['real_name'], res))
+                    task_id, fut = LEASES.submit(job_key, chat_id, res, downloaded_file, out_file, {
+                        "mode": job['mode'], "font": job['font'], "margin": job['margin'],
+                        "audio": job['audio'], "crf": get_res_crf(res), "sub_track": sub_track_index,
+                        "srt_text": srt_text, "filename": os.path.basename(out_file)
+                    })
+                    remote[fut] = (task_id, res, out_file)
+                    STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = "Queued (Worker)"
                 
-                # Continue to next resolution immediately!
+                remote_start = time.time()
+                try:
+                    while remote:
+                        if not IS_WORKING or job.get('is_cancelled'): break
+                        done, _ = await asyncio.wait(list(remote), timeout=WORKER_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                        for fut in done:
+                            _, res, out_file = remote.pop(fut)
+                            result = fut.result()  # raise jika worker gagal TASK_MAX_ATTEMPTS kali
+                            await start_rendition_upload(res, out_file, result['encode_time'])
+                        
+                        # Fallback: worker hilang, atau task terlalu lama tidak di-lease → encode lokal
+                        if remote and (not LEASES.active_workers() or time.time() - remote_start > LEASE_TTL * 2):
+                            for fut, (task_id, res, out_file) in list(remote.items()):
+                                if job.get('is_cancelled'): break
+                                if LEASES.take_back(task_id):
+                                    del remote[fut]
+                                    logger.info(f"Encode lokal (fallback) untuk {res}")
+                                    await encode_local(res, out_file)
+                finally:
+                    LEASES.cancel_job(job_key)
+            else:
+                for res in job['queue']:
+                    # Cek cancel
+                    if not IS_WORKING: break 
+                    if job.get('is_cancelled'): break
+                    
+                    # --- A. ENCODE ---
+                    out_file = os.path.join(OUTPUT_FOLDER, clean_filename(job['real_name'], res))
+                    await encode_local(res, out_file)
+                    
+                    # Continue to next resolution immediately!
 
             # Add file to cache instead of delete (untuk re-encode)
             if downloaded_file and os.path.exists(downloaded_file):
-                cache_id = add_to_cache(downloaded_file, job['real_name'])
+                cache_id = add_to_cache(downloaded_file, job['real_name'], job.get('source_key'), job.get('content_key'))
                 logger.info(f"Added to cache: #{cache_id} - {job['real_name']}")
             
             # Hapus status dashboard setelah selesai semua encode
@@ -1944,9 +2862,21 @@ async def process_job(client, job):
             if download_error_msg:
                 error_detail = f"{str(e)}\n\n<code>{download_error_msg}</code>"
             await client.send_message(chat_id, f"❌ <b>Error:</b> {error_detail}")
+            for sub_id in job.get('subscribers', []):
+                try:
+                    await client.send_message(sub_id, f"❌ <b>Job yang digabung gagal:</b> {html.escape(job.get('real_name', ''))}\n{error_detail}")
+                except: pass
 
     finally:
         reporter.cancel()
+        admission_release(admission_key)
+        
+        # Streaming mode gagal/cancel: hentikan download background (partial tetap bisa di-resume)
+        if download_task and not download_task.done():
+            job['is_cancelled'] = True
+            await asyncio.wait({download_task}, timeout=40)
+        if download_task and download_task.done() and not download_task.cancelled():
+            download_task.exception()
         
         # Cleanup STATUS_DASHBOARD untuk mencegah memory leak
         if chat_id in STATUS_DASHBOARD:
@@ -1958,10 +2888,11 @@ async def process_job(client, job):
         
         # Keep downloaded file for cache (jangan hapus, biar bisa re-encode)
         # File akan dihapus manual via /clean command
-        if downloaded_file and os.path.exists(downloaded_file):
+        # Download yang belum selesai (masih ada sidecar .dlstate) disimpan untuk resume, bukan di-cache
+        if downloaded_file and os.path.exists(downloaded_file) and not os.path.exists(state_path(downloaded_file)):
             # Add to cache jika belum (untuk error/cancel case)
             if not any(v.get('path') == downloaded_file for v in FILE_CACHE.values()):
-                add_to_cache(downloaded_file, job.get('real_name', 'Unknown'))
+                add_to_cache(downloaded_file, job.get('real_name', 'Unknown'), job.get('source_key'), job.get('content_key'))
         
         # Cleanup SRT file jika ada
         if job.get('srt') and os.path.exists(job['srt']): 
@@ -2067,14 +2998,15 @@ async def files_cmd(client, message):
                         break
                 
                 if not already_exists:
-                    # Add to cache with new ID
+                    # Add to cache with new ID (content key = hash isi, untuk dedup encode)
                     new_id = str(max([int(k) for k in FILE_CACHE.keys()] + [0]) + 1)
                     FILE_CACHE[new_id] = {
                         "path": filepath,
                         "name": filename,
                         "size": os.path.getsize(filepath),
                         "added": time.time(),
-                        "source": "manual"
+                        "source": "manual",
+                        "content_key": await asyncio.to_thread(hash_file, filepath)
                     }
                     manual_files_added += 1
         
@@ -2128,6 +3060,15 @@ async def clean_cmd(client, message):
     FILE_CACHE = {}
     save_file_cache()
     
+    # Sisa download yang belum selesai (partial + sidecar resume)
+    for name in os.listdir(CACHE_FOLDER):
+        if name.endswith(".dlstate"):
+            target = os.path.join(CACHE_FOLDER, name[:-len(".dlstate")])
+            for path in (target, target + ".part", os.path.join(CACHE_FOLDER, name)):
+                try:
+                    if os.path.exists(path): os.remove(path)
+                except: pass
+    
     await message.reply(f"🗑️ <b>{count} file</b> berhasil dihapus dari cache.")
 
 # --- HANDLER /encode [id] (Encode from Cache) ---
@@ -2239,9 +3180,27 @@ async def unauth_cmd(client, message):
 async def users_cmd(client, message):
     if not AUTH_USERS:
         return await message.reply("📂 Belum ada user terdaftar.")
-    text = "👥 <b>Daftar User Ter-Auth:</b>\n\n" + "\n".join([f"• <code>{uid}</code>" for uid in AUTH_USERS])
+    text = "👥 <b>Daftar User Ter-Auth:</b>\n\n" + "\n".join([f"• <code>{uid}</code> (weight {get_user_weight(uid):g})" for uid in AUTH_USERS])
     await message.reply(text)
 
+# --- HANDLER /weight (Bobot fair-share per user) ---
+@app.on_message(filters.command("weight") & filters.user(OWNER_ID))
+async def weight_cmd(client, message):
+    """Set bobot antrian user: /weight 12345678 2 | /weight 12345678 reset"""
+    try:
+        user_id = int(message.command[1])
+        if message.command[2] == "reset":
+            USER_WEIGHT_OVERRIDES.pop(user_id, None)
+        else:
+            weight = float(message.command[2])
+            if weight <= 0:
+                raise ValueError("weight harus > 0")
+            USER_WEIGHT_OVERRIDES[user_id] = weight
+        save_user_weights()
+        await message.reply(f"⚖️ Weight user <code>{user_id}</code>: <b>{get_user_weight(user_id):g}</b>")
+    except:
+        await message.reply("❌ Format salah. Gunakan: <code>/weight 12345678 2</code> atau <code>/weight 12345678 reset</code>")
+
 # --- HANDLER /log (Send bot log file) ---
 @app.on_message(filters.command("log") & filters.user(OWNER_ID))
 async def log_cmd(client, message):
@@ -2343,7 +3302,6 @@ async def update_tool_cmd(client, message):
         backup_path = None
         if os.path.exists(target_path):
             backup_path = target_path + ".bak"
-            import shutil
             shutil.copy2(target_path, backup_path)
             # Delete original so download can replace it
             os.remove(target_path)
@@ -2486,7 +3444,7 @@ def create_telegraph_page(title: str, content: str) -> str:
     """Create Telegraph page using direct HTTP API"""
     try:
         # Step 1: Create account
-        acc_response = requests.get(
+        acc_response = http_get(
             "https://api.telegra.ph/createAccount",
             params={"short_name": "EncodeBot", "author_name": "Encode Bot"}
         ).json()
@@ -2532,7 +3490,7 @@ def create_telegraph_page(title: str, content: str) -> str:
             nodes = [{"tag": "p", "children": ["No content"]}]
         
         # Step 3: Create page
-        page_response = requests.post(
+        page_response = http_post(
             "https://api.telegra.ph/createPage",
             json={
                 "access_token": access_token,
@@ -2880,12 +3838,49 @@ async def status_cmd(client, message):
     
     # Queue
     text += f"📋 <b>Antrian:</b> {len(JOB_QUEUE)} job\n"
+    total_eta = current_job_remaining() + sum(job_eta(j) for j in JOB_QUEUE)
+    if total_eta:
+        text += f"⏱️ <b>ETA selesai:</b> ~{format_eta(total_eta)}\n"
+    held = [j for j in JOB_QUEUE if admission_check(estimate_job_footprint(j)) is not None]
+    if held:
+        text += f"⏸️ <b>Ditahan:</b> {len(held)} job (menunggu disk/RAM)\n"
     
     # System
     cpu = psutil.cpu_percent()
     ram = psutil.virtual_memory().percent
     text += f"\n🧠 CPU: {cpu}% | 💾 RAM: {ram}%"
-    
+    reserved = sum(ADMISSION_RESERVED.values())
+    text += f"\n💽 Disk free: {human_readable_size(max(get_free_disk(), 0))}"
+    if reserved:
+        text += f" (reserved {human_readable_size(reserved)})"
+
+    # Kapasitas: kecepatan encode (x realtime) per resolusi dari ETA model
+    speeds = [f"{res} {1 / ETA_MODEL[res]['ratio']:.1f}x" for res in ETA_DEFAULT_RATIO if res in ETA_MODEL and ETA_MODEL[res]['ratio'] > 0]
+    if speeds:
+        text += f"\n⚡ Speed: {' • '.join(speeds)}"
+    
+    if DISTRIBUTED_ENABLED:
+        workers = LEASES.active_workers()
+        text += f"\n🖥️ Workers: {len(workers)} aktif"
+        if workers:
+            text += f" ({', '.join(html.escape(w) for w in workers)})"
+
+    if UL_SCHEDULER.active or UL_SCHEDULER.queued():
+        hosts = ", ".join(f"{host} {n}" for host, n in UL_SCHEDULER.active.items())
+        text += f"\n📤 <b>Upload:</b> {UL_SCHEDULER.total_active()} aktif ({hosts or '-'}), {UL_SCHEDULER.queued()} antri"
+        
+    circuits = open_circuits()
+    if circuits:
+        text += "\n⛔ <b>Host dilewati:</b> " + ", ".join(f"{host} ({format_eta(left)})" for host, left in circuits)
+
+    # Latency API host (p50/p95 dari request terakhir), host paling baru dipakai dulu
+    latency = list(host_latency_stats().items())[:6]
+    if latency:
+        text += "\n\n🌐 <b>Host latency</b> (p50 / p95):"
+        for host, m in latency:
+            errors = f" ⚠️{m['errors']}" if m["errors"] else ""
+            text += f"\n• <code>{html.escape(host)}</code> {m['p50']:.2f}s / {m['p95']:.2f}s ({m['count']}x){errors}"
+
     await message.reply(text)
 
 # --- HANDLER /fb (Browse Seedbox FileBrowser) ---
@@ -2975,10 +3970,17 @@ async def queue_cmd(client, message):
     if not JOB_QUEUE:
         return await message.reply("📭 <b>Antrian kosong.</b>")
     
-    text = "📋 <b>ANTRIAN JOB</b>\n━━━━━━━━━━━━━━━━━━\n\n"
-    for i, job in enumerate(JOB_QUEUE, 1):
+    text = "📋 <b>ANTRIAN JOB</b> <i>(urutan fair-share)</i>\n━━━━━━━━━━━━━━━━━━\n\n"
+    multi_user = len({j['chat_id'] for j in JOB_QUEUE}) > 1
+    start_at = current_job_remaining()
+    for i, job in enumerate(get_queue_order(), 1):
+        eta = job_eta(job)
+        eta_str = f"\n   ⏱️ ~{format_eta(eta)} (mulai ~{format_eta(start_at)})" if eta else ""
+        start_at += eta
         job_type = job.get('type', 'encode')
         fname = job.get('real_name', 'Unknown')[:35]
+        # Tampilkan pemilik job jika antrian berisi lebih dari satu user
+        owner_tag = f"👤 <code>{job['chat_id']}</code> (w{get_user_weight(job['chat_id']):g})\n   " if multi_user else ""
         
         # Build config info for encode jobs
         if job_type == 'encode':
@@ -2998,11 +4000,12 @@ async def queue_cmd(client, message):
             margin = job.get('margin', '?')
             
             config = f"📺 {res_str} | CRF:{crf_str} | {mode} | F{font} M{margin}"
-            text += f"{i}. <code>{fname}</code>\n   {config}\n\n"
+            text += f"{i}. <code>{fname}</code>\n   {owner_tag}{config}{eta_str}\n\n"
         else:
             # Non-encode jobs (leech, convert, etc)
-            text += f"{i}. [{job_type.upper()}] <code>{fname}</code>\n\n"
+            text += f"{i}. [{job_type.upper()}] <code>{fname}</code>\n" + (f"   {owner_tag}\n" if owner_tag else "\n")
     
+    text += f"⏳ <b>Total ETA encode:</b> ~{format_eta(start_at)}"
     await message.reply(text)
 
 # --- HANDLER /clearqueue ---
@@ -3017,6 +4020,7 @@ async def clearqueue_cmd(client, message):
     
     count = len(JOB_QUEUE)
     JOB_QUEUE.clear()
+    reset_scheduler()
     
     await message.reply(
         f"🗑️ <b>Queue Cleared!</b>\n\n"
@@ -3048,19 +4052,23 @@ async def leech_cmd(client, message):
 
     status_msg = await message.reply("⏳ <b>Menambahkan ke antrian Leech...</b>")
     
-    # Determine filename (async)
-    real_name = await asyncio.to_thread(get_real_filename, url)
+    # Determine filename & size (async)
+    real_name, source_size = await asyncio.gather(
+        asyncio.to_thread(get_real_filename, url),
+        asyncio.to_thread(probe_source_size, url)
+    )
     
     job = {
         "chat_id": chat_id, "msg_id": status_msg.id,
         "url": url, "filename": f"leech_{chat_id}_in.mkv", "real_name": real_name,
+        "source_size": source_size,
         "type": "leech",  # TIPE JOB: LEECH
         "queue": [], # Tidak ada queue resolusi
         "is_cancelled": False
     }
     
     JOB_QUEUE.append(job)
-    await message.reply(f"📥 <b>Leech Job Added!</b>\nPosisi antrian: {len(JOB_QUEUE)}")
+    await message.reply(f"📥 <b>Leech Job Added!</b>\nPosisi antrian: {get_queue_position(job)}")
     await check_queue()
 
 # --- HANDLER /convert (GDrive to Seedbox) ---
@@ -3131,46 +4139,34 @@ async def convert_cmd(client, message):
         
         # Start progress updater
         progress_task = asyncio.create_task(update_progress())
+        admission_key = f"convert_{chat_id}_{status_msg.id}"
         
         try:
             # 1. Get filename
             convert_state["phase"] = "Mengambil info file..."
-            real_name = await asyncio.to_thread(get_real_filename, url)
+            real_name, source_size = await asyncio.gather(
+                asyncio.to_thread(get_real_filename, url),
+                asyncio.to_thread(probe_source_size, url)
+            )
             filename = f"convert_{chat_id}_{int(time.time())}.tmp"
             convert_state["filename"] = real_name
             
-            # 2. Download with progress
-            convert_state["phase"] = "download"
+            # Tahan download jika disk/RAM tidak cukup
+            async def on_hold(reason):
+                convert_state["phase"] = f"⏸️ Ditahan: {reason}"
+            await wait_for_admission(admission_key, source_size or int(UNKNOWN_SOURCE_GB * 1024 ** 3), on_hold)
             
-            def dl_file_with_progress():
-                cmd = ["yt-dlp", "-o", filename, "--newline", "--force-overwrites", url]
-                p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
-                
-                while True:
-                    line = p.stdout.readline()
-                    if not line and p.poll() is not None:
-                        break
-                    
-                    if "[download]" in line:
-                        # Parse percentage
-                        pct_match = re.search(r"(\d+\.?\d*)%", line)
-                        if pct_match:
-                            convert_state["dl_pct"] = float(pct_match.group(1))
-                        
-                        # Parse size
-                        size_match = re.search(r"of\s+([\d.]+\s*[KMGT]?i?B)", line)
-                        if size_match:
-                            convert_state["dl_size"] = size_match.group(1)
-                        
-                        # Parse speed
-                        speed_match = re.search(r"at\s+([\d.]+\s*[KMGT]?i?B/s)", line)
-                        if speed_match:
-                            convert_state["dl_speed"] = speed_match.group(1)
-                
-                if p.returncode != 0:
-                    raise Exception(f"Download failed")
+            # 2. Download with progress
+            def on_dl_progress(info):
+                convert_state["dl_pct"] = info.get("pct", convert_state["dl_pct"])
+                convert_state["dl_size"] = info.get("size", convert_state["dl_size"])
+                convert_state["dl_speed"] = info.get("speed", convert_state["dl_speed"])
             
-            await asyncio.to_thread(dl_file_with_progress)
+            if not DL_SCHEDULER.available(url):
+                convert_state["phase"] = "Antri slot download..."
+            async with DL_SCHEDULER.slot(url):
+                convert_state["phase"] = "download"
+                await asyncio.to_thread(ytdlp_fetch, url, filename, on_dl_progress, DL_SCHEDULER.bandwidth_share())
             
             if not os.path.exists(filename):
                 raise Exception("File tidak ditemukan setelah download")
@@ -3188,7 +4184,7 @@ async def convert_cmd(client, message):
             convert_state["up_pct"] = 0
             file_size = os.path.getsize(clean_name)
             
-            seedbox_link = await asyncio.to_thread(filebrowser_upload_file, clean_name, chat_id, convert_state)
+            seedbox_link = await run_upload("seedbox", filebrowser_upload_file, clean_name, chat_id, convert_state)
             
             # 4. Cleanup & Send result
             convert_state["phase"] = "done"
@@ -3212,6 +4208,8 @@ async def convert_cmd(client, message):
             progress_task.cancel()
             logger.error(f"Convert Error: {e}")
             await client.edit_message_text(chat_id, status_msg.id, f"❌ <b>Error:</b> {str(e)[:200]}")
+        finally:
+            admission_release(admission_key)
         return
     
     # Multiple URLs - PARALLEL batch mode
@@ -3222,17 +4220,21 @@ async def convert_cmd(client, message):
     
     results = {}  # {index: {"name": ..., "link": ...}}
     
-    async def process_one(idx, url):
+    async def process_one(idx, url, real_name):
         """Download and upload one file"""
+        admission_key = f"convert_{chat_id}_{status_msg.id}_{idx}"
         try:
-            real_name = await asyncio.to_thread(get_real_filename, url)
+            source_size = await asyncio.to_thread(probe_source_size, url)
             temp_file = f"batch_{chat_id}_{idx}_{int(time.time())}.tmp"
             
-            def dl():
-                cmd = ["yt-dlp", "-o", temp_file, "--force-overwrites", url]
-                subprocess.run(cmd, capture_output=True, **get_hidden_params())
+            # Tunggu giliran jika disk tidak cukup untuk file ini
+            await wait_for_admission(admission_key, source_size or int(UNKNOWN_SOURCE_GB * 1024 ** 3))
             
-            await asyncio.to_thread(dl)
+            try:
+                async with DL_SCHEDULER.slot(url):
+                    await asyncio.to_thread(ytdlp_fetch, url, temp_file, None, DL_SCHEDULER.bandwidth_share())
+            except Exception as e:
+                logger.warning(f"Batch download #{idx} failed: {e}")
             
             if not os.path.exists(temp_file):
                 results[idx] = {"status": "❌", "name": f"#{idx}", "link": "Download gagal"}
@@ -3243,7 +4245,7 @@ async def convert_cmd(client, message):
             if os.path.exists(final_name): os.remove(final_name)
             os.rename(temp_file, final_name)
             
-            seedbox_link = await asyncio.to_thread(filebrowser_upload_file, final_name, chat_id, None)
+            seedbox_link = await run_upload("seedbox", filebrowser_upload_file, final_name, chat_id, None)
             
             if os.path.exists(final_name): os.remove(final_name)
             
@@ -3254,9 +4256,12 @@ async def convert_cmd(client, message):
                 
         except Exception as e:
             results[idx] = {"status": "❌", "name": f"#{idx}", "link": str(e)[:40]}
+        finally:
+            admission_release(admission_key)
     
     # Run ALL downloads+uploads in parallel
-    await asyncio.gather(*[process_one(i, url) for i, url in enumerate(urls, 1)], return_exceptions=True)
+    names = await resolve_filenames(urls)  # Nama file seluruh batch sekaligus, sekali per URL
+    await asyncio.gather(*[process_one(i, url, names[url]) for i, url in enumerate(urls, 1)], return_exceptions=True)
     
     # Build final result
     result_lines = []
@@ -3325,10 +4330,8 @@ async def filepress_cmd(client, message):
     
     results = {}
     
-    async def mirror_one(idx, url):
+    async def mirror_one(idx, url, filename):
         try:
-            # Get filename from GDrive
-            filename = await asyncio.to_thread(get_real_filename, url)
             if filename:
                 filename = os.path.basename(urllib.parse.unquote(filename))
                 filename = filename[:40] + "..." if len(filename) > 40 else filename
@@ -3343,7 +4346,8 @@ async def filepress_cmd(client, message):
         except Exception as e:
             results[idx] = {"status": "❌", "name": f"File #{idx}", "link": str(e)[:30]}
     
-    await asyncio.gather(*[mirror_one(i, url) for i, url in enumerate(urls, 1)], return_exceptions=True)
+    names = await resolve_filenames(urls)  # Nama file seluruh batch sekaligus, sekali per URL
+    await asyncio.gather(*[mirror_one(i, url, names[url]) for i, url in enumerate(urls, 1)], return_exceptions=True)
     
     # Build result - sort by filename A-Z
     sorted_results = sorted(results.values(), key=lambda x: x.get("name", "").lower())
@@ -3386,24 +4390,27 @@ async def up_cmd(client, message):
     if len(urls) == 1:
         url = urls[0]
         status_msg = await message.reply("⏳ <b>Memulai proses upload...</b>")
+        admission_key = f"up_{chat_id}_{status_msg.id}"
         
         try:
             await client.edit_message_text(chat_id, status_msg.id, "📋 <b>Mengambil info file...</b>")
-            real_name = await asyncio.to_thread(get_real_filename, url)
+            real_name, source_size = await asyncio.gather(
+                asyncio.to_thread(get_real_filename, url),
+                asyncio.to_thread(probe_source_size, url)
+            )
             temp_file = f"up_{chat_id}_{int(time.time())}.tmp"
             
+            async def on_hold(reason):
+                await client.edit_message_text(chat_id, status_msg.id, f"⏸️ <b>Ditahan:</b> {reason}")
+            await wait_for_admission(admission_key, source_size or int(UNKNOWN_SOURCE_GB * 1024 ** 3), on_hold)
+            
             await client.edit_message_text(
                 chat_id, status_msg.id, 
                 f"📥 <b>Downloading:</b>\n<code>{real_name}</code>"
             )
             
-            def download_file():
-                cmd = ["yt-dlp", "-o", temp_file, "--force-overwrites", url]
-                result = subprocess.run(cmd, capture_output=True, text=True, **get_hidden_params())
-                if result.returncode != 0:
-                    raise Exception(f"Download failed")
-            
-            await asyncio.to_thread(download_file)
+            async with DL_SCHEDULER.slot(url):
+                await asyncio.to_thread(ytdlp_fetch, url, temp_file, None, DL_SCHEDULER.bandwidth_share())
             
             if not os.path.exists(temp_file):
                 raise Exception("File tidak ditemukan")
@@ -3436,8 +4443,8 @@ async def up_cmd(client, message):
             async def up_buzzheavier():
                 if not BUZZHEAVIER_ENABLED: upload_status["buzzheavier"] = "⭕"; return None
                 try:
-                    link = await asyncio.to_thread(buzzheavier_upload_file, clean_name)
-                    upload_status["buzzheavier"] = "✅" if link else "❌"
+                    link = await run_upload("buzzheavier", buzzheavier_upload_file, clean_name, fanout,
+                                            status=upload_status, refresh=update_up_msg)
                     upload_links["buzzheavier"] = link
                     await update_up_msg()
                     return link
@@ -3446,8 +4453,11 @@ async def up_cmd(client, message):
             async def up_gofile():
                 if not GOFILE_ENABLED: upload_status["gofile"] = "⭕"; return None
                 try:
-                    link = await asyncio.to_thread(gofile_upload_file, clean_name)
-                    upload_status["gofile"] = "✅" if link else "❌"
+                    link = await run_upload(
+                        "gofile", gofile_upload_file, clean_name,
+                        status_progress(upload_status, "gofile", update_up_msg, asyncio.get_running_loop()),
+                        fanout, status=upload_status, refresh=update_up_msg
+                    )
                     upload_links["gofile"] = link
                     await update_up_msg()
                     return link
@@ -3456,14 +4466,21 @@ async def up_cmd(client, message):
             async def up_mirrored():
                 if not MIRRORED_ENABLED: upload_status["mirrored"] = "⭕"; return None
                 try:
-                    link = await asyncio.to_thread(mirrored_upload_file, clean_name)
-                    upload_status["mirrored"] = "✅" if link else "❌"
+                    link = await run_upload(
+                        "mirrored", mirrored_upload_file, clean_name,
+                        status_progress(upload_status, "mirrored", update_up_msg, asyncio.get_running_loop()),
+                        fanout, status=upload_status, refresh=update_up_msg
+                    )
                     upload_links["mirrored"] = link
                     await update_up_msg()
                     return link
                 except: upload_status["mirrored"] = "❌"; await update_up_msg(); return None
             
-            await asyncio.gather(up_buzzheavier(), up_gofile(), up_mirrored(), return_exceptions=True)
+            fanout = FanoutReader(clean_name)
+            try:
+                await asyncio.gather(up_buzzheavier(), up_gofile(), up_mirrored(), return_exceptions=True)
+            finally:
+                fanout.close()
             
             if os.path.exists(clean_name): os.remove(clean_name)
             
@@ -3477,6 +4494,8 @@ async def up_cmd(client, message):
         except Exception as e:
             logger.error(f"UP Error: {e}")
             await client.edit_message_text(chat_id, status_msg.id, f"❌ <b>Error:</b> {str(e)[:200]}")
+        finally:
+            admission_release(admission_key)
         return
     
     # Multiple URLs - PARALLEL batch mode
@@ -3484,14 +4503,20 @@ async def up_cmd(client, message):
     
     results = {}  # {idx: {"name": ..., "links": {...}}}
     
-    async def process_one(idx, url):
+    async def process_one(idx, url, real_name):
         """Download and upload to all hosts"""
+        admission_key = f"up_{chat_id}_{status_msg.id}_{idx}"
         try:
-            real_name = await asyncio.to_thread(get_real_filename, url)
+            source_size = await asyncio.to_thread(probe_source_size, url)
             temp_file = f"batch_up_{chat_id}_{idx}_{int(time.time())}.tmp"
             
-            def dl(): subprocess.run(["yt-dlp", "-o", temp_file, "--force-overwrites", url], capture_output=True, **get_hidden_params())
-            await asyncio.to_thread(dl)
+            await wait_for_admission(admission_key, source_size or int(UNKNOWN_SOURCE_GB * 1024 ** 3))
+            
+            try:
+                async with DL_SCHEDULER.slot(url):
+                    await asyncio.to_thread(ytdlp_fetch, url, temp_file, None, DL_SCHEDULER.bandwidth_share())
+            except Exception as e:
+                logger.warning(f"Batch download #{idx} failed: {e}")
             
             if not os.path.exists(temp_file):
                 results[idx] = {"status": "❌", "name": f"#{idx}", "links": "Download gagal"}
@@ -3504,11 +4529,15 @@ async def up_cmd(client, message):
             
             # Upload to 3 hosts in parallel
             links = {}
-            async def up_b(): links["buzz"] = await asyncio.to_thread(buzzheavier_upload_file, final_name) if BUZZHEAVIER_ENABLED else None
-            async def up_g(): links["gofile"] = await asyncio.to_thread(gofile_upload_file, final_name) if GOFILE_ENABLED else None
-            async def up_m(): links["mir"] = await asyncio.to_thread(mirrored_upload_file, final_name) if MIRRORED_ENABLED else None
+            fanout = FanoutReader(final_name)
+            async def up_b(): links["buzz"] = await run_upload("buzzheavier", buzzheavier_upload_file, final_name, fanout) if BUZZHEAVIER_ENABLED else None
+            async def up_g(): links["gofile"] = await run_upload("gofile", gofile_upload_file, final_name, None, fanout) if GOFILE_ENABLED else None
+            async def up_m(): links["mir"] = await run_upload("mirrored", mirrored_upload_file, final_name, None, fanout) if MIRRORED_ENABLED else None
             
-            await asyncio.gather(up_b(), up_g(), up_m(), return_exceptions=True)
+            try:
+                await asyncio.gather(up_b(), up_g(), up_m(), return_exceptions=True)
+            finally:
+                fanout.close()
             
             if os.path.exists(final_name): os.remove(final_name)
             
@@ -3516,9 +4545,12 @@ async def up_cmd(client, message):
             
         except Exception as e:
             results[idx] = {"status": "❌", "name": f"#{idx}", "links": str(e)[:30]}
+        finally:
+            admission_release(admission_key)
     
     # Run ALL in parallel
-    await asyncio.gather(*[process_one(i, url) for i, url in enumerate(urls, 1)], return_exceptions=True)
+    names = await resolve_filenames(urls)  # Nama file seluruh batch sekaligus, sekali per URL
+    await asyncio.gather(*[process_one(i, url, names[url]) for i, url in enumerate(urls, 1)], return_exceptions=True)
     
     # Build result
     result_lines = []
@@ -3718,6 +4750,8 @@ async def document_handler(client, message):
             status_msg = await client.send_message(chat_id, f"⏳ <b>Resuming:</b> {job['real_name'][:50]}...")
             job["msg_id"] = status_msg.id
             job["downloaded_file"] = downloaded_file
+            job["resume"] = True  # Scheduler mendahulukan job resume
+            fingerprint_job(job, FILE_CACHE)  # SRT ikut menentukan identitas hasil encode
             JOB_QUEUE.insert(0, job)  # Insert di depan queue
             
             await check_queue()
@@ -4207,6 +5241,7 @@ async def finalize_job(client, message, chat_id):
         fb_files = cfg['fb_files']
         selected_indices = cfg['fb_selected']
         
+        dropped = []
         for idx in sorted(selected_indices):
             file_info = fb_files[idx]
             filename = file_info['name']
@@ -4218,6 +5253,7 @@ async def finalize_job(client, message, chat_id):
                 "chat_id": chat_id, "msg_id": status_msg.id,
                 "url": download_url, "filename": os.path.join(CACHE_FOLDER, f"vid_{chat_id}_{idx}_input.mkv"), 
                 "real_name": filename,
+                "source_size": file_info.get('size', 0),  # Dari listing FileBrowser
                 "type": "encode",
                 "queue": queue, "mode": cfg['mode'], "font": cfg['font'], 
                 "margin": cfg['margin'], "audio": cfg['audio'], "srt": cfg['srt'],
@@ -4225,8 +5261,16 @@ async def finalize_job(client, message, chat_id):
                 "res_crf": cfg.get('res_crf', {}),
                 "is_cancelled": False
             }
+            duplicate = await coalesce_job(client, job)
+            if duplicate:
+                await client.edit_message_text(chat_id, status_msg.id, duplicate)
+                dropped.append(job)
+                continue
             JOB_QUEUE.append(job)
         
+        # Setelah loop: SRT batch dipakai bersama, baru bisa dihapus jika tidak ada job yang masuk antrian
+        for job in dropped:
+            discard_job_files(job)
         await check_queue()
         return
 
@@ -4239,12 +5283,15 @@ async def finalize_job(client, message, chat_id):
             disable_notification=True
         )
         
-        for file_id, cached_file in batch_files:
+        durations = await asyncio.gather(*(probe_metadata(f['path']) for _, f in batch_files))
+        batch_jobs, dropped = [], []
+        for (file_id, cached_file), meta in zip(batch_files, durations):
             job = {
                 "chat_id": chat_id, "msg_id": status_msg.id,
                 "downloaded_file": cached_file['path'],
                 "url": None, "filename": cached_file['path'], 
                 "real_name": cached_file['name'],
+                "duration": meta['duration'],
                 "type": "encode",
                 "queue": queue, "mode": cfg['mode'], "font": cfg['font'], 
                 "margin": cfg['margin'], "audio": cfg['audio'], "srt": cfg['srt'],
@@ -4252,12 +5299,27 @@ async def finalize_job(client, message, chat_id):
                 "res_crf": cfg.get('res_crf', {}),
                 "is_cancelled": False
             }
+            if await coalesce_job(client, job):
+                dropped.append(job)
+                continue
             JOB_QUEUE.append(job)
+            batch_jobs.append(job)
+        for job in dropped:
+            discard_job_files(job)
+        
+        skipped = len(batch_files) - len(batch_jobs)
+        skipped_note = f"\n♻️ {skipped} duplikat dilewati (sudah selesai / sedang diproses)" if skipped else ""
+        if not batch_jobs:
+            await client.edit_message_text(chat_id, status_msg.id, f"♻️ <b>Semua {len(batch_files)} file duplikat</b>, tidak ada job baru.")
+            return
         
+        # Posisi mengikuti kebijakan fair-share (bisa berselang dengan job user lain)
+        order = {id(j): i for i, j in enumerate(get_queue_order(), 1)}
+        positions = [order[id(j)] for j in batch_jobs]
         await client.edit_message_text(
             chat_id, status_msg.id,
-            f"✅ <b>{len(batch_files)} job ditambahkan ke antrian!</b>\n\n"
-            f"📋 Posisi: #{len(JOB_QUEUE) - len(batch_files) + 1} - #{len(JOB_QUEUE)}"
+            f"✅ <b>{len(batch_jobs)} job ditambahkan ke antrian!</b>\n\n"
+            f"📋 Posisi: #{min(positions)} - #{max(positions)}{skipped_note}"
         )
         
         await check_queue()
@@ -4272,6 +5334,7 @@ async def finalize_job(client, message, chat_id):
             "downloaded_file": cfg['cached_file_path'],  # File sudah ada
             "url": None, "filename": cfg['cached_file_path'], 
             "real_name": cfg['cached_file_name'],
+            "duration": (await probe_metadata(cfg['cached_file_path']))['duration'],
             "type": "encode",
             "queue": queue, "mode": cfg['mode'], "font": cfg['font'], 
             "margin": cfg['margin'], "audio": cfg['audio'], "srt": cfg['srt'],
@@ -4280,6 +5343,11 @@ async def finalize_job(client, message, chat_id):
             "is_cancelled": False
         }
         
+        duplicate = await coalesce_job(client, job)
+        if duplicate:
+            discard_job_files(job)
+            return await client.edit_message_text(chat_id, status_msg.id, duplicate)
+        
         JOB_QUEUE.append(job)
         await check_queue()
         return
@@ -4287,12 +5355,16 @@ async def finalize_job(client, message, chat_id):
     # === SINGLE FILE MODE (Normal) ===
     status_msg = await client.send_message(chat_id, "⏳ <b>Mempersiapkan...</b>", disable_notification=True)
     
-    real_name = await asyncio.to_thread(get_real_filename, cfg['url'])
+    real_name, source_size = await asyncio.gather(
+        asyncio.to_thread(get_real_filename, cfg['url']),
+        asyncio.to_thread(probe_source_size, cfg['url'])
+    )
     filename = os.path.join(CACHE_FOLDER, f"vid_{chat_id}_input.mkv")
     
     job = {
         "chat_id": chat_id, "msg_id": status_msg.id,
         "url": cfg['url'], "filename": filename, "real_name": real_name,
+        "source_size": source_size,
         "type": "encode",
         "queue": queue, "mode": cfg['mode'], "font": cfg['font'], 
         "margin": cfg['margin'], "audio": cfg['audio'], "srt": cfg['srt'],
@@ -4301,10 +5373,15 @@ async def finalize_job(client, message, chat_id):
         "is_cancelled": False
     }
     
+    duplicate = await coalesce_job(client, job)
+    if duplicate:
+        discard_job_files(job)
+        return await client.edit_message_text(chat_id, status_msg.id, duplicate)
+    
     JOB_QUEUE.append(job)
     
-    # Feedback posisi antrian
-    queue_pos = len(JOB_QUEUE)
+    # Feedback posisi antrian (sesuai urutan fair-share)
+    queue_pos = get_queue_position(job)
     if queue_pos > 1 or IS_WORKING:
         await client.send_message(
             chat_id, 
@@ -4320,7 +5397,26 @@ async def check_queue():
     if IS_WORKING or not JOB_QUEUE: return
     
     IS_WORKING = True
-    CURRENT_JOB = JOB_QUEUE.pop(0)
+    CURRENT_JOB = pick_next_job()
+    
+    if CURRENT_JOB is None:
+        # Semua job ditahan admission control: kabari user sekali, coba lagi nanti
+        IS_WORKING = False
+        for job in JOB_QUEUE:
+            if job.get('held_notified'):
+                continue
+            job['held_notified'] = True
+            reason = admission_check(estimate_job_footprint(job))
+            try:
+                await app.send_message(
+                    job['chat_id'],
+                    f"⏸️ <b>Job ditahan:</b> <code>{job.get('real_name', 'Unknown')[:40]}</code>\n"
+                    f"{reason or 'Menunggu resource'}\n<i>Akan dilanjutkan otomatis saat ruang tersedia.</i>",
+                    disable_notification=True
+                )
+            except: pass
+        schedule_admission_retry()
+        return
     
     # Track start time for batch summary
     if not hasattr(check_queue, '_batch_start'):
@@ -4366,4 +5462,6 @@ async def check_queue():
 
 if __name__ == "__main__":
     print("🤖 Bot Started (PyroFork Version)")
+    if DISTRIBUTED_ENABLED:
+        start_coordinator()
     app.run()
@@ -21,6 +21,9 @@ OWNER_ID = int(os.getenv("OWNER_ID", "0"))
 # ==========================
 RCLONE_REMOTE = os.getenv("RCLONE_REMOTE", "gdrive")
 RCLONE_FOLDER = os.getenv("RCLONE_FOLDER", "Encode")
+# Upload GDrive lewat `rclone rcd` jangka panjang (RC API) alih-alih spawn rclone per file
+RCLONE_RC_ENABLED = os.getenv("RCLONE_RC_ENABLED", "true").lower() == "true"
+RCLONE_RC_ADDR = os.getenv("RCLONE_RC_ADDR", "127.0.0.1:5572")  # Hanya localhost, user/pass acak per start
 
 # ==========================
 # SEEDBOX FILEBROWSER CONFIG
@@ -30,6 +33,10 @@ SEEDBOX_USER = os.getenv("SEEDBOX_USER", "")
 SEEDBOX_PASS = os.getenv("SEEDBOX_PASS", "")
 SEEDBOX_FB_URL = os.getenv("SEEDBOX_FB_URL", "")
 SEEDBOX_FB_SHARE_HASH = os.getenv("SEEDBOX_FB_SHARE_HASH", "")
+# Upload resumable via endpoint TUS FileBrowser (fallback POST biasa jika server tidak punya)
+SEEDBOX_TUS_ENABLED = os.getenv("SEEDBOX_TUS_ENABLED", "true").lower() == "true"
+SEEDBOX_TUS_CHUNK_MB = int(os.getenv("SEEDBOX_TUS_CHUNK_MB", "32"))  # Ukuran per PATCH
+SEEDBOX_TUS_RETRIES = int(os.getenv("SEEDBOX_TUS_RETRIES", "5"))  # Retry berturut-turut per upload
 
 # ==========================
 # MIRRORED.TO CONFIG
@@ -115,3 +122,143 @@ OUTPUT_FOLDER = "output"
 # DOWNLOAD TIMEOUT (seconds)
 # ==========================
 DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "1800"))  # 30 minutes
+
+# ==========================
+# SEGMENTED DOWNLOADER (HTTP Range, multi-connection)
+# ==========================
+# Direct/FileBrowser URL yang support Range didownload paralel; lainnya tetap yt-dlp
+SEGMENTED_DOWNLOAD_ENABLED = os.getenv("SEGMENTED_DOWNLOAD_ENABLED", "true").lower() == "true"
+DL_CONNECTIONS = int(os.getenv("DL_CONNECTIONS", "4"))  # Koneksi awal
+DL_MAX_CONNECTIONS = int(os.getenv("DL_MAX_CONNECTIONS", "16"))  # Batas atas adaptif
+DL_SEGMENT_MB = int(os.getenv("DL_SEGMENT_MB", "16"))  # Ukuran potongan per request Range
+
+# Encode-while-downloading: rendition pertama dibaca FFmpeg langsung dari URL (Range)
+# selagi download berjalan paralel. Hanya untuk source Range + subtitle eksternal, dan hanya jika
+# rendition pertama single-pass (CRF). Biaya: source diambil 2x dari host (FFmpeg + download cache).
+STREAM_ENCODE_ENABLED = os.getenv("STREAM_ENCODE_ENABLED", "true").lower() == "true"
+
+# Retry + backoff per jenis source (download dilanjutkan dari byte terakhir, bukan dari nol)
+DL_RETRY_POLICY = {
+    "gdrive": {"retries": int(os.getenv("DL_RETRIES_GDRIVE", "3")), "backoff": int(os.getenv("DL_BACKOFF_GDRIVE", "30"))},
+    "filebrowser": {"retries": int(os.getenv("DL_RETRIES_FILEBROWSER", "5")), "backoff": int(os.getenv("DL_BACKOFF_FILEBROWSER", "5"))},
+    "http": {"retries": int(os.getenv("DL_RETRIES_HTTP", "4")), "backoff": int(os.getenv("DL_BACKOFF_HTTP", "10"))},
+}
+
+# Source GDrive lewat rclone (copyid + multi-thread streams), fallback yt-dlp jika gagal
+GDRIVE_RCLONE_ENABLED = os.getenv("GDRIVE_RCLONE_ENABLED", "true").lower() == "true"
+GDRIVE_RCLONE_STREAMS = int(os.getenv("GDRIVE_RCLONE_STREAMS", "8"))
+
+# Scheduler download: slot per host + total, batas bandwidth global dibagi rata ke download aktif
+def _parse_host_limits(raw: str) -> dict:
+    """Parse "host:n,host:n" menjadi {host: n}"""
+    limits = {}
+    for part in raw.split(","):
+        if ":" not in part:
+            continue
+        host, n = part.rsplit(":", 1)
+        try:
+            limits[host.strip().lower()] = max(int(n.strip()), 1)
+        except ValueError:
+            continue
+    return limits
+
+DL_HOST_LIMIT = int(os.getenv("DL_HOST_LIMIT", "2"))  # Download paralel per host (default)
+DL_HOST_LIMITS = _parse_host_limits(os.getenv("DL_HOST_LIMITS", ""))  # Override per host
+DL_TOTAL_LIMIT = int(os.getenv("DL_TOTAL_LIMIT", "6"))  # Download paralel total
+DL_BANDWIDTH_LIMIT_MB = float(os.getenv("DL_BANDWIDTH_LIMIT_MB", "0"))  # MB/s total, 0 = tanpa batas
+
+# yt-dlp sebagai library (YoutubeDL) di process pool, bukan spawn CLI per download/lookup
+YTDLP_LIBRARY_ENABLED = os.getenv("YTDLP_LIBRARY_ENABLED", "true").lower() == "true"
+YTDLP_POOL_SIZE = int(os.getenv("YTDLP_POOL_SIZE", "6"))  # Download/lookup yt-dlp paralel
+
+# Cek source sebelum encode (ukuran, index container, decode sampel); gagal -> download ulang sekali
+SOURCE_VERIFY_ENABLED = os.getenv("SOURCE_VERIFY_ENABLED", "true").lower() == "true"
+SOURCE_VERIFY_SAMPLES = int(os.getenv("SOURCE_VERIFY_SAMPLES", "3"))  # Posisi decode (+ ekor file)
+
+# Nama file source (Content-Disposition / FileBrowser / rclone, yt-dlp hanya fallback)
+FILENAME_CACHE_TTL = int(os.getenv("FILENAME_CACHE_TTL", "3600"))  # Detik, cache per URL
+
+# ==========================
+# HTTP CLIENT (Host API)
+# ==========================
+# Session + connection pool per host (keep-alive), timeout seragam untuk semua integrasi host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))  # Koneksi keep-alive per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))  # Detik
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))  # Detik, jika pemanggil tidak set timeout
+
+# ==========================
+# UPLOAD (Mirror hosts)
+# ==========================
+# Output dibaca sekali dari disk lalu dibagi ke semua uploader (buffer bersama per file);
+# uploader yang tertinggal lebih dari buffer ini membaca sendiri dari disk
+UPLOAD_FANOUT_BUFFER_MB = int(os.getenv("UPLOAD_FANOUT_BUFFER_MB", "32"))
+
+# Host yang upload selagi FFmpeg masih encode (output fMP4 diikuti saat tumbuh), mis. "seedbox,gdrive".
+# Kosong = upload setelah encode selesai. Hanya seedbox & gdrive yang bisa menerima file tanpa ukuran di awal.
+UPLOAD_PIPELINE_HOSTS = [h.strip().lower() for h in os.getenv("UPLOAD_PIPELINE_HOSTS", "").split(",") if h.strip()]
+
+# Scheduler upload: slot per host + total (Seedbox/GDrive didahulukan dari mirror), batas bandwidth upload global
+UPLOAD_HOST_LIMIT = int(os.getenv("UPLOAD_HOST_LIMIT", "2"))  # Upload paralel per host (default)
+UPLOAD_HOST_LIMITS = _parse_host_limits(os.getenv("UPLOAD_HOST_LIMITS", ""))  # Override per host, mis. "seedbox:3"
+UPLOAD_TOTAL_LIMIT = int(os.getenv("UPLOAD_TOTAL_LIMIT", "6"))  # Upload paralel total
+UPLOAD_BANDWIDTH_LIMIT_MB = float(os.getenv("UPLOAD_BANDWIDTH_LIMIT_MB", "0"))  # MB/s total, 0 = tanpa batas
+
+# Retry per host (jittered exponential backoff) + circuit breaker: host yang gagal terus dilewati sementara
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))  # Retry untuk error sementara (timeout, 5xx, 429)
+UPLOAD_BACKOFF = int(os.getenv("UPLOAD_BACKOFF", "10"))  # Detik dasar, dobel tiap retry (maks 5 menit)
+UPLOAD_BREAKER_THRESHOLD = int(os.getenv("UPLOAD_BREAKER_THRESHOLD", "3"))  # Gagal berturut-turut -> host dilewati
+UPLOAD_BREAKER_COOLDOWN = int(os.getenv("UPLOAD_BREAKER_COOLDOWN", "900"))  # Detik sebelum host dicoba lagi
+
+# ==========================
+# QUEUE SCHEDULING (Fair-share)
+# ==========================
+def _parse_weights(raw: str) -> dict:
+    """Parse "chat_id:weight,chat_id:weight" menjadi {chat_id: weight}"""
+    weights = {}
+    for part in raw.split(","):
+        if ":" not in part:
+            continue
+        uid, w = part.split(":", 1)
+        try:
+            weights[int(uid.strip())] = max(float(w.strip()), 0.1)
+        except ValueError:
+            continue
+    return weights
+
+USER_WEIGHTS = _parse_weights(os.getenv("USER_WEIGHTS", ""))
+DEFAULT_USER_WEIGHT = max(float(os.getenv("DEFAULT_USER_WEIGHT", "1")), 0.1)
+OWNER_PRIORITY = os.getenv("OWNER_PRIORITY", "true").lower() == "true"
+SCHED_QUANTUM = max(int(os.getenv("SCHED_QUANTUM", "1800")), 1)  # Detik encode (estimasi ETA) per weight per putaran
+SCHED_SJF = os.getenv("SCHED_SJF", "true").lower() == "true"  # Job terpendek user didahulukan
+
+# ==========================
+# ADMISSION CONTROL (Disk & RAM)
+# ==========================
+# Job ditahan di antrian jika perkiraan footprint-nya tidak muat
+MIN_FREE_DISK_GB = float(os.getenv("MIN_FREE_DISK_GB", "5"))
+MIN_FREE_RAM_MB = int(os.getenv("MIN_FREE_RAM_MB", "512"))
+ESTIMATED_DURATION = int(os.getenv("ESTIMATED_DURATION", "2700"))  # Durasi asumsi jika belum diketahui (detik)
+UNKNOWN_SOURCE_GB = float(os.getenv("UNKNOWN_SOURCE_GB", "2"))  # Ukuran asumsi source tanpa Content-Length
+ADMISSION_HEADROOM = float(os.getenv("ADMISSION_HEADROOM", "1.3"))  # Faktor pengali estimasi output
+ADMISSION_RETRY_INTERVAL = int(os.getenv("ADMISSION_RETRY_INTERVAL", "30"))  # detik
+
+# ==========================
+# DISTRIBUTED ENCODE (Coordinator / Worker)
+# ==========================
+# Bot = coordinator (HTTP API untuk lease job), worker.py = mesin encode headless
+DISTRIBUTED_ENABLED = os.getenv("DISTRIBUTED_ENABLED", "false").lower() == "true"
+COORDINATOR_BIND = os.getenv("COORDINATOR_BIND", "127.0.0.1:8765")  # host:port HTTP API bot (default lokal saja)
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "http://127.0.0.1:8765")  # Dipakai worker.py
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")  # Shared secret (wajib)
+WORKER_NAME = os.getenv("WORKER_NAME", "")  # Default: hostname-pid
+WORKER_DIR = os.getenv("WORKER_DIR", "worker_tmp")
+LEASE_TTL = int(os.getenv("LEASE_TTL", "60"))  # Lease hangus jika tidak ada heartbeat (detik)
+WORKER_HEARTBEAT_INTERVAL = int(os.getenv("WORKER_HEARTBEAT_INTERVAL", "10"))
+WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "5"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+# ==========================
+# ENCODER DAEMON
+# ==========================
+# Path Unix socket encoderd.py. Kosong = FFmpeg jalan di dalam proses bot (thread)
+ENCODER_DAEMON_SOCKET = os.getenv("ENCODER_DAEMON_SOCKET", "")
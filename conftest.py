@@ -0,0 +1 @@
+# Root pytest: folder repo masuk sys.path supaya tests/ bisa import modul bot (downloader, uploader, ...)
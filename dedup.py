@@ -0,0 +1,80 @@
+"""
+Job deduplication for EncodeSilent Ubuntu Bot
+Fingerprint per rendition = identitas source + parameter encode. Rendition yang sudah ada di
+ENCODE_HISTORY dijawab dari history, job identik yang sedang jalan atau di antrian digabung
+(requester baru jadi subscriber hasilnya). Tanpa Telegram dependency.
+"""
+import os
+import hashlib
+import urllib.parse
+from typing import Optional
+
+from downloader import extract_gdrive_file_id
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+def normalize_source_url(url: str) -> str:
+    """URL kanonik: GDrive -> file ID, host lowercase, query tracking dibuang & diurutkan"""
+    if "drive.google." in url or "docs.google." in url:
+        gid = extract_gdrive_file_id(url)
+        if gid:
+            return f"gdrive:{gid}"
+    parts = urllib.parse.urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urllib.parse.urlencode(query), ""))
+
+def gdrive_content_key(source_key: str) -> str:
+    """File ID GDrive menunjuk satu file (yt-dlp tidak memberi validator): key sudah pasti tanpa request"""
+    return hashlib.sha1(source_key.encode()).hexdigest()[:20]
+
+def job_source_key(job, file_cache: dict) -> str:
+    if job.get('url'):
+        return normalize_source_url(job['url'])
+    # File dari cache: pakai identitas source aslinya jika tercatat
+    path = job.get('downloaded_file') or job.get('filename')
+    entry = next((v for v in file_cache.values() if v.get('path') == path), {})
+    if entry.get('source_key'):
+        return entry['source_key']
+    if entry.get('content_key'):
+        return entry['content_key']
+    size = os.path.getsize(path) if path and os.path.exists(path) else entry.get('size', 0)
+    return f"file:{entry.get('name') or job.get('real_name')}:{size}"
+
+def fingerprint_job(job, file_cache: dict):
+    """Hitung source_key + hash SRT (sekali, selagi file SRT masih ada)"""
+    job['source_key'] = job_source_key(job, file_cache)
+    if job['source_key'].startswith("gdrive:") and not job.get('content_key'):
+        # Admission bisa melihat source yang sudah ada di source cache sebelum job jalan
+        job['content_key'] = gdrive_content_key(job['source_key'])
+    job['srt_hash'] = None
+    if job.get('srt') and os.path.exists(job['srt']):
+        with open(job['srt'], 'rb') as f:
+            job['srt_hash'] = hashlib.sha1(f.read()).hexdigest()[:12]
+
+def rendition_fingerprint(job, res: str, file_cache: dict = None) -> str:
+    if 'source_key' not in job:
+        fingerprint_job(job, file_cache or {})
+    crf = job.get('res_crf', {}).get(res, job.get('crf', '26'))
+    parts = [job['source_key'], res, job['mode'], str(crf), str(job['font']), str(job['margin']), job['audio'], job.get('srt_hash') or ""]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+def match_history(history: list, fingerprint: str, expected: list) -> Optional[dict]:
+    """Entry terbaru dengan fingerprint sama yang punya link valid untuk semua host di expected"""
+    for entry in reversed(history):
+        links = entry.get('links', {})
+        if entry.get('fingerprint') == fingerprint and all(links.get(name) and links[name] != "Error Link" for name in expected):
+            return entry
+    return None
+
+def find_identical_job(job, others: list, file_cache: dict) -> Optional[dict]:
+    """Job encode aktif (berjalan / antri) yang menghasilkan semua rendition job ini, atau None"""
+    wanted = {rendition_fingerprint(job, res, file_cache) for res in job['queue']}
+    for other in others:
+        if other is job or other.get('type', 'encode') != 'encode' or other.get('is_cancelled'):
+            continue
+        if wanted <= {rendition_fingerprint(other, res, file_cache) for res in other['queue']}:
+            return other
+    return None
@@ -0,0 +1,752 @@
+"""
+Segmented HTTP downloader for EncodeSilent Ubuntu Bot
+Download paralel via HTTP Range ke file yang sudah di-preallocate (os.pwrite), tanpa Telegram dependency.
+Progress disimpan di sidecar "<dest>.dlstate" sehingga retry/restart melanjutkan dari byte terakhir.
+Source GDrive didownload lewat rclone (API Drive, multi-thread streams) alih-alih yt-dlp.
+yt-dlp dipakai sebagai library (YoutubeDL) di process pool yang tetap hidup, bukan spawn per link.
+Semua download berbagi DownloadScheduler (slot per host, bandwidth global dibagi rata).
+"""
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import logging
+import itertools
+import threading
+import contextlib
+import subprocess
+import importlib.util
+import multiprocessing
+import urllib.parse
+import requests
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Callable
+
+from config import (
+    CACHE_FOLDER, DL_CONNECTIONS, DL_MAX_CONNECTIONS, DL_SEGMENT_MB, DL_RETRY_POLICY,
+    GDRIVE_RCLONE_STREAMS, YTDLP_LIBRARY_ENABLED, YTDLP_POOL_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+CHUNK_SIZE = 1024 * 1024
+SEGMENT_RETRIES = 5
+ADAPT_INTERVAL = 3  # Detik antar evaluasi jumlah koneksi
+ADAPT_GAIN = 1.1  # Tambah koneksi hanya jika throughput naik >10%
+
+class DownloadError(Exception):
+    pass
+
+def source_type(url: str) -> str:
+    """Jenis source untuk memilih DL_RETRY_POLICY"""
+    if "drive.google." in url or "docs.google." in url:
+        return "gdrive"
+    if "/api/public/dl/" in url or "/share/" in url:
+        return "filebrowser"
+    return "http"
+
+def extract_gdrive_file_id(url_or_id: str) -> str:
+    """Extract Google Drive file ID from URL or return as-is if already an ID"""
+    if not url_or_id:
+        return None
+
+    # Already an ID (no slashes or dots)
+    if "/" not in url_or_id and "." not in url_or_id:
+        return url_or_id
+
+    # Extract from various GDrive URL formats
+    patterns = [
+        r"/file/d/([a-zA-Z0-9_-]+)",  # /file/d/ID
+        r"id=([a-zA-Z0-9_-]+)",        # ?id=ID
+        r"/open\?id=([a-zA-Z0-9_-]+)", # /open?id=ID
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, url_or_id)
+        if match:
+            return match.group(1)
+
+    return None
+
+def retry_policy(url: str) -> dict:
+    """{"retries": n, "backoff": detik} untuk jenis source URL"""
+    return DL_RETRY_POLICY.get(source_type(url), DL_RETRY_POLICY["http"])
+
+def backoff_delay(policy: dict, attempt: int) -> float:
+    """Exponential backoff (attempt mulai 1), dibatasi 5 menit"""
+    return min(policy["backoff"] * 2 ** (attempt - 1), 300)
+
+# --- Sidecar state (<dest>.dlstate) ---
+
+def state_path(dest: str) -> str:
+    return dest + ".dlstate"
+
+def load_state(dest: str) -> dict:
+    try:
+        with open(state_path(dest), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(dest: str, state: dict):
+    tmp = state_path(dest) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path(dest))
+
+def clear_state(dest: str):
+    try:
+        os.remove(state_path(dest))
+    except OSError:
+        pass
+
+# --- Source cache (CACHE_FOLDER/src_<content_key>.mkv) ---
+
+def source_cache_path(content_key: str) -> str:
+    return os.path.join(CACHE_FOLDER, f"src_{content_key}.mkv")
+
+def source_cache_hit(path: str, size: int = 0) -> bool:
+    """File lengkap: ada, tidak ada sidecar download, ukuran cocok (jika diketahui)"""
+    if not os.path.exists(path) or os.path.exists(state_path(path)):
+        return False
+    return not size or os.path.getsize(path) == size
+
+def prepare_ytdlp_resume(dest: str, url: str) -> bool:
+    """Siapkan download yt-dlp: lanjutkan .part hanya jika sidecar milik URL yang sama.
+
+    Target bisa dipakai ulang untuk URL lain (vid_{chat_id}_input.mkv), jadi sisa
+    download URL lain dibuang dulu. Returns True jika melanjutkan download sebelumnya.
+    """
+    state = load_state(dest)
+    resuming = state.get("url") == url and state.get("tool") == "yt-dlp" and os.path.exists(dest + ".part")
+    stale = [dest] if resuming else [dest, dest + ".part"]
+    for path in stale:
+        if os.path.exists(path):
+            os.remove(path)
+    save_state(dest, {"url": url, "tool": "yt-dlp"})
+    return resuming
+
+def _merge_ranges(ranges: list) -> list:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _missing_ranges(done: list, size: int) -> list:
+    missing, pos = [], 0
+    for start, end in _merge_ranges(done):
+        if start > pos:
+            missing.append((pos, start - 1))
+        pos = max(pos, end + 1)
+    if pos < size:
+        missing.append((pos, size - 1))
+    return missing
+
+def probe_ranged(url: str) -> Optional[dict]:
+    """Cek apakah URL bisa didownload segmented (Range 206 + ukuran diketahui).
+
+    Returns {"url": final_url, "size": bytes, "etag", "last_modified"} atau None (pakai yt-dlp).
+    """
+    try:
+        with requests.get(url, headers={"Range": "bytes=0-0", "User-Agent": USER_AGENT},
+                          stream=True, allow_redirects=True, timeout=15) as r:
+            if r.status_code != 206 or "text/html" in r.headers.get("Content-Type", ""):
+                return None
+            match = re.match(r"bytes 0-0/(\d+)", r.headers.get("Content-Range", ""))
+            if not match or int(match.group(1)) == 0:
+                return None
+            return {
+                "url": r.url, "size": int(match.group(1)),
+                "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")
+            }
+    except requests.RequestException:
+        return None
+
+def probe_validators(url: str) -> Optional[dict]:
+    """HEAD untuk source tanpa Range: ETag/Last-Modified/ukuran sebagai identitas versi file.
+
+    Returns {"size", "etag", "last_modified"} atau None (halaman HTML / server tidak menjawab).
+    """
+    try:
+        r = requests.head(url, headers={"User-Agent": USER_AGENT}, allow_redirects=True, timeout=15)
+        if not r.ok or "text/html" in r.headers.get("Content-Type", ""):
+            return None
+        return {
+            "size": int(r.headers.get("Content-Length") or 0),
+            "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")
+        }
+    except (requests.RequestException, ValueError):
+        return None
+
+def format_size(size: float) -> str:
+    """Format ala yt-dlp: 2.00GiB / 500.50MiB"""
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            return f"{size:.2f}{unit}"
+        size /= 1024
+    return f"{size:.2f}TiB"
+
+def format_eta(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+class SegmentedDownload:
+    """Satu download: antrian segmen Range dikerjakan N thread, N naik selama throughput bertambah"""
+
+    def __init__(self, url: str, dest: str, size: int, progress: dict = None,
+                 is_cancelled: Callable[[], bool] = None, connections: int = DL_CONNECTIONS,
+                 max_connections: int = DL_MAX_CONNECTIONS, segment_size: int = DL_SEGMENT_MB * 1024 * 1024,
+                 source_url: str = None, etag: str = None, last_modified: str = None,
+                 rate_limit: Callable[[], float] = None):
+        self.url = url
+        self.dest = dest
+        self.size = size
+        self.source_url = source_url or url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.segment_size = segment_size
+        self.progress = progress if progress is not None else {}
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.max_connections = max(1, max_connections)
+        self.target = max(1, min(connections, self.max_connections))
+        self.lock = threading.Lock()
+        self.pending = []
+        self.completed = []  # Range selesai [(start, end)]
+        self.inflight = {}   # {thread_id: [seg_start, pos, seg_end]}
+        self.done_bytes = 0
+        self.alive = 0
+        self.error = None
+        self.stop = threading.Event()
+        self.fd = None
+        self.rate_limit = rate_limit  # Byte/detik jatah download ini (dinamis, 0 = bebas)
+        self.paced_until = 0.0
+
+    def _stopped(self) -> bool:
+        return self.stop.is_set() or self.error is not None or self.is_cancelled()
+
+    def _worker(self):
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        try:
+            while True:
+                with self.lock:
+                    # Koneksi berlebih (setelah throttle) berhenti sendiri
+                    if self._stopped() or self.alive > self.target or not self.pending:
+                        self.alive -= 1
+                        return
+                    start, end = self.pending.pop(0)
+                try:
+                    self._fetch(session, start, end)
+                except Exception as e:
+                    self.error = DownloadError(f"Segmen {start}-{end} error: {e}")
+        finally:
+            session.close()
+
+    def _throttle(self, nbytes: int):
+        """Pacing: tiap chunk memesan nbytes/rate detik; thread tidur jika sudah melampaui jatah"""
+        rate = self.rate_limit() if self.rate_limit else 0
+        if rate <= 0:
+            return
+        with self.lock:
+            now = time.time()
+            self.paced_until = max(self.paced_until, now - 1) + nbytes / rate  # Burst maks 1 detik
+            wait = self.paced_until - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def _if_range(self) -> dict:
+        """If-Range: jika file di server berubah, server membalas 200 (bukan 206) dan segmen gagal"""
+        validator = self.etag if self.etag and not self.etag.startswith("W/") else self.last_modified
+        return {"If-Range": validator} if validator else {}
+
+    def _fetch(self, session: requests.Session, start: int, end: int):
+        attempts = 0
+        key = threading.get_ident()
+        seg_start = start
+        self.inflight[key] = [seg_start, start, end]
+        while start <= end and not self._stopped():
+            try:
+                headers = {"Range": f"bytes={start}-{end}", **self._if_range()}
+                with session.get(self.url, headers=headers, stream=True, timeout=(15, 60)) as r:
+                    if r.status_code in (429, 503):
+                        # Server membatasi: kurangi koneksi dan jangan tambah lagi
+                        with self.lock:
+                            self.target = max(1, self.target - 1)
+                            self.max_connections = self.target
+                        raise DownloadError(f"HTTP {r.status_code} (throttled)")
+                    if r.status_code != 206:
+                        raise DownloadError(f"HTTP {r.status_code} untuk Range {start}-{end}")
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        if self._stopped():
+                            return
+                        chunk = chunk[:end - start + 1]
+                        os.pwrite(self.fd, chunk, start)
+                        start += len(chunk)
+                        with self.lock:
+                            self.done_bytes += len(chunk)
+                            self.inflight[key][1] = start
+                        self._throttle(len(chunk))
+                        if start > end:
+                            break
+                if start <= end:
+                    raise DownloadError(f"Koneksi terputus di byte {start}")
+            except (requests.RequestException, DownloadError, OSError) as e:
+                if self._stopped():
+                    return
+                attempts += 1
+                if attempts > SEGMENT_RETRIES:
+                    self.error = DownloadError(f"Segmen {start}-{end} gagal: {e}")
+                    return
+                logger.warning(f"Segment retry {attempts}/{SEGMENT_RETRIES} @ {start}: {e}")
+                time.sleep(min(2 ** attempts, 30))
+        if start > end:
+            with self.lock:
+                self.inflight.pop(key, None)
+                self.completed.append((seg_start, end))
+
+    def _done_ranges(self) -> list:
+        with self.lock:
+            partial = [(s, pos - 1) for s, pos, _ in self.inflight.values() if pos > s]
+            return _merge_ranges(self.completed + partial)
+
+    def _save_state(self):
+        save_state(self.dest, {
+            "url": self.source_url, "size": self.size, "etag": self.etag,
+            "last_modified": self.last_modified, "done": self._done_ranges()
+        })
+
+    def _resume_ranges(self) -> list:
+        """Range yang sudah ada di disk dari percobaan sebelumnya (kosong jika source berubah)"""
+        state = load_state(self.dest)
+        if not state or not os.path.exists(self.dest):
+            return []
+        if state.get("url") != self.source_url or state.get("size") != self.size:
+            return []
+        # Validator server berubah = isi file berubah, partial tidak bisa dipakai
+        if (self.etag and state.get("etag") and self.etag != state["etag"]) or \
+           (self.last_modified and state.get("last_modified") and self.last_modified != state["last_modified"]):
+            logger.info(f"Source changed on server, restarting {self.dest}")
+            return []
+        return [tuple(r) for r in state.get("done", [])]
+
+    def _spawn(self, count: int):
+        for _ in range(count):
+            with self.lock:
+                self.alive += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _report(self, rate: float):
+        pct = self.done_bytes / self.size * 100
+        self.progress["pct"] = pct
+        self.progress["size"] = format_size(self.size)
+        self.progress["total"] = self.progress["size"]
+        self.progress["speed"] = f"{format_size(rate)}/s"
+        self.progress["eta"] = format_eta((self.size - self.done_bytes) / rate) if rate > 0 else "?"
+        self.progress["connections"] = self.alive
+
+    def run(self) -> int:
+        done = self._resume_ranges()
+        self.fd = os.open(self.dest, os.O_RDWR | os.O_CREAT | (0 if done else os.O_TRUNC), 0o644)
+        try:
+            try:
+                os.posix_fallocate(self.fd, 0, self.size)
+            except (AttributeError, OSError):
+                os.ftruncate(self.fd, self.size)
+            
+            self.completed = [tuple(r) for r in _merge_ranges(done)]
+            self.done_bytes = sum(end - start + 1 for start, end in self.completed)
+            for start, end in _missing_ranges(self.completed, self.size):
+                self.pending += [(s, min(s + self.segment_size - 1, end)) for s in range(start, end + 1, self.segment_size)]
+            if self.done_bytes:
+                logger.info(f"Resuming {self.dest} from {format_size(self.done_bytes)}/{format_size(self.size)}")
+            self._save_state()
+
+            resumed_bytes = self.done_bytes
+            self._spawn(self.target)
+            started = last_check = time.time()
+            last_bytes, best_rate = self.done_bytes, 0.0
+            while True:
+                time.sleep(0.5)
+                now = time.time()
+                with self.lock:
+                    finished = self.alive == 0
+                if self.error:
+                    raise self.error
+                if self.is_cancelled():
+                    raise DownloadError("Cancelled")
+                if finished:
+                    break
+
+                if now - last_check >= ADAPT_INTERVAL:
+                    rate = (self.done_bytes - last_bytes) / (now - last_check)
+                    self._report(rate)
+                    self._save_state()
+                    # Hill-climbing: tambah koneksi selama throughput masih naik
+                    with self.lock:
+                        can_grow = self.pending and self.target < self.max_connections
+                    if can_grow and rate > best_rate * ADAPT_GAIN:
+                        best_rate = rate
+                        with self.lock:
+                            self.target += 1
+                        self._spawn(1)
+                    elif can_grow:
+                        self.max_connections = self.target  # Plateau: berhenti menambah
+                    last_check, last_bytes = now, self.done_bytes
+
+            elapsed = max(time.time() - started, 0.001)
+            self._report((self.done_bytes - resumed_bytes) / elapsed)
+            if self.done_bytes != self.size or os.fstat(self.fd).st_size != self.size:
+                raise DownloadError(f"Ukuran tidak cocok: {self.done_bytes}/{self.size} bytes")
+            self.progress["pct"] = 100
+            clear_state(self.dest)
+            logger.info(f"Segmented download done: {self.dest} ({format_size(self.size)} in {int(elapsed)}s, {self.target} conn)")
+            return self.size
+        finally:
+            # Tunggu thread selesai sebelum fd ditutup (pwrite ke fd tertutup = EBADF)
+            self.stop.set()
+            deadline = time.time() + 30
+            while self.alive > 0 and time.time() < deadline:
+                time.sleep(0.2)
+            if self.progress.get("pct") != 100:
+                self._save_state()  # Gagal/cancel: simpan progress untuk resume
+            os.close(self.fd)
+
+def segmented_download(target: dict, dest: str, progress: dict = None,
+                       is_cancelled: Callable[[], bool] = None, source_url: str = None,
+                       rate_limit: Callable[[], float] = None) -> int:
+    """Download hasil probe_ranged() ke dest dengan banyak koneksi Range (resume otomatis).
+
+    Raise DownloadError jika gagal; progress tersimpan di sidecar untuk percobaan berikutnya.
+    """
+    return SegmentedDownload(
+        target["url"], dest, target["size"], progress, is_cancelled,
+        source_url=source_url, etag=target.get("etag"), last_modified=target.get("last_modified"),
+        rate_limit=rate_limit
+    ).run()
+
+# --- GDrive via rclone ---
+
+def rclone_available() -> bool:
+    return shutil.which("rclone") is not None
+
+def _report_rclone(progress: dict, stats: dict):
+    total = stats.get("totalBytes") or 0
+    done = stats.get("bytes") or 0
+    if total:
+        progress["pct"] = done / total * 100
+        progress["size"] = format_size(total)
+        progress["total"] = progress["size"]
+    progress["speed"] = f"{format_size(stats.get('speed') or 0)}/s"
+    progress["eta"] = format_eta(stats["eta"]) if stats.get("eta") is not None else "?"
+    progress["connections"] = GDRIVE_RCLONE_STREAMS
+
+def rclone_gdrive_download(remote: str, file_id: str, dest: str, progress: dict = None,
+                           is_cancelled: Callable[[], bool] = None, streams: int = GDRIVE_RCLONE_STREAMS,
+                           bwlimit: int = 0) -> int:
+    """Download file GDrive by ID ke dest lewat `rclone backend copyid` (auth remote rclone).
+
+    Progress diambil dari stats JSON rclone. Raise DownloadError jika gagal / dibatalkan.
+    Sidecar .dlstate ada selama rclone berjalan (ukuran GDrive tidak diketahui, jadi hanya
+    sidecar yang menandai file belum lengkap); copyid tidak bisa resume, sisa file gagal dihapus.
+    """
+    cmd = [
+        "rclone", "backend", "copyid", f"{remote}:", file_id, os.path.abspath(dest),
+        "--multi-thread-streams", str(streams), "--multi-thread-cutoff", "64M",
+        "--use-json-log", "--log-level", "NOTICE", "--stats", "1s", "--stats-log-level", "NOTICE",
+    ]
+    if bwlimit > 0:
+        cmd += ["--bwlimit", f"{max(bwlimit // 1024, 1)}K"]
+    save_state(dest, {"gdrive_id": file_id, "tool": "rclone"})
+    p = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf-8", errors="ignore")
+    errors = []
+    try:
+        # Stats muncul tiap detik, jadi cancel tetap dicek walau transfer macet
+        for line in p.stderr:
+            if is_cancelled and is_cancelled():
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("stats") and progress is not None:
+                _report_rclone(progress, entry["stats"])
+            elif entry.get("level") in ("error", "critical"):
+                errors.append(entry.get("msg", ""))
+    finally:
+        if p.poll() is None:
+            p.kill()
+        p.wait()
+
+    cancelled = is_cancelled and is_cancelled()
+    if cancelled or p.returncode != 0 or not os.path.exists(dest):
+        if os.path.exists(dest):
+            os.remove(dest)
+        clear_state(dest)
+        if cancelled:
+            raise DownloadError("Download dibatalkan")
+        raise DownloadError(errors[-1][:300] if errors else f"rclone exit code {p.returncode}")
+    clear_state(dest)
+    return os.path.getsize(dest)
+
+# --- yt-dlp library mode (process pool) ---
+# Worker pool di-fork dari forkserver yang sudah import yt_dlp, jadi startup interpreter +
+# load extractor dibayar sekali. Parent dan worker berbagi satu dict Manager per download:
+# worker menulis "progress", parent menulis "cancel".
+
+YTDLP_POLL_INTERVAL = 0.5  # Detik antar sinkronisasi progress / cek cancel
+YTDLP_CANCEL_GRACE = 30  # Detik menunggu worker berhenti setelah cancel
+
+_ytdlp_lock = threading.Lock()
+_ytdlp_pool = None
+_ytdlp_manager = None
+
+def ytdlp_library_available() -> bool:
+    return YTDLP_LIBRARY_ENABLED and importlib.util.find_spec("yt_dlp") is not None
+
+def _ytdlp_executor():
+    global _ytdlp_pool, _ytdlp_manager
+    with _ytdlp_lock:
+        if _ytdlp_pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("forkserver")
+                # Jangan import ulang __main__ (bot.py) di worker
+                ctx.set_forkserver_preload(["downloader", "yt_dlp"])
+            else:
+                ctx = multiprocessing.get_context("spawn")
+            _ytdlp_manager = ctx.Manager()
+            _ytdlp_pool = ProcessPoolExecutor(max_workers=YTDLP_POOL_SIZE, mp_context=ctx)
+        return _ytdlp_pool, _ytdlp_manager
+
+def _ytdlp_reset():
+    """Pool rusak (worker mati): buang, dibuat ulang saat dipakai lagi"""
+    global _ytdlp_pool
+    with _ytdlp_lock:
+        _ytdlp_pool = None
+
+def _ytdlp_recycle(pid: int = None):
+    """Worker macet setelah cancel: kill (pid-nya, atau semua worker jika pid belum diketahui) dan tunggu
+    sampai mati supaya tidak ada yang masih menulis .part/dest saat download di-retry, lalu pool dibuat ulang.
+    Download lain di pool yang sama ikut gagal (pool broken) dan di-retry pemanggilnya."""
+    global _ytdlp_pool
+    with _ytdlp_lock:
+        pool, _ytdlp_pool = _ytdlp_pool, None
+    if pool is None:
+        return
+    procs = [proc for proc in (pool._processes or {}).values() if pid is None or proc.pid == pid]
+    for proc in procs:
+        proc.kill()
+    for proc in procs:
+        proc.join(10)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+class _SilentLogger:
+    """Error dikembalikan lewat exception; jangan tulis ke stderr bot"""
+    def debug(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): pass
+
+def _ytdlp_download_task(url: str, dest: str, resume: bool, ratelimit: int, shared) -> int:
+    """Jalan di worker pool. Progress hook menggantikan parsing stdout CLI."""
+    import yt_dlp
+    shared["pid"] = os.getpid()  # Untuk _ytdlp_recycle jika worker ini macet
+    last_sync = [0.0]
+
+    def hook(d):
+        now = time.time()
+        if now - last_sync[0] < YTDLP_POLL_INTERVAL:
+            return
+        last_sync[0] = now
+        if shared["cancel"]:
+            raise yt_dlp.utils.DownloadCancelled("cancelled")
+        if d.get("status") == "downloading":
+            total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+            done = d.get("downloaded_bytes") or 0
+            shared["progress"] = {
+                "pct": done / total * 100 if total else 0,
+                "size": format_size(total) if total else "?",
+                "speed": f"{format_size(d.get('speed') or 0)}/s",
+                "eta": format_eta(d["eta"]) if d.get("eta") is not None else "?",
+            }
+
+    opts = {
+        "outtmpl": dest, "continuedl": resume, "overwrites": not resume, "noplaylist": True,
+        "quiet": True, "no_warnings": True, "noprogress": True, "progress_hooks": [hook],
+        "socket_timeout": 60, "logger": _SilentLogger(), "ratelimit": ratelimit or None,
+    }
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            ydl.download([url])
+    except yt_dlp.utils.DownloadCancelled:
+        raise DownloadError("Download dibatalkan")
+    except Exception as e:
+        # Exception yt-dlp bisa membawa objek yang tidak bisa di-pickle ke parent
+        raise DownloadError(str(e)[:500])
+    if not os.path.exists(dest):
+        raise DownloadError("File tidak ditemukan setelah download")
+    return os.path.getsize(dest)
+
+def _ytdlp_names_task(urls: list, template: str) -> dict:
+    import yt_dlp
+    names = {}
+    opts = {"outtmpl": template, "noplaylist": True, "quiet": True, "no_warnings": True,
+            "socket_timeout": 20, "logger": _SilentLogger()}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        for url in urls:
+            try:
+                info = ydl.extract_info(url, download=False)
+                if info:
+                    names[url] = ydl.prepare_filename(info)
+            except Exception:
+                continue
+    return names
+
+def ytdlp_download(url: str, dest: str, on_progress: Callable[[dict], None] = None,
+                   is_cancelled: Callable[[], bool] = None, timeout: float = None, resume: bool = True,
+                   ratelimit: int = 0) -> int:
+    """Download URL ke dest lewat YoutubeDL di process pool (blocking).
+
+    on_progress(dict pct/size/speed/eta) dipanggil dari thread pemanggil, ratelimit dalam byte/detik
+    (0 = bebas). Raise DownloadError
+    jika gagal, dibatalkan, atau melewati timeout (worker dihentikan lewat progress hook).
+    """
+    if is_cancelled and is_cancelled():
+        raise DownloadError("Download dibatalkan")
+    try:
+        pool, manager = _ytdlp_executor()
+        shared = manager.dict(cancel=False, progress=None, pid=None)
+        future = pool.submit(_ytdlp_download_task, url, dest, resume, ratelimit, shared)
+    except BrokenProcessPool:
+        _ytdlp_reset()
+        raise DownloadError("yt-dlp pool rusak, coba lagi")
+    deadline = time.time() + timeout if timeout else None
+    stop_reason, stop_at = None, None
+    while True:
+        try:
+            return future.result(timeout=YTDLP_POLL_INTERVAL)
+        except FuturesTimeout:
+            pass
+        except BrokenProcessPool:
+            _ytdlp_reset()
+            raise DownloadError("yt-dlp worker mati")
+        except DownloadError:
+            if stop_reason:
+                raise DownloadError(stop_reason)
+            raise
+
+        if on_progress and shared.get("progress"):
+            on_progress(shared["progress"])
+        if not stop_reason:
+            if is_cancelled and is_cancelled():
+                stop_reason = "Download dibatalkan"
+            elif deadline and time.time() > deadline:
+                stop_reason = "Download Timeout"
+            if stop_reason:
+                stop_at = time.time()
+                shared["cancel"] = True
+                if future.cancel():  # Belum sempat jalan (pool penuh)
+                    raise DownloadError(stop_reason)
+        elif time.time() - stop_at > YTDLP_CANCEL_GRACE:
+            # Worker tidak memanggil hook (macet di extractor/socket): dimatikan, jangan sampai masih
+            # menulis file yang sama saat process_job retry
+            logger.warning(f"yt-dlp worker tidak berhenti {YTDLP_CANCEL_GRACE}s setelah {stop_reason}, pool di-recycle")
+            _ytdlp_recycle(shared.get("pid"))
+            raise DownloadError(stop_reason)
+
+def ytdlp_filenames(urls: list, template: str = "%(title)s.%(ext)s", timeout: float = 60) -> dict:
+    """{url: nama} lewat extract_info di process pool (satu task untuk seluruh batch)"""
+    try:
+        pool, _ = _ytdlp_executor()
+        return pool.submit(_ytdlp_names_task, urls, template).result(timeout=timeout)
+    except BrokenProcessPool:
+        _ytdlp_reset()
+    except Exception as e:
+        logger.warning(f"yt-dlp filename lookup failed: {e}")
+    return {}
+
+# --- Download scheduler (slot per host + bandwidth global) ---
+# Semua download (process_job/leech, /convert, /up) minta slot dulu. Waiter dilayani
+# urut (prioritas, datang duluan); waiter yang host-nya penuh tidak menahan host lain.
+# Download pipeline encode (process_job) didahulukan dari batch /convert & /up.
+# Bandwidth global dibagi rata ke download aktif: segmented membaca jatahnya terus,
+# yt-dlp/rclone mendapat jatah saat mulai.
+
+PRIORITY_PIPELINE = 0
+PRIORITY_BATCH = 1
+
+class DownloadScheduler:
+    def __init__(self, total_limit: int, host_limit: int, host_limits: dict, bandwidth_mb: float = 0):
+        self.total_limit = max(total_limit, 1)
+        self.bandwidth_mb = bandwidth_mb
+        self.host_limit = max(host_limit, 1)
+        self.host_limits = host_limits
+        self.active = {}  # {host: download berjalan}
+        self.waiters = []  # [(priority, seq, host, future)]
+        self._seq = itertools.count()
+    
+    @staticmethod
+    def host_of(url: str) -> str:
+        if source_type(url) == "gdrive":
+            return "drive.google.com"  # Satu akun/kuota Drive, apapun bentuk link-nya
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        return host[4:] if host.startswith("www.") else host
+    
+    def limit(self, host: str) -> int:
+        return self.host_limits.get(host, self.host_limit)
+    
+    def total_active(self) -> int:
+        return sum(self.active.values())
+    
+    def available(self, url: str) -> bool:
+        host = self.host_of(url)
+        return self.total_active() < self.total_limit and self.active.get(host, 0) < self.limit(host)
+    
+    def _dispatch(self):
+        for waiter in sorted(self.waiters, key=lambda w: w[:2]):
+            if self.total_active() >= self.total_limit:
+                break
+            _, _, host, fut = waiter
+            if fut.done():
+                self.waiters.remove(waiter)
+            elif self.active.get(host, 0) < self.limit(host):
+                self.waiters.remove(waiter)
+                self.active[host] = self.active.get(host, 0) + 1
+                fut.set_result(None)
+    
+    def _release(self, host: str):
+        self.active[host] -= 1
+        if self.active[host] <= 0:
+            del self.active[host]
+        self._dispatch()
+    
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str, priority: int = PRIORITY_BATCH):
+        host = self.host_of(url)
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append((priority, next(self._seq), host, fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(host)  # Slot sudah diberikan tapi task keburu di-cancel
+            else:
+                self._dispatch()
+            raise
+        try:
+            yield
+        finally:
+            self._release(host)
+    
+    def bandwidth_share(self) -> int:
+        """Jatah byte/detik satu download aktif (0 = tanpa batas)"""
+        if self.bandwidth_mb <= 0:
+            return 0
+        return int(self.bandwidth_mb * 1024 ** 2 / max(self.total_active(), 1))
@@ -0,0 +1,339 @@
+"""
+Encoder core for EncodeSilent Ubuntu Bot
+FFmpeg/FFprobe helpers shared by bot.py and headless worker.py (no Telegram dependency)
+"""
+import os
+import re
+import json
+import signal
+import logging
+import subprocess
+from typing import Optional
+
+from config import (
+    SUB_FONT_NAME, SUB_IS_BOLD,
+    WATERMARK_TEXT, WATERMARK_DURATION,
+    HEAUDIO_MAP, AACLCAUDIO_MAP,
+    CACHE_FOLDER, WATERMARK_ENABLED
+)
+
+logger = logging.getLogger(__name__)
+
+# State proses yang dipakai bersama (bot.py mengimpor objek yang sama)
+ACTIVE_PROCESSES = {}  # {chat_id: [Popen, ...]}
+STATUS_DASHBOARD = {}  # {chat_id: {"resolutions": {res: {"status", "pct"}}, "is_cancelled", ...}}
+
+X264_PRESET = "veryfast"  # Ikut jadi bagian profil ETA model di bot.py
+
+def get_hidden_params():
+    """Linux version - no params needed (no console hiding)."""
+    return {}
+
+def time_str_to_seconds(time_str: str) -> float:
+    try:
+        h, m, s = time_str.split(":")
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    except:
+        return 0.0
+
+def force_kill_process(proc):
+    try:
+        if os.name == 'nt':
+            # Gunakan params tersembunyi juga untuk taskkill
+            subprocess.call(['taskkill', '/F', '/T', '/PID', str(proc.pid)], 
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            **get_hidden_params())
+        else:
+            os.kill(proc.pid, signal.SIGKILL)
+    except:
+        pass
+
+def get_video_metadata(filename: str) -> dict:
+    """Mendapatkan detail video (durasi, lebar, tinggi) untuk Telegram"""
+    meta = {"width": 0, "height": 0, "duration": 0, "str": "Info Unavailable"}
+    try:
+        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=width,height,codec_name", "-of", "json", filename]
+        out = subprocess.check_output(cmd, text=True, **get_hidden_params())
+        data = json.loads(out)
+        
+        # Get Video Stream
+        streams = data.get("streams", [])
+        v = next((s for s in streams if s.get("codec_name") not in ["aac", "mp3", "opus"]), {})
+        a = next((s for s in streams if s.get("codec_name") in ["aac", "mp3", "opus"]), {})
+        
+        meta["width"] = int(v.get("width", 0))
+        meta["height"] = int(v.get("height", 0))
+        meta["duration"] = int(float(data.get("format", {}).get("duration", 0)))
+        meta["str"] = f"{meta['width']}x{meta['height']} | {v.get('codec_name', 'unk')} | {a.get('codec_name', 'unk')}"
+    except:
+        pass
+    return meta
+
+def verify_source(filename: str, expected_size: int = 0, samples: int = 3) -> Optional[str]:
+    """Cek cepat source sebelum encode: ukuran, index container, decode sampel di beberapa posisi.
+
+    Returns None jika lolos, atau alasan (string) jika file terpotong / rusak.
+    """
+    if not os.path.exists(filename):
+        return "File tidak ditemukan"
+    size = os.path.getsize(filename)
+    if expected_size and size != expected_size:
+        return f"Ukuran {size} byte, seharusnya {expected_size} byte"
+
+    # Index container: durasi & video stream harus terbaca dari header
+    try:
+        out = subprocess.check_output(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=codec_type", "-of", "json", filename],
+            text=True, stderr=subprocess.STDOUT, timeout=60, **get_hidden_params()
+        )
+        data = json.loads(out[out.find("{"):])
+        duration = float(data.get("format", {}).get("duration") or 0)
+    except (subprocess.SubprocessError, ValueError) as e:
+        return f"Container tidak terbaca: {str(e)[:200]}"
+    if duration <= 0 or not any(s.get("codec_type") == "video" for s in data.get("streams", [])):
+        return "Container tanpa durasi / video stream"
+
+    # Decode beberapa frame di awal, tengah, dan ekor file (ekor = deteksi file terpotong)
+    positions = [duration * i / samples for i in range(samples)] + [max(duration - 5, 0)]
+    for pos in positions:
+        try:
+            proc = subprocess.run(
+                ["ffmpeg", "-nostdin", "-v", "error", "-progress", "pipe:1", "-ss", f"{pos:.2f}", "-i", filename,
+                 "-map", "0:v:0", "-frames:v", "3", "-f", "null", "-"],
+                capture_output=True, text=True, errors="ignore", timeout=60, **get_hidden_params()
+            )
+        except subprocess.TimeoutExpired:
+            return f"Decode macet di {int(pos)}s"
+        frames = re.findall(r"^frame=(\d+)", proc.stdout, re.M)
+        if proc.returncode != 0 or not frames or int(frames[-1]) == 0:
+            detail = proc.stderr.strip().splitlines()[-1:] or ["tidak ada frame"]
+            return f"Decode gagal di {int(pos)}s: {detail[0][:200]}"
+    return None
+
+def get_indo_subtitle_index(filename: str) -> Optional[int]:
+    """Mencari index subtitle Indonesia (matching bash script logic)"""
+    try:
+        # ffprobe -v error -select_streams s -show_entries stream_tags=language -of csv=p=0
+        cmd = [
+            "ffprobe", "-v", "error", "-select_streams", "s",
+            "-show_entries", "stream_tags=language",
+            "-of", "csv=p=0", filename,
+        ]
+        out = subprocess.check_output(cmd, text=True, **get_hidden_params())
+        
+        # Output: satu bahasa per line, e.g.:
+        # eng
+        # ind
+        # chi
+        lines = out.strip().split("\n") if out.strip() else []
+        
+        logger.info(f"Subtitle detection - found {len(lines)} streams: {lines[:10]}")
+        
+        # Cari line yang mengandung 'ind' atau 'indonesian'
+        for i, lang in enumerate(lines):
+            lang_lower = lang.lower().strip()
+            if "ind" in lang_lower or "indonesian" in lang_lower:
+                logger.info(f"Found Indonesian subtitle at stream index {i}: {lang}")
+                return i  # Subtitle stream index (0-based)
+        
+        logger.warning("No Indonesian subtitle found")
+        return None
+    except Exception as e:
+        logger.error(f"Error detecting subtitle: {e}")
+        return None
+
+def extract_subtitle_with_watermark(input_file: str, sub_track: int, output_srt: str) -> bool:
+    """Extract subtitle from video and prepend watermark line.
+    
+    This is a workaround for missing drawtext filter - we inject watermark 
+    into the subtitle file as the first entry.
+    """
+    try:
+        # Extract subtitle to temp file
+        temp_srt = output_srt + ".tmp"
+        cmd = [
+            "ffmpeg", "-y", "-i", input_file,
+            "-map", f"0:s:{sub_track}",
+            "-c:s", "srt",
+            temp_srt
+        ]
+        logger.info(f"Extracting subtitle: {' '.join(cmd)}")
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        
+        if result.returncode != 0:
+            logger.error(f"FFmpeg extract failed: {result.stderr[-500:]}")
+            return False
+        
+        if not os.path.exists(temp_srt):
+            logger.error(f"Temp SRT not created: {temp_srt}")
+            return False
+        
+        # Read extracted subtitle
+        with open(temp_srt, 'r', encoding='utf-8', errors='ignore') as f:
+            original_content = f.read()
+        
+        # Create watermark entry (shown at top center for first 30 seconds)
+        # {\an8} = top center alignment in ASS/SRT
+        watermark_entry = f"""1
+00:00:00,000 --> 00:00:{WATERMARK_DURATION:02d},000
+{{\\an8}}<font color="#FFFF00">{WATERMARK_TEXT}</font>
+
+"""
+        
+        # Renumber existing entries (shift all numbers by 1)
+        lines = original_content.strip().split('\n')
+        new_lines = []
+        entry_num = 1  # Start from 1, watermark is entry 1
+        
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            # Check if this is an entry number
+            if line.isdigit():
+                entry_num += 1
+                new_lines.append(str(entry_num))
+            else:
+                new_lines.append(lines[i])
+            i += 1
+        
+        # Write final SRT with watermark at beginning
+        with open(output_srt, 'w', encoding='utf-8') as f:
+            f.write(watermark_entry)
+            f.write('\n'.join(new_lines))
+        
+        # Cleanup temp
+        if os.path.exists(temp_srt):
+            os.remove(temp_srt)
+        
+        logger.info(f"Created subtitle with watermark: {output_srt}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error extracting subtitle with watermark: {e}")
+        return False
+
+def is_two_pass(mode, res) -> bool:
+    """Rendition ini di-encode 2-pass (source dibaca dua kali)"""
+    return (mode == "2pass") or (mode == "mixed" and res == "360p")
+
+def sync_ffmpeg_worker(chat_id, res, input_file, output_file, mode, font, margin, srt_file, audio_prof, sub_track, crf_value="26",
+                       fragmented=False):
+    """Fungsi FFmpeg Synchronous. fragmented=True -> fMP4 (moov kosong di depan, fragmen di-append)
+    supaya output bisa diupload selagi masih ditulis"""
+    # 1. Tentukan Bitrate & Codec (dengan downmix ke stereo untuk compatibility)
+    if audio_prof == "he":
+        a_opts = ["-c:a", "libfdk_aac", "-profile:a", "aac_he_v2", "-ac", "2", "-b:a", HEAUDIO_MAP.get(res, "48k")]
+    else:
+        a_opts = ["-c:a", "aac", "-ac", "2", "-b:a", AACLCAUDIO_MAP.get(res, "128k")]
+    
+    # 2. Filter Subtitle - escape commas in force_style value
+    style_escaped = f"FontName={SUB_FONT_NAME}\\,FontSize={font}\\,Bold={SUB_IS_BOLD}\\,MarginV={margin}\\,BorderStyle=1\\,Outline=1\\,PrimaryColour=&H00FFFFFF"
+    
+    if res == "360p": h=360; b="300k"
+    elif res == "480p": h=480; b="540k"
+    elif res == "720p": h=720; b="850k"
+    else: h=1080; b="2100k"
+    
+    # 3. Handle subtitle with optional watermark injection
+    temp_srt_with_watermark = None
+    
+    if srt_file:
+        # External SRT provided - use directly
+        sub_path = srt_file.replace("\\", "/").replace(":", "\\\\:")
+        vf = f"scale=-2:{h},subtitles={sub_path}:force_style={style_escaped}"
+    elif sub_track is not None:
+        # Embedded subtitle - check if watermark enabled
+        if WATERMARK_ENABLED:
+            # Extract subtitle and inject watermark
+            temp_srt_with_watermark = os.path.join(CACHE_FOLDER, f"sub_wm_{chat_id}_{res}.srt")
+            if extract_subtitle_with_watermark(input_file, sub_track, temp_srt_with_watermark):
+                sub_path = temp_srt_with_watermark.replace("\\", "/").replace(":", "\\\\:")
+                vf = f"scale=-2:{h},subtitles={sub_path}:force_style={style_escaped}"
+                logger.info(f"Using subtitle with injected watermark: {temp_srt_with_watermark}")
+            else:
+                # Fallback to original subtitle without watermark
+                clean_input = input_file.replace("\\", "/").replace(":", "\\\\:")
+                vf = f"scale=-2:{h},subtitles={clean_input}:si={sub_track}:force_style={style_escaped}"
+                logger.warning("Failed to inject watermark, using original subtitle")
+        else:
+            # Watermark disabled - use embedded subtitle directly
+            clean_input = input_file.replace("\\", "/").replace(":", "\\\\:")
+            vf = f"scale=-2:{h},subtitles={clean_input}:si={sub_track}:force_style={style_escaped}"
+    else:
+        # No subtitle - scale only
+        vf = f"scale=-2:{h}"
+    
+
+    # 3. Encoding Logic
+    is_2pass = is_two_pass(mode, res)
+    
+    log_prefix = f"ff_{chat_id}_{res}"
+
+    def run_ff(cmd_list):
+        # GANTI: Pakai **get_hidden_params()
+        p = subprocess.Popen(cmd_list, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', **get_hidden_params())
+        if chat_id not in ACTIVE_PROCESSES: ACTIVE_PROCESSES[chat_id] = []
+        ACTIVE_PROCESSES[chat_id].append(p)
+        
+        dur = 0
+        try:
+            # Get duration
+            probe = subprocess.check_output(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_file], **get_hidden_params())
+            dur = float(probe)
+        except: pass
+
+        stderr_lines = []  # Capture stderr for error reporting
+        
+        while True:
+            # CEK CANCEL - break jika sudah di-cancel
+            if chat_id in STATUS_DASHBOARD and STATUS_DASHBOARD.get(chat_id, {}).get('is_cancelled'):
+                force_kill_process(p)
+                break
+                
+            line = p.stderr.readline()
+            if not line and p.poll() is not None: break
+            if not line: continue
+            
+            stderr_lines.append(line)  # Capture stderr
+            
+            # Parse progress
+            if dur > 0 and "time=" in line:
+                m = re.search(r"time=(\d{2}:\d{2}:\d{2}\.\d+)", line)
+                if m and chat_id in STATUS_DASHBOARD:
+                    secs = time_str_to_seconds(m.group(1))
+                    pct = (secs / dur) * 100
+                    STATUS_DASHBOARD[chat_id]["resolutions"][res]["pct"] = pct
+        
+        if chat_id in ACTIVE_PROCESSES and p in ACTIVE_PROCESSES[chat_id]: 
+            ACTIVE_PROCESSES[chat_id].remove(p)
+        if p.poll() != 0 and p.poll() is not None:
+            # Get last few lines of stderr for error info
+            error_detail = "".join(stderr_lines[-20:])[-500:] if stderr_lines else "No stderr"
+            logger.error(f"FFmpeg Error: {error_detail}")
+            raise Exception(f"FFmpeg Error:\n{error_detail}")
+
+    # Input URL (encode-while-downloading): reconnect otomatis jika koneksi putus di tengah
+    input_opts = ["-i", input_file]
+    if input_file.startswith("http"):
+        input_opts = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_on_network_error", "1",
+                      "-reconnect_delay_max", "30"] + input_opts
+    
+    common_opts = ["ffmpeg", "-y", *input_opts, "-vf", vf, "-c:v", "libx264", "-preset", X264_PRESET]
+    out_opts = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"] if fragmented else []
+    
+    if is_2pass:
+        # Pass 1
+        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = "Encoding (Pass 1/2)"
+        run_ff(common_opts + ["-b:v", b, "-pass", "1", "-passlogfile", log_prefix, "-an", "-f", "mp4", "/dev/null"])
+        
+        # Pass 2
+        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = "Encoding (Pass 2/2)"
+        run_ff(common_opts + ["-b:v", b, "-pass", "2", "-passlogfile", log_prefix] + a_opts + out_opts + [output_file])
+        
+        # Cleanup
+        for f in os.listdir("."):
+            if f.startswith(log_prefix): os.remove(f)
+    else:
+        # CRF
+        if chat_id in STATUS_DASHBOARD: STATUS_DASHBOARD[chat_id]["resolutions"][res]["status"] = f"Encoding (CRF {crf_value})"
+        run_ff(common_opts + ["-crf", crf_value] + a_opts + out_opts + [output_file])
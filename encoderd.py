@@ -0,0 +1,111 @@
+"""
+Encoder daemon for EncodeSilent Ubuntu Bot
+Jalankan FFmpeg/FFprobe di luar proses Telegram, bot mengirim perintah via Unix socket.
+Run: python3 encoderd.py  (bot memakai ENCODER_DAEMON_SOCKET yang sama)
+
+Cakupan: hanya encode/probe/verify. Download source dan upload ke host tetap berjalan
+di proses bot (task asyncio + thread), tidak lewat daemon ini.
+
+Protokol: satu request JSON per koneksi (diakhiri newline), balasan JSON per baris:
+  {"op": "encode", ...args sync_ffmpeg_worker}  -> {"event": "progress"|"done"|"error", ...}
+  {"op": "probe", "file": path}                 -> {"event": "done", "result": meta}
+  {"op": "verify", "file": path, "size": n, "samples": k} -> {"event": "done", "result": null | alasan gagal}
+Koneksi ditutup oleh bot = encode dibatalkan.
+"""
+import os
+import json
+import asyncio
+import logging
+import itertools
+
+from config import ENCODER_DAEMON_SOCKET, CACHE_FOLDER
+from encoder import STATUS_DASHBOARD, sync_ffmpeg_worker, get_video_metadata, verify_source
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO,
+)
+logger = logging.getLogger("encoderd")
+
+PROGRESS_INTERVAL = 1  # detik antar event progress
+_conn_ids = itertools.count(1)
+
+async def send(writer: asyncio.StreamWriter, event: str, **data):
+    writer.write(json.dumps({"event": event, **data}).encode() + b"\n")
+    await writer.drain()
+
+async def handle_encode(req: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    key = f"d{next(_conn_ids)}"
+    res = req["res"]
+    STATUS_DASHBOARD[key] = {"resolutions": {res: {"status": "Waiting", "pct": 0}}, "is_cancelled": False}
+    task = asyncio.create_task(asyncio.to_thread(
+        sync_ffmpeg_worker,
+        key, res, req["input_file"], req["output_file"],
+        req["mode"], req["font"], req["margin"], req.get("srt_file"), req["audio"], req.get("sub_track"),
+        req.get("crf", "26"), req.get("fragmented", False)
+    ))
+    # EOF dari bot = cancel
+    disconnected = asyncio.create_task(reader.read())
+    try:
+        while not task.done():
+            await asyncio.wait({task, disconnected}, timeout=PROGRESS_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done() and not task.done():
+                logger.info(f"{key} {res}: client disconnected, cancelling")
+                STATUS_DASHBOARD[key]["is_cancelled"] = True
+                await asyncio.wait({task})
+                task.exception()  # FFmpeg yang di-kill selalu raise, cukup dibuang
+                return
+            info = STATUS_DASHBOARD[key]["resolutions"][res]
+            await send(writer, "progress", pct=info["pct"], status=info["status"])
+        task.result()
+        await send(writer, "done")
+    except (ConnectionError, BrokenPipeError):
+        STATUS_DASHBOARD[key]["is_cancelled"] = True
+        await asyncio.wait({task})
+        task.exception()
+    finally:
+        disconnected.cancel()
+        STATUS_DASHBOARD.pop(key, None)
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        req = json.loads(await reader.readline() or b"{}")
+        op = req.get("op")
+        if op == "encode":
+            await handle_encode(req, reader, writer)
+        elif op == "probe":
+            meta = await asyncio.to_thread(get_video_metadata, req["file"])
+            await send(writer, "done", result=meta)
+        elif op == "verify":
+            reason = await asyncio.to_thread(verify_source, req["file"], req.get("size", 0), req.get("samples", 3))
+            await send(writer, "done", result=reason)
+        else:
+            await send(writer, "error", error=f"unknown op: {op}")
+    except Exception as e:
+        logger.error(f"Request failed: {e}")
+        try:
+            await send(writer, "error", error=str(e))
+        except Exception:
+            pass
+    finally:
+        writer.close()
+
+async def main():
+    if not ENCODER_DAEMON_SOCKET:
+        raise SystemExit("ENCODER_DAEMON_SOCKET belum diisi di .env")
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    if os.path.exists(ENCODER_DAEMON_SOCKET):
+        os.remove(ENCODER_DAEMON_SOCKET)  # socket basi dari run sebelumnya
+
+    server = await asyncio.start_unix_server(handle_client, path=ENCODER_DAEMON_SOCKET)
+    os.chmod(ENCODER_DAEMON_SOCKET, 0o600)
+    logger.info(f"Listening on {ENCODER_DAEMON_SOCKET}")
+    print(f"⚙️ Encoder daemon listening on {ENCODER_DAEMON_SOCKET}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("👋 Encoder daemon stopped")
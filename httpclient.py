@@ -0,0 +1,106 @@
+"""
+Shared HTTP client for EncodeSilent Ubuntu Bot
+Satu requests.Session per host (connection pool + keep-alive), timeout seragam,
+dan metrik latency per host untuk semua integrasi host (upload, remote upload, FileBrowser, Telegraph).
+"""
+import time
+import logging
+import threading
+import urllib.parse
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200  # Sampel terakhir per host untuk p50/p95
+
+_SESSIONS = {}  # host -> requests.Session
+_METRICS = {}  # host -> {"samples": deque, "count": n, "errors": n, "last": ts}
+_LOCK = threading.Lock()
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+def session_for(url: str) -> requests.Session:
+    """Session bersama untuk host URL ini (dibuat sekali, aman dipakai banyak thread)"""
+    host = host_of(url)
+    with _LOCK:
+        session = _SESSIONS.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[host] = session
+        return session
+
+def _timeout(timeout):
+    """Angka = read timeout (connect selalu HTTP_CONNECT_TIMEOUT), None = default, tuple apa adanya"""
+    if timeout is None:
+        return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if isinstance(timeout, (int, float)):
+        return (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+def _record(host: str, seconds: float, ok: bool):
+    with _LOCK:
+        m = _METRICS.setdefault(host, {"samples": deque(maxlen=LATENCY_SAMPLES), "count": 0, "errors": 0, "last": 0})
+        m["samples"].append(seconds)
+        m["count"] += 1
+        m["errors"] += 0 if ok else 1
+        m["last"] = time.time()
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    """requests.request lewat session pool host. Latency = waktu sampai header respons diterima
+    (termasuk kirim body, jadi upload besar tercatat sebagai durasi upload)."""
+    host = host_of(url)
+    kwargs["timeout"] = _timeout(kwargs.get("timeout"))
+    start = time.monotonic()
+    try:
+        resp = session_for(url).request(method, url, **kwargs)
+    except requests.RequestException:
+        _record(host, time.monotonic() - start, False)
+        raise
+    _record(host, resp.elapsed.total_seconds(), resp.status_code < 500)
+    return resp
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("allow_redirects", True)
+    return http_request("GET", url, **kwargs)
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_request("POST", url, **kwargs)
+
+def http_put(url: str, **kwargs) -> requests.Response:
+    return http_request("PUT", url, **kwargs)
+
+def http_head(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("allow_redirects", False)
+    return http_request("HEAD", url, **kwargs)
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+def host_latency_stats() -> dict:
+    """{host: {"count", "errors", "p50", "p95", "last"}} diurutkan dari host terakhir dipakai"""
+    with _LOCK:
+        snapshot = {host: (list(m["samples"]), m["count"], m["errors"], m["last"]) for host, m in _METRICS.items()}
+    stats = {}
+    for host, (samples, count, errors, last) in sorted(snapshot.items(), key=lambda kv: -kv[1][3]):
+        if samples:
+            stats[host] = {
+                "count": count, "errors": errors, "last": last,
+                "p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95),
+            }
+    return stats
+
+def close_sessions():
+    with _LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
@@ -0,0 +1,172 @@
+"""
+rclone RC client for EncodeSilent Ubuntu Bot
+Satu `rclone rcd` jangka panjang (config + token OAuth dibaca sekali) yang dikendalikan lewat JSON RC API,
+pengganti spawn `rclone copy` / `rclone lsjson` per file.
+"""
+import os
+import time
+import uuid
+import atexit
+import shutil
+import secrets
+import logging
+import contextlib
+import threading
+import subprocess
+from typing import Callable, Optional
+
+import requests
+
+from config import RCLONE_RC_ADDR, DATA_FOLDER
+
+logger = logging.getLogger(__name__)
+
+RC_START_TIMEOUT = 15  # Detik menunggu rcd siap
+RC_POLL_INTERVAL = 1  # Detik antar cek job/status + core/stats
+
+class RcloneRCError(Exception):
+    pass
+
+class RcloneDaemon:
+    """Proses `rclone rcd` milik bot (127.0.0.1, user/pass acak per start), dijalankan saat pertama dipakai
+    dan dijalankan ulang otomatis jika mati"""
+
+    def __init__(self, addr: str):
+        self.addr = addr
+        self.url = f"http://{addr}/"
+        self.proc = None
+        self.session = requests.Session()  # Polling lokal, tidak masuk metrik latency host
+        self._lock = threading.Lock()
+        self._bw_lock = threading.Lock()
+        self._bw_users = 0  # Transfer yang sedang memakai core/bwlimit
+
+    def running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _post(self, path: str, params: dict, timeout: float) -> requests.Response:
+        return self.session.post(self.url + path, json=params, timeout=timeout)
+
+    def start(self) -> bool:
+        """Pastikan rcd jalan. False jika rclone tidak ada / rcd gagal start (pemanggil pakai CLI)"""
+        with self._lock:
+            if self.running():
+                return True
+            if not shutil.which("rclone"):
+                return False
+            user, password = "encodebot", secrets.token_urlsafe(16)
+            cmd = [
+                "rclone", "rcd", f"--rc-addr={self.addr}", f"--rc-user={user}", f"--rc-pass={password}",
+                "--log-level", "NOTICE", "--log-file", os.path.join(DATA_FOLDER, "rclone_rcd.log"),
+            ]
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.session.auth = (user, password)
+            deadline = time.time() + RC_START_TIMEOUT
+            while time.time() < deadline:
+                if self.proc.poll() is not None:
+                    logger.error(f"rclone rcd exit {self.proc.returncode} (port {self.addr} dipakai?)")
+                    self.proc = None
+                    return False
+                try:
+                    if self._post("rc/noop", {}, timeout=2).status_code == 200:
+                        logger.info(f"rclone rcd ready on {self.addr}")
+                        return True
+                except requests.RequestException:
+                    pass
+                time.sleep(0.3)
+            logger.error("rclone rcd tidak merespon, dihentikan")
+            self._terminate()
+            return False
+
+    def _terminate(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+    def stop(self):
+        with self._lock:
+            self._terminate()
+
+    def call(self, path: str, timeout: float = 60, **params) -> dict:
+        """Panggil endpoint RC (mis. "operations/stat"). Raise RcloneRCError jika rclone membalas error"""
+        if not self.start():
+            raise RcloneRCError("rclone rcd tidak tersedia")
+        resp = self._post(path, params, timeout)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        if resp.status_code != 200:
+            raise RcloneRCError(f"{path}: {data.get('error') or resp.status_code}")
+        return data
+
+    def _set_bwlimit(self, rate: int):
+        self.call("core/bwlimit", rate=f"{max(rate // 1024, 1)}K" if rate else "off")
+
+    @contextlib.contextmanager
+    def bwlimit(self, share: Callable[[], int]):
+        """Batas bandwidth daemon (core/bwlimit, global untuk semua transfer rcd) selama blok ini.
+        Batas = share() x transfer yang memakainya, dihitung ulang saat transfer mulai/selesai;
+        transfer terakhir selesai -> "off", operasi rcd lain (mis. download) tidak ikut terbatas."""
+        with self._bw_lock:
+            self._bw_users += 1
+            try:
+                self._set_bwlimit(share() * self._bw_users)
+            except Exception:
+                self._bw_users -= 1
+                raise
+        try:
+            yield
+        finally:
+            with self._bw_lock:
+                self._bw_users -= 1
+                try:
+                    self._set_bwlimit(share() * self._bw_users if self._bw_users else 0)
+                except Exception as e:
+                    logger.warning(f"rclone rcd core/bwlimit gagal direset: {e}")
+
+RCLONE_RC = RcloneDaemon(RCLONE_RC_ADDR)
+atexit.register(RCLONE_RC.stop)
+
+def rc_copyfile(local_path: str, dst_fs: str, dst_remote: str,
+                progress: Callable[[int, int], None] = None, is_cancelled: Callable[[], bool] = None):
+    """Upload satu file lokal ke dst_fs:dst_remote via operations/copyfile (_async job).
+    progress(bytes, total) dari core/stats grup job ini. Raise RcloneRCError jika gagal / dibatalkan."""
+    local_path = os.path.abspath(local_path)
+    size = os.path.getsize(local_path)
+    group = f"up-{uuid.uuid4().hex[:12]}"
+    job = RCLONE_RC.call(
+        "operations/copyfile",
+        srcFs=os.path.dirname(local_path), srcRemote=os.path.basename(local_path),
+        dstFs=dst_fs, dstRemote=dst_remote, _async=True, _group=group,
+    )
+    jobid = job["jobid"]
+    try:
+        while True:
+            status = RCLONE_RC.call("job/status", jobid=jobid)
+            if status.get("finished"):
+                if not status.get("success"):
+                    raise RcloneRCError(status.get("error") or "copyfile gagal")
+                if progress:
+                    progress(size, size)
+                return
+            if is_cancelled and is_cancelled():
+                RCLONE_RC.call("job/stop", jobid=jobid)
+                raise RcloneRCError("dibatalkan")
+            if progress:
+                stats = RCLONE_RC.call("core/stats", group=group)
+                progress(stats.get("bytes") or 0, stats.get("totalBytes") or size)
+            time.sleep(RC_POLL_INTERVAL)
+    finally:
+        try:
+            RCLONE_RC.call("core/stats-delete", group=group)
+        except Exception:
+            pass
+
+def rc_file_id(fs: str, remote: str) -> Optional[str]:
+    """ID backend (mis. file ID GDrive) lewat operations/stat, None jika file tidak ada"""
+    item = RCLONE_RC.call("operations/stat", fs=fs, remote=remote).get("item")
+    return item.get("ID") if item else None
@@ -0,0 +1,206 @@
+"""
+Fair-share job scheduler for EncodeSilent Ubuntu Bot
+Deficit Round-Robin per chat_id di atas JOB_QUEUE (weight per user, shortest-job-first opsional)
+dan admission control disk/RAM, tanpa Telegram dependency.
+Estimasi detik encode job (ETA model) dipasang bot lewat set_job_eta.
+"""
+import os
+import json
+import copy
+from collections import deque
+from typing import Callable, Optional
+
+import psutil
+
+from config import (
+    DATA_FOLDER, CACHE_FOLDER, OUTPUT_FOLDER, OWNER_ID, OWNER_PRIORITY,
+    USER_WEIGHTS, DEFAULT_USER_WEIGHT, SCHED_QUANTUM, SCHED_SJF,
+    HEAUDIO_MAP, AACLCAUDIO_MAP, VIDEO_2PASS_MAP,
+    MIN_FREE_DISK_GB, MIN_FREE_RAM_MB, ESTIMATED_DURATION, UNKNOWN_SOURCE_GB, ADMISSION_HEADROOM
+)
+from downloader import format_size, source_cache_path, source_cache_hit
+
+# =====================================================
+# FAIR-SHARE SCHEDULER (Deficit Round-Robin per chat_id)
+# =====================================================
+# Setiap user dapat jatah (quantum x weight) per putaran, jadi batch 30 job
+# dari satu user tidak memblokir user lain. Biaya job = estimasi ETA, sehingga
+# jatah dihitung dalam waktu encode, bukan jumlah job. Job milik OWNER_ID (jika
+# OWNER_PRIORITY aktif) dan job resume dari pending SRT selalu didahulukan.
+WEIGHTS_FILE = os.path.join(DATA_FOLDER, "user_weights.json")
+USER_WEIGHT_OVERRIDES = {}  # {chat_id: weight} dari command /weight
+SCHED_STATE = {"deficit": {}, "rotation": [], "current": None, "granted": False}
+
+# Estimasi detik encode job, dipasang bot: job_eta (ETA model dari ENCODE_HISTORY)
+JOB_ETA: Callable[[dict], float] = lambda job: 0.0
+
+def set_job_eta(eta: Callable[[dict], float]):
+    global JOB_ETA
+    JOB_ETA = eta
+
+def load_user_weights():
+    # Diisi di tempat: bot memakai dict yang sama (import nama)
+    USER_WEIGHT_OVERRIDES.clear()
+    if os.path.exists(WEIGHTS_FILE):
+        try:
+            with open(WEIGHTS_FILE, 'r') as f:
+                USER_WEIGHT_OVERRIDES.update({int(k): float(v) for k, v in json.load(f).items()})
+        except:
+            USER_WEIGHT_OVERRIDES.clear()
+
+def save_user_weights():
+    with open(WEIGHTS_FILE, 'w') as f:
+        json.dump({str(k): v for k, v in USER_WEIGHT_OVERRIDES.items()}, f, indent=2)
+
+def get_user_weight(chat_id) -> float:
+    """Weight user: override /weight > USER_WEIGHTS (.env) > DEFAULT_USER_WEIGHT"""
+    if chat_id in USER_WEIGHT_OVERRIDES:
+        return USER_WEIGHT_OVERRIDES[chat_id]
+    return USER_WEIGHTS.get(chat_id, DEFAULT_USER_WEIGHT)
+
+def job_cost(job, eta: float = None) -> float:
+    """Biaya satu job dalam satuan quantum (estimasi detik encode / SCHED_QUANTUM, minimal 1 menit)"""
+    return max(JOB_ETA(job) if eta is None else eta, 60) / SCHED_QUANTUM
+
+def _drr_next(costs: dict, state: dict):
+    """Satu langkah DRR. costs = {user: biaya job head-nya} (urut kemunculan di antrian).
+    Returns user yang mendapat giliran; deficit-nya sudah dipotong."""
+    rotation = [u for u in state["rotation"] if u in costs]
+    rotation += [u for u in costs if u not in rotation]
+    # User yang antriannya sudah kosong kehilangan sisa deficit (DRR standar)
+    state["deficit"] = {u: d for u, d in state["deficit"].items() if u in costs}
+    state["rotation"] = rotation
+    if state["current"] not in costs:
+        state["current"] = rotation[0]
+        state["granted"] = False
+
+    while True:
+        user = state["current"]
+        if not state["granted"]:
+            state["deficit"][user] = state["deficit"].get(user, 0.0) + get_user_weight(user)
+            state["granted"] = True
+        if state["deficit"][user] >= costs[user]:
+            state["deficit"][user] -= costs[user]
+            return user
+        # Jatah habis: giliran user berikutnya
+        state["current"] = rotation[(rotation.index(user) + 1) % len(rotation)]
+        state["granted"] = False
+
+def sched_pick(queue: list, state: dict) -> int:
+    """Pilih index job berikutnya dari queue dan update state DRR"""
+    # 1. Prioritas mutlak: job resume (sudah didownload) lalu job owner
+    for i, job in enumerate(queue):
+        if job.get('resume'):
+            return i
+    if OWNER_PRIORITY:
+        for i, job in enumerate(queue):
+            if job['chat_id'] == OWNER_ID:
+                return i
+
+    # 2. Deficit Round-Robin antar user (head = job terpendek user jika SJF, else FIFO)
+    etas = [JOB_ETA(job) for job in queue] if SCHED_SJF else None
+    heads = {}
+    for i, job in enumerate(queue):
+        head = heads.setdefault(job['chat_id'], i)
+        if SCHED_SJF and etas[i] < etas[head]:
+            heads[job['chat_id']] = i
+
+    user = _drr_next({u: job_cost(queue[i], etas[i] if etas else None) for u, i in heads.items()}, state)
+    return heads[user]
+
+def queue_order(queue: list, state: dict) -> list:
+    """Urutan eksekusi queue tanpa mengubah state (sama dengan sched_pick berulang).
+    Satu lintasan: ETA tiap job dihitung sekali dan antrian per user diurutkan sekali,
+    lalu tiap langkah DRR hanya melihat head per user."""
+    state = copy.deepcopy(state)
+    order = [job for job in queue if job.get('resume')]
+    if OWNER_PRIORITY:
+        order += [job for job in queue if not job.get('resume') and job['chat_id'] == OWNER_ID]
+    taken = {id(job) for job in order}
+
+    etas = {id(job): JOB_ETA(job) for job in queue if id(job) not in taken}
+    per_user = {}
+    for job in queue:
+        if id(job) not in taken:
+            per_user.setdefault(job['chat_id'], []).append(job)
+    heads = {}
+    for user, jobs in per_user.items():
+        if SCHED_SJF:
+            jobs.sort(key=lambda job: etas[id(job)])  # Stabil: ETA sama tetap FIFO
+        heads[user] = deque((job, job_cost(job, etas[id(job)])) for job in jobs)
+
+    while heads:
+        user = _drr_next({u: jobs[0][1] for u, jobs in heads.items()}, state)
+        order.append(heads[user].popleft()[0])
+        if not heads[user]:
+            del heads[user]
+    return order
+
+def reset_scheduler():
+    SCHED_STATE.update({"deficit": {}, "rotation": [], "current": None, "granted": False})
+
+# =====================================================
+# ADMISSION CONTROL (Disk & RAM backpressure)
+# =====================================================
+# Footprint job = source yang belum didownload + estimasi output dari bitrate map.
+# Byte yang sudah di-reserve job berjalan (tapi belum ditulis) ikut dihitung
+# supaya beberapa download paralel tidak sama-sama "melihat" disk kosong.
+ADMISSION_RESERVED = {}  # {key: bytes yang di-reserve tapi belum ditulis}
+
+def _kbps(rate: str) -> int:
+    try:
+        return int(str(rate).lower().rstrip("k"))
+    except ValueError:
+        return 0
+
+def estimate_output_size(resolutions: list, duration: float = 0, audio: str = "he") -> int:
+    """Estimasi total ukuran output dari VIDEO_2PASS_MAP + audio map"""
+    duration = duration or ESTIMATED_DURATION
+    audio_map = HEAUDIO_MAP if audio == "he" else AACLCAUDIO_MAP
+    total = 0
+    for res in resolutions:
+        kbps = _kbps(VIDEO_2PASS_MAP.get(res, "2100k")) + _kbps(audio_map.get(res, "128k"))
+        total += kbps * 1000 / 8 * duration
+    return int(total * ADMISSION_HEADROOM)
+
+def source_on_disk(job) -> bool:
+    """Source job sudah ada: file hasil download sebelumnya, atau src_<key> di source cache
+    (key diketahui sebelum download, mis. GDrive / job yang dijalankan ulang)"""
+    if job.get('downloaded_file') and os.path.exists(job['downloaded_file']):
+        return True
+    return bool(job.get('content_key')) and source_cache_hit(source_cache_path(job['content_key']))
+
+def estimate_job_footprint(job) -> int:
+    """Byte disk yang dibutuhkan job (source belum didownload + output encode)"""
+    need = 0
+    if not source_on_disk(job):
+        need += job.get('source_size') or int(UNKNOWN_SOURCE_GB * 1024 ** 3)
+    if job.get('type', 'encode') == 'encode':
+        need += estimate_output_size(job.get('queue', []), job.get('duration', 0), job.get('audio', 'he'))
+    return need
+
+def get_free_disk() -> int:
+    """Free space terkecil antara CACHE_FOLDER dan OUTPUT_FOLDER, dikurangi reservasi"""
+    free = min(psutil.disk_usage(folder).free for folder in (CACHE_FOLDER, OUTPUT_FOLDER))
+    return free - sum(ADMISSION_RESERVED.values())
+
+def admission_check(footprint: int) -> Optional[str]:
+    """Returns None jika job muat, atau alasan (string) jika harus ditahan"""
+    free = get_free_disk() - int(MIN_FREE_DISK_GB * 1024 ** 3)
+    if footprint > free:
+        return f"Disk tidak cukup (butuh {format_size(footprint)}, tersedia {format_size(max(free, 0))})"
+    avail_ram = psutil.virtual_memory().available
+    if avail_ram < MIN_FREE_RAM_MB * 1024 * 1024:
+        return f"RAM tidak cukup (tersedia {format_size(avail_ram)})"
+    return None
+
+def admission_reserve(key: str, nbytes: int):
+    ADMISSION_RESERVED[key] = max(int(nbytes), 0)
+
+def admission_consume(key: str, nbytes: int):
+    """Kurangi reservasi setelah byte benar-benar ditulis ke disk"""
+    if key in ADMISSION_RESERVED:
+        ADMISSION_RESERVED[key] = max(ADMISSION_RESERVED[key] - int(nbytes), 0)
+
+def admission_release(key: str):
+    ADMISSION_RESERVED.pop(key, None)
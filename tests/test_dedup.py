@@ -0,0 +1,111 @@
+import pytest
+
+from dedup import (
+    normalize_source_url, gdrive_content_key, fingerprint_job, rendition_fingerprint,
+    match_history, find_identical_job
+)
+
+def _job(url="https://Host.example/v/film.mkv?utm_source=x&b=2&a=1", queue=("720p",), **kw) -> dict:
+    job = {
+        "chat_id": 10, "url": url, "queue": list(queue), "mode": "crf", "crf": "24",
+        "font": 16, "margin": 25, "audio": "he", "real_name": "film.mkv",
+    }
+    job.update(kw)
+    return job
+
+def _fp(job, res="720p") -> str:
+    return rendition_fingerprint(job, res, {})
+
+# ===== SOURCE KEY =====
+
+def test_normalize_drops_tracking_and_sorts_query():
+    assert normalize_source_url("https://Host.example/v/film.mkv?utm_source=x&b=2&a=1#top") == \
+        normalize_source_url("https://host.example/v/film.mkv?a=1&b=2&fbclid=abc")
+
+def test_normalize_keeps_path_case_and_real_params():
+    assert normalize_source_url("https://host/v/Film.mkv") != normalize_source_url("https://host/v/film.mkv")
+    assert normalize_source_url("https://host/dl?id=1") != normalize_source_url("https://host/dl?id=2")
+
+def test_normalize_gdrive_forms():
+    key = "gdrive:1AbC_d-E"
+    assert normalize_source_url("https://drive.google.com/file/d/1AbC_d-E/view?usp=sharing") == key
+    assert normalize_source_url("https://drive.google.com/open?id=1AbC_d-E") == key
+    assert normalize_source_url("https://docs.google.com/uc?export=download&id=1AbC_d-E") == key
+
+def test_gdrive_job_gets_content_key():
+    job = _job(url="https://drive.google.com/file/d/1AbC_d-E/view")
+    fingerprint_job(job, {})
+    assert job['content_key'] == gdrive_content_key("gdrive:1AbC_d-E")
+
+def test_cached_file_uses_recorded_source_key(tmp_path):
+    path = str(tmp_path / "cache_1.mkv")
+    cache = {"1": {"path": path, "name": "film.mkv", "size": 5, "source_key": normalize_source_url(_job()['url'])}}
+    from_cache = _job(url=None, downloaded_file=path)
+    assert _fp(from_cache) != _fp(_job())  # Tanpa file_cache: identitas berbeda
+    from_cache.pop('source_key')
+    assert rendition_fingerprint(from_cache, "720p", cache) == _fp(_job())
+
+# ===== FINGERPRINT =====
+
+def test_same_request_same_fingerprint():
+    assert _fp(_job()) == _fp(_job(url="https://host.example/v/film.mkv?a=1&b=2"))
+
+@pytest.mark.parametrize("change", [
+    {"mode": "2pass"}, {"crf": "26"}, {"font": 15}, {"margin": 40}, {"audio": "aac"},
+    {"res_crf": {"720p": "22"}}, {"url": "https://host.example/v/film2.mkv"},
+])
+def test_same_url_different_settings(change):
+    assert _fp(_job()) != _fp(_job(**change))
+
+def test_res_crf_only_affects_its_rendition():
+    base, other = _job(queue=["720p", "1080p"]), _job(queue=["720p", "1080p"], res_crf={"1080p": "20"})
+    assert _fp(base, "720p") == _fp(other, "720p")
+    assert _fp(base, "1080p") != _fp(other, "1080p")
+
+def test_subtitle_content_in_fingerprint(tmp_path):
+    srt_a, srt_b, srt_a2 = tmp_path / "a.srt", tmp_path / "b.srt", tmp_path / "a2.srt"
+    srt_a.write_text("1\n00:00:01,000 --> 00:00:02,000\nHalo\n")
+    srt_b.write_text("1\n00:00:01,000 --> 00:00:02,000\nHai\n")
+    srt_a2.write_text(srt_a.read_text())
+    with_a, with_b, with_a2 = _job(srt=str(srt_a)), _job(srt=str(srt_b)), _job(srt=str(srt_a2))
+    assert len({_fp(with_a), _fp(with_b), _fp(_job())}) == 3
+    assert _fp(with_a) == _fp(with_a2)  # Nama file beda, isi sama
+
+def test_fingerprint_survives_srt_removal(tmp_path):
+    srt = tmp_path / "a.srt"
+    srt.write_text("isi")
+    job = _job(srt=str(srt))
+    fingerprint_job(job, {})
+    before = _fp(job)
+    srt.unlink()
+    assert _fp(job) == before
+
+# ===== HISTORY =====
+
+def test_match_history_latest_with_all_links():
+    fp = _fp(_job())
+    history = [
+        {"fingerprint": fp, "links": {"seedbox": "s1", "gdrive": "g1"}},
+        {"fingerprint": fp, "links": {"seedbox": "s2", "gdrive": "Error Link"}},
+        {"fingerprint": "lain", "links": {"seedbox": "s3", "gdrive": "g3"}},
+    ]
+    assert match_history(history, fp, ["seedbox", "gdrive"])["links"]["seedbox"] == "s1"
+    assert match_history(history, fp, ["seedbox"])["links"]["seedbox"] == "s2"
+    assert match_history(history, fp, ["seedbox", "gofile"]) is None
+    assert match_history(history, _fp(_job(crf="26")), []) is None
+
+# ===== JOB IDENTIK =====
+
+def test_identical_job_covers_all_renditions():
+    running = _job(queue=["720p", "1080p"], chat_id=20)
+    assert find_identical_job(_job(queue=["720p"]), [running], {}) is running
+    assert find_identical_job(_job(queue=["720p", "480p"]), [running], {}) is None
+
+@pytest.mark.parametrize("change", [{"mode": "2pass"}, {"crf": "26"}, {"font": 15}, {"audio": "aac"}])
+def test_identical_job_needs_same_settings(change):
+    assert find_identical_job(_job(**change), [_job(chat_id=20)], {}) is None
+
+def test_identical_job_skips_self_cancelled_and_leech():
+    job = _job()
+    others = [job, _job(is_cancelled=True), _job(type="leech")]
+    assert find_identical_job(job, others, {}) is None
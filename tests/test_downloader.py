@@ -0,0 +1,204 @@
+import os
+import asyncio
+
+import pytest
+
+import downloader
+from downloader import (
+    DownloadError, DownloadScheduler, PRIORITY_BATCH, PRIORITY_PIPELINE, SegmentedDownload,
+    rclone_gdrive_download, source_cache_hit, _merge_ranges, _missing_ranges, load_state, save_state, state_path
+)
+
+# ===== RANGE =====
+
+def test_missing_ranges_empty_is_whole_file():
+    assert _missing_ranges([], 100) == [(0, 99)]
+
+def test_missing_ranges_complete():
+    assert _missing_ranges([(0, 49), (50, 99)], 100) == []
+
+def test_missing_ranges_gaps():
+    assert _missing_ranges([(10, 19), (40, 59)], 100) == [(0, 9), (20, 39), (60, 99)]
+
+def test_missing_ranges_overlap_and_unsorted():
+    # Range dari inflight bisa tumpang tindih dengan completed
+    assert _missing_ranges([(30, 49), (0, 9), (5, 35)], 60) == [(50, 59)]
+
+def test_merge_ranges_adjacent():
+    assert _merge_ranges([(5, 9), (0, 4), (20, 29)]) == [[0, 9], [20, 29]]
+
+# ===== SIDECAR .dlstate =====
+
+def test_state_roundtrip(tmp_path):
+    dest = str(tmp_path / "video.mkv")
+    save_state(dest, {"url": "http://x/a", "done": [[0, 9]]})
+    assert os.path.exists(state_path(dest))
+    assert not os.path.exists(state_path(dest) + ".tmp")
+    assert load_state(dest) == {"url": "http://x/a", "done": [[0, 9]]}
+
+def test_load_state_missing_or_corrupt(tmp_path):
+    dest = str(tmp_path / "video.mkv")
+    assert load_state(dest) == {}
+    with open(state_path(dest), "w") as f:
+        f.write("{rusak")
+    assert load_state(dest) == {}
+
+def _download(dest, **kw):
+    return SegmentedDownload("http://host/file", dest, 100, **kw)
+
+def test_resume_ranges_same_source(tmp_path):
+    dest = str(tmp_path / "video.mkv")
+    open(dest, "wb").close()
+    d = _download(dest, etag='"v1"')
+    d.completed = [(0, 39)]
+    d.inflight = {1: [60, 70, 99]}  # Segmen setengah jalan: 60..69 sudah di disk
+    d._save_state()
+    assert _download(dest, etag='"v1"')._resume_ranges() == [(0, 39), (60, 69)]
+
+def test_resume_ranges_source_changed(tmp_path):
+    dest = str(tmp_path / "video.mkv")
+    open(dest, "wb").close()
+    d = _download(dest, etag='"v1"')
+    d.completed = [(0, 39)]
+    d._save_state()
+    assert _download(dest, etag='"v2"')._resume_ranges() == []
+    assert SegmentedDownload("http://host/file", dest, 200)._resume_ranges() == []
+    assert SegmentedDownload("http://host/lain", dest, 100)._resume_ranges() == []
+
+def test_resume_ranges_without_partial_file(tmp_path):
+    dest = str(tmp_path / "video.mkv")
+    d = _download(dest)
+    d.completed = [(0, 39)]
+    d._save_state()
+    assert _download(dest)._resume_ranges() == []
+
+# ===== GDRIVE (rclone copyid) =====
+
+class FakeRclone:
+    """Pengganti Popen rclone: tulis sebagian file ke dest lalu exit dengan returncode"""
+    def __init__(self, returncode, seen):
+        self.returncode = returncode
+        self.seen = seen
+
+    def __call__(self, cmd, **kw):
+        dest = cmd[5]
+        self.seen["sidecar"] = os.path.exists(state_path(dest))
+        with open(dest, "wb") as f:
+            f.write(b"x" * 10)
+        self.stderr = iter(['{"level": "error", "msg": "quota exceeded"}\n'])
+        return self
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self):
+        return self.returncode
+
+def test_rclone_success_clears_sidecar(tmp_path, monkeypatch):
+    dest = str(tmp_path / "src_gd.mkv")
+    seen = {}
+    monkeypatch.setattr(downloader.subprocess, "Popen", FakeRclone(0, seen))
+    assert rclone_gdrive_download("gd", "abc", dest) == 10
+    assert seen["sidecar"]
+    assert source_cache_hit(dest)
+
+def test_rclone_failure_removes_partial(tmp_path, monkeypatch):
+    dest = str(tmp_path / "src_gd.mkv")
+    monkeypatch.setattr(downloader.subprocess, "Popen", FakeRclone(1, {}))
+    with pytest.raises(DownloadError, match="quota"):
+        rclone_gdrive_download("gd", "abc", dest)
+    assert not os.path.exists(dest) and not os.path.exists(state_path(dest))
+
+def test_rclone_cancel_removes_partial(tmp_path, monkeypatch):
+    dest = str(tmp_path / "src_gd.mkv")
+    monkeypatch.setattr(downloader.subprocess, "Popen", FakeRclone(0, {}))
+    with pytest.raises(DownloadError, match="dibatalkan"):
+        rclone_gdrive_download("gd", "abc", dest, is_cancelled=lambda: True)
+    assert not source_cache_hit(dest)
+    assert not os.path.exists(dest)
+
+# ===== DOWNLOAD SCHEDULER =====
+
+def test_scheduler_host_of():
+    assert DownloadScheduler.host_of("https://www.Example.com/a.mkv") == "example.com"
+    assert DownloadScheduler.host_of("https://docs.google.com/uc?id=abc") == "drive.google.com"
+
+def test_scheduler_full_host_does_not_block_other_hosts():
+    async def run():
+        sched = DownloadScheduler(total_limit=3, host_limit=1, host_limits={})
+        order = []
+        release = asyncio.Event()
+
+        async def download(url, name):
+            async with sched.slot(url):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(download("http://a/1", "a1"))
+        await asyncio.sleep(0)
+        blocked = asyncio.create_task(download("http://a/2", "a2"))  # host a penuh, antri duluan
+        await asyncio.sleep(0)
+        other = asyncio.create_task(download("http://b/1", "b1"))
+        await asyncio.sleep(0.01)
+        assert order == ["a1", "b1"]
+        assert sched.active == {"a": 1, "b": 1}
+        release.set()
+        await asyncio.gather(first, blocked, other)
+        assert order == ["a1", "b1", "a2"]
+        assert sched.active == {}
+    asyncio.run(run())
+
+def test_scheduler_total_limit_serves_priority_first():
+    async def run():
+        sched = DownloadScheduler(total_limit=1, host_limit=5, host_limits={})
+        order = []
+        release = asyncio.Event()
+
+        async def download(url, name, priority=PRIORITY_BATCH):
+            async with sched.slot(url, priority):
+                order.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(download("http://a/0", "running"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(download("http://b/1", "batch")))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(download("http://c/1", "pipeline", PRIORITY_PIPELINE)))
+        await asyncio.sleep(0.01)
+        assert order == ["running"]
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == ["running", "pipeline", "batch"]
+    asyncio.run(run())
+
+def test_scheduler_cancelled_waiter_leaks_no_slot():
+    async def run():
+        sched = DownloadScheduler(total_limit=1, host_limit=1, host_limits={})
+        async with sched.slot("http://a/1"):
+            waiter = asyncio.create_task(sched.slot("http://a/2").__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert sched.active == {"a": 1}
+        assert sched.active == {}
+        async with sched.slot("http://a/3"):
+            assert sched.active == {"a": 1}
+    asyncio.run(run())
+
+def test_scheduler_bandwidth_share_split():
+    async def run():
+        sched = DownloadScheduler(total_limit=4, host_limit=4, host_limits={}, bandwidth_mb=12)
+        assert sched.bandwidth_share() == 12 * 1024 ** 2  # Belum ada download: jatah penuh
+        async with sched.slot("http://a/1"):
+            assert sched.bandwidth_share() == 12 * 1024 ** 2
+            async with sched.slot("http://b/1"), sched.slot("http://a/2"):
+                assert sched.bandwidth_share() == 4 * 1024 ** 2
+            assert sched.bandwidth_share() == 12 * 1024 ** 2
+    asyncio.run(run())
+
+def test_scheduler_unlimited_bandwidth():
+    assert DownloadScheduler(2, 1, {}).bandwidth_share() == 0
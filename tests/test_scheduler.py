@@ -0,0 +1,169 @@
+import random
+from collections import Counter
+
+import pytest
+
+import scheduler
+
+@pytest.fixture(autouse=True)
+def sched(monkeypatch):
+    monkeypatch.setattr(scheduler, "OWNER_PRIORITY", False)
+    monkeypatch.setattr(scheduler, "OWNER_ID", 1)
+    monkeypatch.setattr(scheduler, "SCHED_SJF", False)
+    monkeypatch.setattr(scheduler, "SCHED_QUANTUM", 600)
+    monkeypatch.setattr(scheduler, "DEFAULT_USER_WEIGHT", 1.0)
+    monkeypatch.setattr(scheduler, "USER_WEIGHTS", {})
+    monkeypatch.setattr(scheduler, "USER_WEIGHT_OVERRIDES", {})
+    monkeypatch.setattr(scheduler, "JOB_ETA", lambda job: job.get('eta', 600))
+
+def _state() -> dict:
+    return {"deficit": {}, "rotation": [], "current": None, "granted": False}
+
+def _job(chat_id, name, eta=600, **kw) -> dict:
+    return {"chat_id": chat_id, "name": name, "eta": eta, **kw}
+
+def _picks(queue: list, state: dict = None) -> list:
+    queue, state = list(queue), state or _state()
+    order = []
+    while queue:
+        order.append(queue.pop(scheduler.sched_pick(queue, state)))
+    return order
+
+def _names(jobs: list) -> list:
+    return [job["name"] for job in jobs]
+
+# ===== DRR =====
+
+def test_batch_does_not_block_other_user():
+    queue = [_job(10, f"a{i}") for i in range(5)] + [_job(20, "b0")]
+    assert _names(_picks(queue)) == ["a0", "b0", "a1", "a2", "a3", "a4"]
+
+def test_fairness_follows_weights(monkeypatch):
+    monkeypatch.setattr(scheduler, "USER_WEIGHTS", {10: 2.0})
+    queue = [_job(10, f"a{i}") for i in range(20)] + [_job(20, f"b{i}") for i in range(20)]
+    first = Counter(job["chat_id"] for job in _picks(queue)[:15])
+    assert first[10] == 10 and first[20] == 5
+
+def test_override_beats_env_weight(monkeypatch):
+    monkeypatch.setattr(scheduler, "USER_WEIGHTS", {10: 3.0})
+    scheduler.USER_WEIGHT_OVERRIDES[10] = 0.5
+    assert scheduler.get_user_weight(10) == 0.5
+    assert scheduler.get_user_weight(20) == 1.0
+
+def test_cost_in_encode_time():
+    # Job 1 jam dari user A = 6 quantum: deficit A baru cukup di putaran ke-6,
+    # user B dengan job 10 menit sudah jalan 5 kali
+    queue = [_job(10, "long", eta=3600)] + [_job(20, f"b{i}") for i in range(8)]
+    assert _names(_picks(queue)).index("long") == 5
+
+def test_sjf_within_user(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHED_SJF", True)
+    queue = [_job(10, "big", eta=1200), _job(10, "small", eta=60), _job(10, "mid", eta=600), _job(10, "small2", eta=60)]
+    assert _names(_picks(queue)) == ["small", "small2", "mid", "big"]
+
+def test_resume_and_owner_first(monkeypatch):
+    monkeypatch.setattr(scheduler, "OWNER_PRIORITY", True)
+    queue = [_job(10, "a0"), _job(1, "owner"), _job(20, "resumed", resume=True)]
+    assert _names(_picks(queue)) == ["resumed", "owner", "a0"]
+
+def test_empty_user_loses_deficit():
+    state = _state()
+    _picks([_job(10, "a0", eta=60)], state)
+    assert state["deficit"] == {10: 1.0 - 0.1}
+    scheduler.sched_pick([_job(20, "b0")], state)
+    assert 10 not in state["deficit"]
+
+# ===== URUTAN ANTRIAN (/queue) =====
+
+def test_queue_order_does_not_touch_state():
+    state = {"deficit": {20: 0.5}, "rotation": [20, 10], "current": 20, "granted": True}
+    before = repr(state)
+    scheduler.queue_order([_job(10, "a0"), _job(20, "b0")], state)
+    assert repr(state) == before
+
+@pytest.mark.parametrize("seed", range(30))
+def test_queue_order_matches_repeated_pick(monkeypatch, seed):
+    rnd = random.Random(seed)
+    monkeypatch.setattr(scheduler, "SCHED_SJF", rnd.random() < 0.5)
+    monkeypatch.setattr(scheduler, "OWNER_PRIORITY", rnd.random() < 0.5)
+    monkeypatch.setattr(scheduler, "USER_WEIGHTS", {u: rnd.choice([0.5, 1.0, 2.0, 3.0]) for u in range(1, 5)})
+    queue = [
+        _job(rnd.randint(1, 4), f"j{i}", eta=rnd.choice([0, 60, 300, 600, 1800, 7200]), resume=rnd.random() < 0.05)
+        for i in range(rnd.randint(1, 40))
+    ]
+    state = {"deficit": {2: 0.7}, "rotation": [3, 2], "current": 2, "granted": True}
+    expected = _picks(queue, dict(state, deficit=dict(state["deficit"]), rotation=list(state["rotation"])))
+    assert _names(scheduler.queue_order(queue, state)) == _names(expected)
+
+def test_queue_order_eta_once_per_job(monkeypatch):
+    calls = Counter()
+    def eta(job):
+        calls[job["name"]] += 1
+        return job["eta"]
+    monkeypatch.setattr(scheduler, "JOB_ETA", eta)
+    monkeypatch.setattr(scheduler, "SCHED_SJF", True)
+    queue = [_job(u, f"j{i}") for i, u in enumerate([10, 20, 30] * 20)]
+    scheduler.queue_order(queue, _state())
+    assert set(calls.values()) == {1}
+
+# ===== ADMISSION CONTROL =====
+
+GB = 1024 ** 3
+
+@pytest.fixture
+def disk(monkeypatch, tmp_path):
+    import downloader
+    free = {"disk": 100 * GB, "ram": 4096 * 1024 ** 2}
+    monkeypatch.setattr(scheduler.psutil, "disk_usage", lambda folder: type("U", (), {"free": free["disk"]}))
+    monkeypatch.setattr(scheduler.psutil, "virtual_memory", lambda: type("M", (), {"available": free["ram"]}))
+    monkeypatch.setattr(scheduler, "MIN_FREE_DISK_GB", 5)
+    monkeypatch.setattr(scheduler, "MIN_FREE_RAM_MB", 512)
+    monkeypatch.setattr(scheduler, "UNKNOWN_SOURCE_GB", 4)
+    monkeypatch.setattr(scheduler, "ADMISSION_RESERVED", {})
+    monkeypatch.setattr(downloader, "CACHE_FOLDER", str(tmp_path))
+    return free
+
+def _leech(**kw) -> dict:
+    return {"chat_id": 10, "type": "leech", "queue": [], **kw}
+
+def test_admission_fits(disk):
+    assert scheduler.admission_check(90 * GB) is None
+
+def test_admission_keeps_min_free_disk(disk):
+    assert "Disk" in scheduler.admission_check(96 * GB)
+
+def test_admission_counts_reservations(disk):
+    scheduler.admission_reserve("job_a", 60 * GB)
+    assert "Disk" in scheduler.admission_check(40 * GB)
+    scheduler.admission_consume("job_a", 30 * GB)
+    assert scheduler.admission_check(40 * GB) is None
+    scheduler.admission_release("job_a")
+    assert scheduler.get_free_disk() == 100 * GB
+
+def test_admission_low_ram(disk):
+    disk["ram"] = 100 * 1024 ** 2
+    assert "RAM" in scheduler.admission_check(0)
+
+def test_footprint_unknown_source(disk):
+    assert scheduler.estimate_job_footprint(_leech()) == 4 * GB
+    assert scheduler.estimate_job_footprint(_leech(source_size=GB)) == GB
+
+def test_footprint_includes_output(disk):
+    job = {"chat_id": 10, "queue": ["720p"], "duration": 600, "audio": "he", "source_size": GB}
+    assert scheduler.estimate_job_footprint(job) == GB + scheduler.estimate_output_size(["720p"], 600, "he")
+
+def test_footprint_downloaded_file(disk, tmp_path):
+    path = tmp_path / "vid.mkv"
+    path.write_bytes(b"x")
+    assert scheduler.estimate_job_footprint(_leech(source_size=GB, downloaded_file=str(path))) == 0
+
+def test_footprint_source_cache_hit(disk):
+    from downloader import source_cache_path, state_path
+    job = _leech(source_size=GB, content_key="abc")
+    assert scheduler.estimate_job_footprint(job) == GB
+    with open(source_cache_path("abc"), "wb") as f:
+        f.write(b"x")
+    assert scheduler.estimate_job_footprint(job) == 0
+    # Download masih berjalan (sidecar ada): belum dihitung sebagai cache
+    open(state_path(source_cache_path("abc")), "w").close()
+    assert scheduler.estimate_job_footprint(job) == GB
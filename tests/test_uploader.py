@@ -0,0 +1,492 @@
+import io
+import json
+import asyncio
+import time
+import types
+import base64
+import threading
+
+import pytest
+import requests
+
+import uploader
+from uploader import MultipartStream, FanoutReader, ThrottledReader
+
+def _file(tmp_path, size: int, name: str = "out.mp4") -> str:
+    path = tmp_path / name
+    path.write_bytes(bytes(i % 251 for i in range(size)))
+    return str(path)
+
+def _drain(stream, size: int = 64 * 1024) -> bytes:
+    out = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return b"".join(out)
+        out.append(chunk)
+
+# ===== MULTIPART STREAM =====
+
+@pytest.mark.parametrize("size", [0, 1, uploader.MULTIPART_CHUNK - 1, uploader.MULTIPART_CHUNK * 2 + 7])
+def test_multipart_len_matches_body(tmp_path, size):
+    path = _file(tmp_path, size)
+    stream = MultipartStream({"token": "abc", "folder": "Film é ü"}, "file", path, filename='a "b".mp4')
+    body = _drain(stream)
+    assert len(body) == len(stream)
+    assert int(stream.headers["Content-Length"]) == len(body)
+    assert body.endswith(f"--{stream.boundary}--\r\n".encode())
+
+def test_multipart_body_contains_file(tmp_path):
+    path = _file(tmp_path, 5000)
+    stream = MultipartStream({}, "file", path)
+    body = b"".join(stream)
+    with open(path, "rb") as f:
+        assert f.read() in body
+
+def test_multipart_requests_sends_content_length(tmp_path):
+    path = _file(tmp_path, 3000)
+    stream = MultipartStream({"a": "1"}, "file", path)
+    req = requests.Request("POST", "http://host/upload", data=stream, headers=stream.headers).prepare()
+    assert req.headers["Content-Length"] == str(len(stream))
+    assert "Transfer-Encoding" not in req.headers
+
+def test_multipart_progress(tmp_path):
+    path = _file(tmp_path, uploader.MULTIPART_CHUNK + 10)
+    calls = []
+    _drain(MultipartStream({}, "file", path, progress=lambda sent, total: calls.append((sent, total))))
+    assert calls[-1] == (uploader.MULTIPART_CHUNK + 10,) * 2
+
+def test_multipart_file_changed(tmp_path):
+    path = _file(tmp_path, 1000)
+    stream = MultipartStream({}, "file", path)
+    with open(path, "ab") as f:
+        f.write(b"x")
+    with pytest.raises(IOError):
+        _drain(stream)
+
+def test_multipart_len_with_fanout_and_throttle(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploader, "UPLOAD_BANDWIDTH_LIMIT_MB", 1)
+    monkeypatch.setattr(uploader, "BANDWIDTH_SHARE", lambda: 0)
+    path = _file(tmp_path, 300000)
+    source = FanoutReader(path, chunk_size=4096, buffer_mb=1)
+    stream = MultipartStream({"a": "1"}, "file", path, source=source)
+    assert len(_drain(stream)) == len(stream)
+    source.close()
+
+# ===== THROTTLED READER =====
+
+def test_throttled_len_keeps_content_length():
+    f = io.BytesIO(b"x" * 100)
+    f.read(10)
+    assert len(ThrottledReader(f, share=lambda: 0)) == 90
+
+# ===== FAN-OUT =====
+
+def _fanout(tmp_path, size: int, chunk: int = 1000, window: int = 3) -> FanoutReader:
+    reader = FanoutReader(_file(tmp_path, size), chunk_size=chunk, buffer_mb=1)
+    reader.max_chunks = window
+    return reader
+
+def test_fanout_lockstep_reads_disk_once(tmp_path):
+    reader = _fanout(tmp_path, 10500)
+    taps = [reader.open() for _ in range(3)]
+    outs = [[] for _ in taps]
+    while True:
+        chunks = [t.read(700) for t in taps]
+        if not any(chunks):
+            break
+        for out, chunk in zip(outs, chunks):
+            out.append(chunk)
+    with open(reader.path, "rb") as f:
+        data = f.read()
+    assert all(b"".join(out) == data for out in outs)
+    assert reader.disk_bytes == len(data)
+    assert reader.fallback_bytes == 0
+    reader.close()
+
+def _read_exact(tap, n: int) -> bytes:
+    out = b""
+    while len(out) < n:
+        chunk = tap.read(n - len(out))
+        if not chunk:
+            break
+        out += chunk
+    return out
+
+def test_fanout_window_eviction(tmp_path):
+    reader = _fanout(tmp_path, 10000)
+    with open(reader.path, "rb") as f:
+        data = f.read()
+    lead, lag = reader.open(), reader.open()
+    assert _read_exact(lead, 6000) == data[:6000]
+    # Window maks 3 chunk: chunk 0..2 sudah dibuang
+    assert sorted(reader._chunks) == [3, 4, 5]
+    assert reader.chunk(0) is None
+    # Tap tertinggal pindah ke handle sendiri, window tidak diisi ulang dari awal
+    assert _read_exact(lag, 2500) == data[:2500]
+    assert lag._own is not None
+    assert reader.fallback_bytes == 2500
+    assert sorted(reader._chunks) == [3, 4, 5]
+    # Mengejar window lagi: handle sendiri ditutup, lanjut dari chunk bersama
+    assert _read_exact(lag, 500) == data[2500:3000]
+    assert reader.fallback_bytes == 3000
+    assert _read_exact(lag, 100) == data[3000:3100]
+    assert lag._own is None
+    assert reader.fallback_bytes == 3000
+    assert _read_exact(lag, 10000) == data[3100:]
+    assert _read_exact(lead, 10000) == data[6000:]
+    assert len(reader._chunks) <= reader.max_chunks
+    lead.close()
+    lag.close()
+    reader.close()
+
+def test_fanout_tap_len(tmp_path):
+    reader = _fanout(tmp_path, 2500)
+    tap = reader.open()
+    tap.read(700)
+    assert len(tap) == 1800
+    reader.close()
+
+# ===== CIRCUIT BREAKER =====
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(uploader.time, "time", lambda: now[0])
+    monkeypatch.setattr(uploader, "UPLOAD_BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(uploader, "UPLOAD_BREAKER_COOLDOWN", 60)
+    return now
+
+def _opened(clock) -> uploader.CircuitBreaker:
+    breaker = uploader.CircuitBreaker("gofile")
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.failure()
+    return breaker
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = uploader.CircuitBreaker("gofile")
+    breaker.failure()
+    breaker.failure()
+    assert breaker.allow() and not breaker.is_open
+    breaker.failure()
+    assert breaker.is_open and not breaker.allow()
+    assert breaker.open_until == clock[0] + 60
+
+def test_breaker_success_resets_failures(clock):
+    breaker = uploader.CircuitBreaker("gofile")
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert not breaker.is_open
+
+def test_breaker_half_open_single_probe(clock):
+    breaker = _opened(clock)
+    clock[0] += 61
+    assert breaker.allow()  # probe
+    assert breaker.probing and breaker.is_open
+    assert not breaker.allow()  # upload lain tetap dilewati selama probe berjalan
+
+def test_breaker_probe_success_closes(clock):
+    breaker = _opened(clock)
+    clock[0] += 61
+    assert breaker.allow()
+    breaker.success()
+    assert not breaker.is_open and not breaker.probing
+    assert breaker.failures == 0 and breaker.cooldown == 60
+    assert breaker.allow() and breaker.allow()
+
+def test_breaker_probe_failure_doubles_cooldown(clock):
+    breaker = _opened(clock)
+    clock[0] += 61
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.probing and breaker.cooldown == 120
+    assert not breaker.allow()
+    clock[0] += 121
+    assert breaker.allow()
+
+def test_breaker_cooldown_capped(clock):
+    breaker = _opened(clock)
+    for _ in range(20):
+        clock[0] = breaker.open_until + 1
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.cooldown == 6 * 3600
+
+def test_breaker_probe_release_allows_new_probe(clock):
+    # Probe dibatalkan / gagal bukan karena host: host tidak boleh dilewati selamanya
+    breaker = _opened(clock)
+    clock[0] += 61
+    assert breaker.allow()
+    breaker.release()
+    assert not breaker.probing and breaker.cooldown == 60
+    assert breaker.allow()
+
+def test_open_circuits(clock, monkeypatch):
+    monkeypatch.setattr(uploader, "UPLOAD_BREAKERS", {})
+    breaker = uploader.upload_breaker("gofile")
+    assert uploader.upload_breaker("gofile") is breaker
+    for _ in range(3):
+        breaker.failure()
+    uploader.upload_breaker("buzzheavier")
+    assert uploader.open_circuits() == [("gofile", 60)]
+
+# ===== KLASIFIKASI ERROR =====
+
+@pytest.mark.parametrize("exc, retryable", [
+    (uploader.UploadError("x"), True),
+    (uploader.UploadError("x", status=503), True),
+    (uploader.UploadError("x", status=429), True),
+    (uploader.UploadError("x", status=413), False),
+    (requests.ConnectionError(), True),
+    (ValueError("bukan JSON"), True),
+    (FileNotFoundError(), False),
+    (KeyError("link"), False),
+])
+def test_upload_error_retryable(exc, retryable):
+    assert uploader.upload_error_retryable(exc) is retryable
+
+# ===== FILEBROWSER AUTH =====
+
+def _jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"h.{payload}.sig"
+
+class FakeFileBrowser:
+    """Pengganti http_post: /api/login dan /api/renew menerbitkan token exp = now + ttl"""
+    def __init__(self, clock, ttl: float = 7200, delay: float = 0):
+        self.clock = clock
+        self.ttl = ttl
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, url, **kw):
+        self.calls.append(url.rsplit("/", 1)[-1])
+        if self.delay:
+            time.sleep(self.delay)  # Login lambat (bcrypt): thread lain sempat ikut meminta token
+        token = _jwt(self.clock[0] + self.ttl)
+        return types.SimpleNamespace(status_code=200, text=token)
+
+def test_auth_token_reused_until_renew_margin(clock, monkeypatch):
+    server = FakeFileBrowser(clock)
+    monkeypatch.setattr(uploader, "http_post", server)
+    auth = uploader.FileBrowserAuth("http://fb/", "u", "p")
+    token = auth.token()
+    clock[0] += 7200 - uploader.FB_TOKEN_RENEW_MARGIN - 1
+    assert auth.token() == token
+    assert server.calls == ["login"]
+
+def test_auth_renews_near_expiry(clock, monkeypatch):
+    server = FakeFileBrowser(clock)
+    monkeypatch.setattr(uploader, "http_post", server)
+    auth = uploader.FileBrowserAuth("http://fb/", "u", "p")
+    token = auth.token()
+    clock[0] += 7200 - uploader.FB_TOKEN_RENEW_MARGIN + 1
+    renewed = auth.token()
+    assert renewed != token
+    assert uploader.FileBrowserAuth.token_expiry(renewed) == clock[0] + 7200
+    assert server.calls == ["login", "renew"]
+
+def test_auth_login_again_after_expiry(clock, monkeypatch):
+    server = FakeFileBrowser(clock)
+    monkeypatch.setattr(uploader, "http_post", server)
+    auth = uploader.FileBrowserAuth("http://fb/", "u", "p")
+    auth.token()
+    clock[0] += 7200
+    auth.token()
+    assert server.calls == ["login", "login"]
+
+def test_auth_single_login_for_concurrent_callers(clock, monkeypatch):
+    server = FakeFileBrowser(clock, delay=0.05)
+    monkeypatch.setattr(uploader, "http_post", server)
+    auth = uploader.FileBrowserAuth("http://fb/", "u", "p")
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(auth.token())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.calls == ["login"]
+    assert len(set(tokens)) == 1 and tokens[0]
+
+def test_auth_invalidate_keeps_newer_token(clock, monkeypatch):
+    monkeypatch.setattr(uploader, "http_post", FakeFileBrowser(clock))
+    auth = uploader.FileBrowserAuth("http://fb/", "u", "p")
+    old = auth.token()
+    clock[0] += 1
+    auth.invalidate(old)
+    new = auth.token()
+    assert new != old
+    auth.invalidate(old)  # 401 terlambat dari request dengan token lama
+    assert auth.token() == new
+
+# ===== FILEBROWSER TUS =====
+
+class StaticAuth:
+    def token(self):
+        return "tok"
+
+    def invalidate(self, token):
+        pass
+
+class FakeTus:
+    """Pengganti endpoint TUS FileBrowser: file dibuat lewat POST, PATCH hanya diterima di offset = ukuran
+    saat ini, HEAD mengembalikan Upload-Offset. PATCH ke-n di fail_patches putus setelah setengah chunk
+    (byte itu tetap tersimpan, seperti server yang sudah menulis sebagian body)."""
+    def __init__(self, exists: bool = False, fail_patches=()):
+        self.exists = exists
+        self.fail_patches = set(fail_patches)
+        self.data = None
+        self.patches = []  # Upload-Offset tiap PATCH
+
+    def _resp(self, status, headers=None):
+        return types.SimpleNamespace(status_code=status, headers=headers or {})
+
+    def post(self, url, headers=None, **kw):
+        assert "override" not in url
+        if self.exists:
+            return self._resp(409)
+        self.data = bytearray()
+        self.length = int(headers["Upload-Length"])
+        return self._resp(201)
+
+    def request(self, method, url, headers=None, data=None, **kw):
+        assert method == "PATCH"
+        offset = int(headers["Upload-Offset"])
+        self.patches.append(offset)
+        if offset != len(self.data):
+            return self._resp(409)
+        if len(self.patches) in self.fail_patches:
+            self.data += data.read(len(data) // 2)
+            raise requests.ConnectionError("putus di tengah chunk")
+        self.data += _drain(data)
+        return self._resp(204, {"Upload-Offset": str(len(self.data))})
+
+    def head(self, url, **kw):
+        return self._resp(200, {"Upload-Offset": str(len(self.data))})
+
+@pytest.fixture
+def tus(monkeypatch):
+    def install(server: FakeTus) -> FakeTus:
+        monkeypatch.setattr(uploader, "http_post", server.post)
+        monkeypatch.setattr(uploader, "http_request", server.request)
+        monkeypatch.setattr(uploader, "http_head", server.head)
+        return server
+    monkeypatch.setattr(uploader, "SEEDBOX_TUS_CHUNK_MB", 1)
+    monkeypatch.setattr(uploader, "SEEDBOX_TUS_RETRIES", 2)
+    monkeypatch.setattr(uploader.time, "sleep", lambda s: None)
+    return install
+
+MB = 1024 * 1024
+
+def test_tus_upload_in_chunks(tmp_path, tus):
+    path = _file(tmp_path, 2 * MB + 5)
+    server = tus(FakeTus())
+    assert uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 2 * MB + 5, StaticAuth()) is True
+    assert server.patches == [0, MB, 2 * MB]
+    assert bytes(server.data) == open(path, "rb").read()
+
+def test_tus_resumes_from_server_offset(tmp_path, tus):
+    path = _file(tmp_path, 2 * MB + 5)
+    server = tus(FakeTus(fail_patches={2}))
+    progress = []
+    assert uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 2 * MB + 5, StaticAuth(),
+                                           report=progress.append) is True
+    # PATCH kedua putus di 1.5MB: lanjut dari offset HEAD, bukan ulang chunk / dari nol
+    assert server.patches == [0, MB, MB + MB // 2]
+    assert bytes(server.data) == open(path, "rb").read()
+    assert progress[-1] == 2 * MB + 5
+
+def test_tus_resume_with_fanout_source(tmp_path, tus):
+    # Setelah gagal, sisa file dibaca sendiri dari disk (seek), bukan dari tap fan-out
+    path = _file(tmp_path, 2 * MB + 5)
+    server = tus(FakeTus(fail_patches={1}))
+    fanout = FanoutReader(path)
+    try:
+        assert uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 2 * MB + 5, StaticAuth(), fanout) is True
+    finally:
+        fanout.close()
+    assert bytes(server.data) == open(path, "rb").read()
+
+def test_tus_gives_up_after_retries(tmp_path, tus):
+    path = _file(tmp_path, 2 * MB)
+    server = tus(FakeTus(fail_patches={1, 2, 3}))
+    assert uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 2 * MB, StaticAuth()) is False
+    assert len(server.patches) == 3
+
+def test_tus_existing_file_not_overwritten(tmp_path, tus):
+    path = _file(tmp_path, 10)
+    tus(FakeTus(exists=True))
+    with pytest.raises(uploader.UploadError) as err:
+        uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 10, StaticAuth())
+    assert err.value.status == 409 and not err.value.retryable
+
+def test_tus_missing_endpoint_falls_back(tmp_path, monkeypatch, tus):
+    path = _file(tmp_path, 10)
+    tus(FakeTus())
+    monkeypatch.setattr(uploader, "http_post", lambda url, **kw: types.SimpleNamespace(status_code=404, headers={}))
+    assert uploader.filebrowser_tus_upload(path, "http://fb/api/tus/a.mp4", 10, StaticAuth()) is None
+
+# ===== UPLOAD SCHEDULER =====
+
+GRAPH = {
+    "seedbox": {"primary": True},
+    "gofile": {},
+    "buzzheavier": {},
+    "abyss": {"after": "seedbox"},
+}
+
+def test_upload_scheduler_remote_upload_takes_no_slot():
+    async def run():
+        sched = uploader.UploadScheduler(1, 1, {}, graph=GRAPH)
+        async with sched.upload_slot("seedbox"):
+            async with sched.upload_slot("abyss"):  # Remote upload: host tujuan yang menarik file
+                assert sched.active == {"seedbox": 1}
+    asyncio.run(run())
+
+def test_upload_scheduler_primary_before_mirror_and_other_hosts_free():
+    async def run():
+        sched = uploader.UploadScheduler(2, 1, {}, graph=GRAPH)
+        order = []
+        release = {host: asyncio.Event() for host in ("gofile", "buzzheavier", "seedbox")}
+
+        async def upload(host, name):
+            async with sched.upload_slot(host):
+                order.append(name)
+                await release[host].wait()
+
+        tasks = [asyncio.create_task(upload("gofile", "gofile-1"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(upload("gofile", "gofile-2")))  # gofile penuh
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(upload("buzzheavier", "buzz")))
+        await asyncio.sleep(0.01)
+        # Waiter gofile (host penuh) tidak menahan buzzheavier
+        assert order == ["gofile-1", "buzz"]
+        assert sched.queued() == 1
+        tasks.append(asyncio.create_task(upload("buzzheavier", "buzz-2")))
+        tasks.append(asyncio.create_task(upload("seedbox", "seedbox")))
+        await asyncio.sleep(0.01)
+        release["buzzheavier"].set()
+        await asyncio.sleep(0.01)
+        # Total penuh: slot buzzheavier yang lepas jatuh ke host primary, bukan mirror yang antri duluan
+        assert order[2] == "seedbox"
+        for event in release.values():
+            event.set()
+        await asyncio.gather(*tasks)
+        assert sorted(order) == ["buzz", "buzz-2", "gofile-1", "gofile-2", "seedbox"]
+        assert sched.active == {} and sched.queued() == 0
+    asyncio.run(run())
+
+def test_upload_scheduler_bandwidth_share_feeds_throttle():
+    async def run():
+        sched = uploader.UploadScheduler(3, 1, {}, bandwidth_mb=6, graph=GRAPH)
+        shares = []
+        async with sched.upload_slot("seedbox"), sched.upload_slot("gofile"):
+            shares.append(ThrottledReader(io.BytesIO(b""), sched.bandwidth_share).share())
+            async with sched.upload_slot("buzzheavier"):
+                shares.append(sched.bandwidth_share())
+        return shares
+    assert asyncio.run(run()) == [3 * 1024 ** 2, 2 * 1024 ** 2]
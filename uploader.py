@@ -0,0 +1,634 @@
+"""
+Upload primitives for EncodeSilent Ubuntu Bot
+Kebijakan error upload (klasifikasi retry, backoff, circuit breaker per host) dan body upload
+yang di-stream dari disk (multipart, fan-out satu baca ke banyak host, output yang masih di-encode),
+antrian upload per host (UploadScheduler), dan FileBrowser (token bersama, upload TUS resumable),
+tanpa Telegram dependency.
+"""
+import os
+import json
+import time
+import uuid
+import base64
+import random
+import logging
+import threading
+import contextlib
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+import requests
+
+from config import (
+    UPLOAD_FANOUT_BUFFER_MB, UPLOAD_BANDWIDTH_LIMIT_MB,
+    UPLOAD_BACKOFF, UPLOAD_BREAKER_THRESHOLD, UPLOAD_BREAKER_COOLDOWN,
+    SEEDBOX_TUS_CHUNK_MB, SEEDBOX_TUS_RETRIES
+)
+from downloader import format_size, DownloadScheduler
+from httpclient import http_post, http_head, http_request
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# UPLOAD POLICY (retry, backoff, circuit breaker per host)
+# =====================================================
+
+RETRYABLE_STATUS = {408, 425, 429}  # + semua 5xx
+
+class UploadError(Exception):
+    """Gagal upload dari host. retryable default dari status HTTP (None = gangguan sementara);
+    host_fault=False untuk penolakan yang bukan salah host (mis. file melebihi batas ukuran)."""
+
+    def __init__(self, message: str, status: int = None, retryable: bool = None, host_fault: bool = True):
+        super().__init__(message)
+        self.status = status
+        if retryable is None:
+            retryable = status is None or status in RETRYABLE_STATUS or status >= 500
+        self.retryable = retryable
+        self.host_fault = host_fault
+
+def upload_error_retryable(exc: BaseException) -> bool:
+    """Klasifikasi error: True = sementara (retry), False = permanen (langsung gagal)"""
+    if isinstance(exc, UploadError):
+        return exc.retryable
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        return status in RETRYABLE_STATUS or status >= 500
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(exc, ValueError):
+        return True  # JSON tidak valid: biasanya halaman error HTML dari host / proxy
+    # OSError: file lokal hilang / tidak terbaca; lainnya (TypeError, KeyError, ...) = bug, retry percuma
+    return False
+
+class CircuitBreaker:
+    """Per host: gagal UPLOAD_BREAKER_THRESHOLD kali berturut-turut -> host dilewati (open) selama cooldown,
+    setelah itu satu upload dicoba (half-open); sukses -> normal lagi, gagal -> open lagi dengan cooldown 2x
+    (maks 6 jam). Hanya dipakai dari event loop, jadi tanpa lock."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.failures = 0
+        self.cooldown = UPLOAD_BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= UPLOAD_BREAKER_THRESHOLD and (time.time() < self.open_until or self.probing)
+
+    def allow(self) -> bool:
+        if self.failures < UPLOAD_BREAKER_THRESHOLD:
+            return True
+        if time.time() < self.open_until or self.probing:
+            return False
+        self.probing = True  # half-open: satu upload percobaan
+        logger.info(f"Circuit {self.host}: half-open, mencoba lagi")
+        return True
+
+    def success(self):
+        if self.failures >= UPLOAD_BREAKER_THRESHOLD:
+            logger.info(f"Circuit {self.host}: closed")
+        self.failures = 0
+        self.cooldown = UPLOAD_BREAKER_COOLDOWN
+        self.probing = False
+
+    def failure(self):
+        if self.probing:
+            self.cooldown = min(self.cooldown * 2, 6 * 3600)
+        self.probing = False
+        self.failures += 1
+        if self.failures >= UPLOAD_BREAKER_THRESHOLD:
+            self.open_until = time.time() + self.cooldown
+            logger.warning(f"Circuit {self.host}: open {timedelta(seconds=int(self.cooldown))} ({self.failures} gagal berturut-turut)")
+
+    def release(self):
+        """Upload selesai tanpa menilai host (error bukan salah host)"""
+        self.probing = False
+
+UPLOAD_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+def upload_breaker(host: str) -> CircuitBreaker:
+    if host not in UPLOAD_BREAKERS:
+        UPLOAD_BREAKERS[host] = CircuitBreaker(host)
+    return UPLOAD_BREAKERS[host]
+
+def upload_backoff(attempt: int) -> float:
+    """Exponential backoff dengan jitter (attempt mulai 0), maks 5 menit"""
+    return min(random.uniform(UPLOAD_BACKOFF / 2, UPLOAD_BACKOFF * 2 ** attempt), 300)
+
+def open_circuits() -> list:
+    """[(host, sisa detik)] host yang sedang dilewati"""
+    now = time.time()
+    return [(b.host, b.open_until - now) for b in UPLOAD_BREAKERS.values() if b.is_open and b.open_until > now]
+
+# =====================================================
+# STREAMING UPLOAD (multipart & fan-out, tanpa buffer body di RAM)
+# =====================================================
+
+MULTIPART_CHUNK = 1024 * 1024  # 1MB per read dari disk
+
+def _multipart_quote(value: str) -> str:
+    """Escape nilai header Content-Disposition (gaya HTML5, sama seperti urllib3)"""
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+class MultipartStream:
+    """Body multipart/form-data yang dibaca bertahap dari disk.
+    requests (files=...) merakit seluruh body di memori; objek ini file-like + punya __len__,
+    jadi requests kirim Content-Length pasti dan streaming per chunk (RSS tetap datar).
+    progress(sent, total) dipanggil setiap chunk file terkirim."""
+
+    def __init__(self, fields: dict, file_field: str, local_path: str, filename: str = None,
+                 progress: Callable[[int, int], None] = None, source: "FanoutReader" = None):
+        self.boundary = uuid.uuid4().hex
+        self.local_path = local_path
+        self.file_size = os.path.getsize(local_path)
+        self.progress = progress
+        self.source = source
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_multipart_quote(name)}"\r\n\r\n{value}\r\n'
+            )
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_multipart_quote(file_field)}"; '
+            f'filename="{_multipart_quote(filename or os.path.basename(local_path))}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        )
+        self.preamble = "".join(parts).encode("utf-8")
+        self.epilogue = f"\r\n--{self.boundary}--\r\n".encode()
+        self._gen = None
+        self._buf = b""
+        self._pos = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def headers(self) -> dict:
+        return {"Content-Type": self.content_type, "Content-Length": str(len(self))}
+
+    def __len__(self) -> int:
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
+    def __iter__(self):
+        yield self.preamble
+        sent = 0
+        with open_upload_source(self.local_path, self.source) as f:
+            while True:
+                chunk = f.read(MULTIPART_CHUNK)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                if self.progress:
+                    self.progress(sent, self.file_size)
+                yield chunk
+        if sent != self.file_size:
+            raise IOError(f"File berubah saat upload: {sent} != {self.file_size} bytes")
+        yield self.epilogue
+
+    def read(self, size: int = -1) -> bytes:
+        """File-like read() di atas generator, dipakai http.client saat kirim body"""
+        if self._gen is None:
+            self._gen = iter(self)
+        out = []
+        while size != 0:
+            if self._pos >= len(self._buf):
+                self._buf, self._pos = next(self._gen, b""), 0
+                if not self._buf:
+                    break
+            take = len(self._buf) - self._pos if size < 0 else min(size, len(self._buf) - self._pos)
+            out.append(self._buf[self._pos:self._pos + take])
+            self._pos += take
+            if size > 0:
+                size -= take
+        return b"".join(out)
+
+class FanoutReader:
+    """Tee satu file output ke banyak uploader: tiap chunk dibaca sekali dari disk.
+    Chunk terbaru disimpan di window bersama (maks max_chunks); uploader paling depan yang
+    membaca dari disk, yang lain mengambil dari window. Tap yang tertinggal di belakang
+    window pindah ke file handle sendiri (seek ke offset-nya), jadi tidak ada yang menunggu."""
+
+    def __init__(self, path: str, chunk_size: int = MULTIPART_CHUNK, buffer_mb: int = None):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.chunk_size = chunk_size
+        buffer_mb = UPLOAD_FANOUT_BUFFER_MB if buffer_mb is None else buffer_mb
+        self.max_chunks = max(buffer_mb * 1024 * 1024 // chunk_size, 1)
+        self._chunks = {}  # index -> bytes, window [_first, _next)
+        self._first = 0
+        self._next = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self.disk_bytes = 0  # dibaca lewat handle bersama
+        self.fallback_bytes = 0  # dibaca tap yang tertinggal
+
+    def chunk(self, index: int) -> Optional[bytes]:
+        """Chunk ke-index, atau None jika sudah keluar dari window (tap harus baca sendiri)"""
+        with self._lock:
+            if index < self._first:
+                return None
+            while self._next <= index:
+                if self._file is None:
+                    self._file = open(self.path, "rb")
+                data = self._file.read(self.chunk_size)
+                if not data:
+                    return b""
+                self.disk_bytes += len(data)
+                self._chunks[self._next] = data
+                self._next += 1
+                if len(self._chunks) > self.max_chunks:
+                    self._chunks.pop(self._first)
+                    self._first += 1
+            return self._chunks[index]
+
+    def open(self) -> "FanoutTap":
+        return FanoutTap(self)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._chunks.clear()
+            self._first = self._next
+        if self.fallback_bytes:
+            logger.info(
+                f"Fan-out {os.path.basename(self.path)}: {format_size(self.disk_bytes)} dibagi, "
+                f"{format_size(self.fallback_bytes)} dibaca ulang oleh uploader yang tertinggal"
+            )
+
+class FanoutTap:
+    """Pembaca file-like milik satu uploader di atas FanoutReader"""
+
+    def __init__(self, reader: FanoutReader):
+        self.reader = reader
+        self.pos = 0
+        self._own = None  # file handle sendiri setelah tertinggal
+
+    def __len__(self) -> int:
+        return self.reader.size - self.pos
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.reader.size - self.pos
+        if size == 0 or self.pos >= self.reader.size:
+            return b""
+        if self._own is not None and self.pos // self.reader.chunk_size >= self.reader._first:
+            self.close()  # sudah mengejar window lagi
+        if self._own is None:
+            index, offset = divmod(self.pos, self.reader.chunk_size)
+            data = self.reader.chunk(index)
+            if data is not None:
+                out = data[offset:offset + size]
+                self.pos += len(out)
+                return out
+            self._own = open(self.reader.path, "rb")
+            self._own.seek(self.pos)
+        out = self._own.read(min(size, self.reader.chunk_size))
+        self.pos += len(out)
+        self.reader.fallback_bytes += len(out)
+        return out
+
+    def close(self):
+        if self._own:
+            self._own.close()
+            self._own = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Jatah bandwidth per upload (byte/detik), dipasang bot: UL_SCHEDULER.bandwidth_share
+BANDWIDTH_SHARE: Optional[Callable[[], int]] = None
+
+def set_bandwidth_share(share: Callable[[], int]):
+    global BANDWIDTH_SHARE
+    BANDWIDTH_SHARE = share
+
+class ThrottledReader:
+    """Handle upload yang dibatasi ke jatah bandwidth upload (share(), default BANDWIDTH_SHARE),
+    jatah dihitung ulang tiap read karena jumlah upload aktif berubah"""
+
+    def __init__(self, f, share: Callable[[], int] = None):
+        self.f = f
+        self.share = share or BANDWIDTH_SHARE
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        rate = self.share() if self.share else 0
+        if rate and data:
+            self.window_bytes += len(data)
+            ahead = self.window_bytes / rate - (time.monotonic() - self.window_start)
+            if ahead > 0:
+                time.sleep(ahead)
+            if time.monotonic() - self.window_start > 5:
+                # Window pendek: perubahan jatah cepat berlaku
+                self.window_start, self.window_bytes = time.monotonic(), 0
+        return data
+
+    def __len__(self) -> int:
+        """Ukuran body tetap diketahui requests (Content-Length, bukan chunked) seperti tanpa throttle:
+        __len__ handle asli, selain itu fstat/tell (super_len requests)"""
+        return requests.utils.super_len(self.f)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def throttled(f):
+    return ThrottledReader(f) if UPLOAD_BANDWIDTH_LIMIT_MB > 0 else f
+
+def open_upload_source(local_path: str, source: FanoutReader = None):
+    """File handle untuk uploader: tap fan-out jika ada, selain itu baca langsung dari disk
+    (dibatasi UPLOAD_BANDWIDTH_LIMIT_MB jika diisi)"""
+    return throttled(source.open() if source else open(local_path, "rb"))
+
+PIPELINE_POLL = 0.5  # Detik antar cek pertumbuhan output yang masih di-encode
+
+class GrowingFile:
+    """Output yang masih ditulis FFmpeg (fMP4: ftyp + moov kosong, lalu fragmen moof/mdat di-append;
+    byte yang sudah ditulis tidak diubah lagi). Uploader membaca lewat open() mengikuti ujung file,
+    EOF baru dikirim setelah finish(True); finish(False) = encode gagal/dibatalkan, pembaca raise."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ok = False
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def finish(self, ok: bool = True):
+        self.ok = ok
+        self._done.set()
+
+    def wait(self, timeout: float):
+        self._done.wait(timeout)
+
+    def open(self) -> "GrowingTap":
+        return GrowingTap(self)
+
+class GrowingTap:
+    """Handle baca (file-like) untuk GrowingFile: read() menunggu sampai ada byte baru atau encode selesai"""
+
+    def __init__(self, growing: GrowingFile):
+        self.growing = growing
+        self.f = None
+
+    def read(self, size: int = -1) -> bytes:
+        # size < 0 tidak berarti "sampai EOF" (EOF belum diketahui), cukup satu chunk
+        size = MULTIPART_CHUNK if size is None or size < 0 else size
+        while True:
+            done = self.growing.finished  # Dicek sebelum baca: kosong setelah selesai = benar-benar EOF
+            if done and not self.growing.ok:
+                raise UploadError("encode gagal/dibatalkan, upload streaming dihentikan", retryable=False, host_fault=False)
+            if self.f is None and os.path.exists(self.growing.path):
+                self.f = open(self.growing.path, "rb")
+            if self.f:
+                data = self.f.read(size)
+                if data:
+                    return data
+            if done:
+                return b""
+            self.growing.wait(PIPELINE_POLL)
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# =====================================================
+# UPLOAD SCHEDULER (slot per host + bandwidth upload global)
+# =====================================================
+# Sama seperti DownloadScheduler (downloader.py), tapi per host upload (nama di UPLOAD_GRAPH). Semua upload
+# (rendition process_job, /up, /convert) antri di sini lewat run_upload, slot dipegang per percobaan
+# (tidak selama backoff). Host primary (Seedbox, GDrive: link utama) didahulukan dari mirror.
+# Remote upload (host dengan 'after') hanya API call, host tujuan yang menarik file -> tanpa slot.
+
+UL_PRIORITY_PRIMARY = 0
+UL_PRIORITY_MIRROR = 1
+
+class UploadScheduler(DownloadScheduler):
+    """graph = UPLOAD_GRAPH bot ({host: spec}): 'after' = remote upload, 'primary' = prioritas slot"""
+
+    def __init__(self, total_limit: int, host_limit: int, host_limits: dict, bandwidth_mb: float = 0,
+                 graph: dict = None):
+        super().__init__(total_limit, host_limit, host_limits, bandwidth_mb)
+        self.graph = graph if graph is not None else {}
+
+    @staticmethod
+    def host_of(host: str) -> str:
+        return host  # Sudah nama host UPLOAD_GRAPH, bukan URL
+
+    @contextlib.asynccontextmanager
+    async def upload_slot(self, host: str):
+        spec = self.graph.get(host, {})
+        if spec.get("after"):
+            yield
+            return
+        async with self.slot(host, UL_PRIORITY_PRIMARY if spec.get("primary") else UL_PRIORITY_MIRROR):
+            yield
+
+    def queued(self) -> int:
+        return sum(1 for w in self.waiters if not w[3].done())
+
+# =====================================================
+# FILEBROWSER (token JWT dipakai bersama + upload TUS resumable)
+# =====================================================
+
+FB_TOKEN_RENEW_MARGIN = 300  # Detik sebelum exp token diperbarui
+FB_LOGIN_COOLDOWN = 30  # Detik jeda login ulang setelah gagal (hindari spam bcrypt)
+
+class FileBrowserAuth:
+    """Token FileBrowser untuk semua upload (thread-safe, satu login untuk banyak thread).
+    Exp dibaca dari payload JWT; token diperbarui via /api/renew sebelum expired,
+    login ulang jika renew gagal atau server balas 401 (invalidate)."""
+
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self._token = None
+        self._exp = 0.0
+        self._fail_until = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token_expiry(token: str) -> float:
+        """Unix time exp dari JWT, 0 jika tidak terbaca"""
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload)).get("exp", 0))
+        except Exception:
+            return 0.0
+
+    def _store(self, token: str):
+        self._token = token
+        # Token tanpa exp terbaca: anggap berlaku 10 menit lalu renew
+        self._exp = self.token_expiry(token) or time.time() + FB_TOKEN_RENEW_MARGIN + 600
+
+    def _login(self) -> Optional[str]:
+        if time.time() < self._fail_until:
+            return None
+        resp = http_post(f"{self.base_url}/api/login", json={
+            "username": self.username,
+            "password": self.password
+        }, timeout=30)
+        if resp.status_code != 200:
+            logger.error(f"FileBrowser login failed: {resp.status_code}")
+            self._token = None
+            self._fail_until = time.time() + FB_LOGIN_COOLDOWN
+            return None
+        self._store(resp.text.strip())
+        logger.info("FileBrowser login OK")
+        return self._token
+
+    def _renew(self) -> Optional[str]:
+        try:
+            resp = http_post(f"{self.base_url}/api/renew", headers={"X-Auth": self._token}, timeout=30)
+        except Exception as e:
+            logger.warning(f"FileBrowser token renew error: {e}")
+            return None
+        if resp.status_code != 200:
+            return None
+        self._store(resp.text.strip())
+        return self._token
+
+    def token(self) -> Optional[str]:
+        """Token valid (renew/login jika perlu), None jika login gagal"""
+        with self._lock:
+            now = time.time()
+            if self._token and now < self._exp - FB_TOKEN_RENEW_MARGIN:
+                return self._token
+            if self._token and now < self._exp - 5 and self._renew():
+                return self._token
+            return self._login()
+
+    def invalidate(self, token: str):
+        """Dipanggil saat 401: token ini dibuang (kecuali sudah diganti thread lain)"""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+class _ChunkBody:
+    """Body PATCH TUS: `length` byte berikutnya dari handle f (file-like + __len__ = Content-Length pasti)"""
+
+    def __init__(self, f, length: int, on_read: Callable[[int], None] = None):
+        self.f = f
+        self.remaining = length
+        self.sent = 0
+        self.on_read = on_read
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        self.sent += len(data)
+        if self.on_read:
+            self.on_read(self.sent)
+        return data
+
+def filebrowser_tus_upload(local_path: str, tus_url: str, file_size: int, auth: FileBrowserAuth,
+                           source: FanoutReader = None, report: Callable[[int], None] = None) -> Optional[bool]:
+    """Upload resumable lewat endpoint TUS FileBrowser: POST buat file (Upload-Length), lalu PATCH per chunk.
+    Gagal di tengah -> HEAD untuk offset yang sudah diterima server, lanjut dari situ (bukan dari nol).
+    FileBrowser hanya menerima PATCH di offset = ukuran file saat ini, jadi chunk dikirim berurutan.
+    File yang sudah ada tidak ditimpa (sama dengan POST biasa): 409 -> UploadError.
+    Returns True sukses, False gagal, None jika server tidak punya endpoint TUS (pakai POST biasa)."""
+    report = report or (lambda uploaded: None)
+    chunk_size = max(SEEDBOX_TUS_CHUNK_MB, 1) * 1024 * 1024
+    offset = 0
+    created = False
+    failures = 0
+    src = open_upload_source(local_path, source)
+    src_pos = 0  # posisi baca src; beda dengan offset = harus seek (baca sendiri dari disk)
+    try:
+        while True:
+            token = auth.token()
+            if not token:
+                raise UploadError("FileBrowser login gagal")
+            headers = {"X-Auth": token, "Tus-Resumable": "1.0.0"}
+            try:
+                if not created:
+                    resp = http_post(tus_url, headers={**headers, "Upload-Length": str(file_size)}, timeout=60)
+                    if resp.status_code in (404, 405) or "text/html" in resp.headers.get("Content-Type", ""):
+                        return None
+                    if resp.status_code == 409:
+                        raise UploadError(f"{os.path.basename(local_path)} sudah ada di FileBrowser", status=409)
+                    if resp.status_code == 401:
+                        auth.invalidate(token)
+                    if resp.status_code != 201:
+                        raise Exception(f"TUS create {resp.status_code}")
+                    created = True
+
+                if offset >= file_size:
+                    return True
+                length = min(chunk_size, file_size - offset)
+                if src_pos != offset:
+                    src.close()
+                    src = open(local_path, "rb")
+                    src.seek(offset)
+                    src = throttled(src)
+                    src_pos = offset
+                base = offset
+                body = _ChunkBody(src, length, lambda sent: report(base + sent))
+                src_pos = None  # tidak pasti sampai PATCH sukses
+                resp = http_request("PATCH", tus_url, headers={
+                    **headers,
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": str(offset),
+                }, data=body, timeout=120)
+                if resp.status_code == 401:
+                    auth.invalidate(token)
+                if resp.status_code not in (200, 204):
+                    raise Exception(f"TUS PATCH @{offset} {resp.status_code}")
+                src_pos = base + length
+                offset = int(resp.headers.get("Upload-Offset", base + length))
+                failures = 0
+                report(offset)
+                if offset >= file_size:
+                    return True
+            except UploadError:
+                raise
+            except Exception as e:
+                failures += 1
+                if failures > SEEDBOX_TUS_RETRIES:
+                    logger.error(f"FileBrowser TUS upload gagal di {format_size(offset)}: {e}")
+                    return False
+                logger.warning(f"FileBrowser TUS retry {failures}/{SEEDBOX_TUS_RETRIES} dari {format_size(offset)}: {e}")
+                time.sleep(min(2 ** failures, 30))
+                if created:
+                    # Offset yang benar-benar sudah tersimpan di server
+                    try:
+                        head = http_head(tus_url, headers={"X-Auth": auth.token() or "", "Tus-Resumable": "1.0.0"}, timeout=30)
+                        if head.status_code == 200 and head.headers.get("Upload-Offset", "").isdigit():
+                            offset = int(head.headers["Upload-Offset"])
+                    except Exception:
+                        pass
+    finally:
+        src.close()
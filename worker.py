@@ -0,0 +1,207 @@
+"""
+Headless encode worker for EncodeSilent Ubuntu Bot
+Lease rendition dari coordinator (bot.py, DISTRIBUTED_ENABLED=true), encode, kirim hasil balik.
+Run: python3 worker.py  (butuh COORDINATOR_URL + WORKER_TOKEN di .env)
+"""
+import os
+import time
+import socket
+import logging
+import threading
+import requests
+
+from config import (
+    COORDINATOR_URL, WORKER_TOKEN, WORKER_NAME, WORKER_DIR,
+    WORKER_POLL_INTERVAL, CACHE_FOLDER
+)
+from encoder import STATUS_DASHBOARD, sync_ffmpeg_worker
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO,
+)
+logger = logging.getLogger("worker")
+
+NAME = WORKER_NAME or f"{socket.gethostname()}-{os.getpid()}"
+SOURCE_CACHE_LIMIT = 2  # Jumlah source terakhir yang disimpan (afinitas lease)
+
+SESSION = requests.Session()
+SESSION.headers["X-Worker-Token"] = WORKER_TOKEN
+
+class LeaseLost(Exception):
+    pass
+
+def api(method: str, path: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", 30)
+    return SESSION.request(method, f"{COORDINATOR_URL.rstrip('/')}{path}", **kwargs)
+
+def cached_sources() -> list:
+    """source_id yang sudah lengkap di WORKER_DIR"""
+    return [f[4:-4] for f in os.listdir(WORKER_DIR) if f.startswith("src_") and f.endswith(".bin")]
+
+def prune_sources(keep_id: str):
+    """Hapus source lama, sisakan SOURCE_CACHE_LIMIT terbaru (termasuk keep_id)"""
+    files = sorted(
+        (os.path.join(WORKER_DIR, f) for f in os.listdir(WORKER_DIR) if f.startswith("src_")),
+        key=os.path.getmtime, reverse=True
+    )
+    keep = [p for p in files if keep_id in p][:1]
+    keep += [p for p in files if p not in keep and p.endswith(".bin")][:SOURCE_CACHE_LIMIT - 1]
+    for path in files:
+        if path not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def fetch_source(lease: dict) -> str:
+    """Download source dari coordinator (resume dari .part jika terputus)"""
+    path = os.path.join(WORKER_DIR, f"src_{lease['source_id']}.bin")
+    if os.path.exists(path) and os.path.getsize(path) == lease["source_size"]:
+        os.utime(path)
+        return path
+
+    part = path + ".part"
+    prune_sources(lease["source_id"])
+    for attempt in range(3):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset == lease["source_size"]:
+            os.replace(part, path)
+            return path
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with api("GET", f"/api/source/{lease['lease_id']}", headers=headers, stream=True, timeout=60) as r:
+                if r.status_code == 410:
+                    raise LeaseLost()
+                if r.status_code == 416:
+                    # .part lebih besar dari source (sisa source lain): mulai dari awal
+                    os.remove(part)
+                    continue
+                r.raise_for_status()
+                mode = "ab" if r.status_code == 206 else "wb"
+                with open(part, mode) as f:
+                    for chunk in r.iter_content(1024 * 1024):
+                        f.write(chunk)
+            if os.path.getsize(part) == lease["source_size"]:
+                os.replace(part, path)
+                return path
+        except requests.RequestException as e:
+            logger.warning(f"Source download error (attempt {attempt + 1}): {e}")
+            time.sleep(3)
+    raise Exception("Source download gagal / ukuran tidak cocok")
+
+def heartbeat_loop(lease: dict, key: str, stop: threading.Event):
+    """Perpanjang lease + kirim progress; set flag cancel jika coordinator minta berhenti"""
+    res = lease["res"]
+    while not stop.wait(lease["heartbeat_interval"]):
+        info = STATUS_DASHBOARD.get(key, {}).get("resolutions", {}).get(res, {})
+        try:
+            r = api("POST", "/api/heartbeat", json={
+                "lease_id": lease["lease_id"], "pct": info.get("pct", 0), "status": info.get("status", "Encoding")
+            }, timeout=10)
+            if r.status_code == 410 or (r.ok and r.json().get("cancel")):
+                logger.warning(f"Lease {lease['lease_id'][:8]} dibatalkan / expired, stop encode")
+                # run_task bisa sudah selesai (dan membuang key) saat heartbeat ini masih berjalan
+                dashboard = STATUS_DASHBOARD.get(key)
+                if dashboard is not None and not stop.is_set():
+                    dashboard["is_cancelled"] = True
+                return
+        except (requests.RequestException, ValueError) as e:
+            # ValueError: balasan bukan JSON (proxy / restart), coba lagi di heartbeat berikutnya
+            logger.warning(f"Heartbeat error: {e}")
+
+def upload_output(lease: dict, output_file: str):
+    for attempt in range(3):
+        try:
+            with open(output_file, "rb") as f:
+                r = api("PUT", f"/api/output/{lease['lease_id']}", data=f, timeout=600)
+            if r.status_code == 410:
+                raise LeaseLost()
+            r.raise_for_status()
+            return
+        except requests.RequestException as e:
+            logger.warning(f"Output upload error (attempt {attempt + 1}): {e}")
+            time.sleep(3)
+    raise Exception("Upload output ke coordinator gagal")
+
+def run_task(lease: dict):
+    lease_id = lease["lease_id"]
+    res = lease["res"]
+    key = f"lease_{lease_id[:8]}"
+    output_file = os.path.join(WORKER_DIR, f"out_{lease_id[:8]}_{lease['filename']}")
+    srt_file = None
+
+    STATUS_DASHBOARD[key] = {"resolutions": {res: {"status": "Downloading", "pct": 0}}, "is_cancelled": False}
+    stop = threading.Event()
+    threading.Thread(target=heartbeat_loop, args=(lease, key, stop), daemon=True).start()
+
+    ok, error, encode_time = False, "", 0
+    try:
+        input_file = fetch_source(lease)
+        if lease.get("srt_text"):
+            srt_file = os.path.join(WORKER_DIR, f"sub_{lease_id[:8]}.srt")
+            with open(srt_file, "w", encoding="utf-8") as f:
+                f.write(lease["srt_text"])
+
+        logger.info(f"Encoding {res}: {lease['filename']}")
+        encode_start = time.time()
+        sync_ffmpeg_worker(
+            key, res, input_file, output_file,
+            lease["mode"], lease["font"], lease["margin"], srt_file, lease["audio"], lease["sub_track"],
+            lease["crf"]
+        )
+        encode_time = time.time() - encode_start
+        if STATUS_DASHBOARD[key]["is_cancelled"]:
+            raise LeaseLost()
+
+        STATUS_DASHBOARD[key]["resolutions"][res]["status"] = "Sending"
+        upload_output(lease, output_file)
+        ok = True
+        logger.info(f"Done {res} in {int(encode_time)}s")
+    except LeaseLost:
+        logger.warning(f"Lease {lease_id[:8]} hilang, hasil dibuang")
+        return
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Task {res} gagal: {error}")
+    finally:
+        stop.set()
+        STATUS_DASHBOARD.pop(key, None)
+        for path in (output_file, srt_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    try:
+        api("POST", "/api/complete", json={"lease_id": lease_id, "ok": ok, "error": error, "encode_time": encode_time})
+    except requests.RequestException as e:
+        logger.warning(f"Complete report error: {e} (lease akan expire dan di-retry)")
+
+def main():
+    if not WORKER_TOKEN:
+        raise SystemExit("WORKER_TOKEN belum diisi di .env")
+    for folder in (WORKER_DIR, CACHE_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+
+    logger.info(f"Worker {NAME} -> {COORDINATOR_URL}")
+    print(f"🖥️ Worker {NAME} started (coordinator: {COORDINATOR_URL})")
+    while True:
+        try:
+            r = api("POST", "/api/lease", json={"worker": NAME, "cached_sources": cached_sources()})
+            r.raise_for_status()
+            lease = r.json().get("lease")
+        except requests.RequestException as e:
+            logger.warning(f"Coordinator unreachable: {e}")
+            lease = None
+
+        if lease:
+            run_task(lease)
+        else:
+            time.sleep(WORKER_POLL_INTERVAL)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        for state in STATUS_DASHBOARD.values():
+            state["is_cancelled"] = True
+        print("👋 Worker stopped")